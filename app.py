@@ -1,11 +1,12 @@
 import os
 import sys
-import shutil
+import sqlite3
 import json
 import re
 import platform
 import secrets
 import string
+import functools
 import io
 from datetime import datetime, timedelta
 from calendar import monthrange
@@ -24,7 +25,7 @@ from urllib.parse import quote as url_quote
 # 导入安全组件
 from classcomp.constants import ALLOWED_GRADES, PERIOD_CONSTANTS, USER_ROLES, SCORE_VALIDATION
 from classcomp.utils.validators import InputValidator, SQLSafetyHelper
-from classcomp.middleware import security_middleware
+from classcomp.middleware import security_middleware, idempotency_store
 
 # 导入时间处理工具
 from classcomp.utils.time_utils import get_current_time, get_local_timezone, parse_database_timestamp, format_datetime_for_display
@@ -44,10 +45,17 @@ def sanitize_teacher_grade(teacher_grade):
     return teacher_grade
 
 
-from classcomp.database import get_conn, put_conn
+from classcomp.database import (
+    get_conn, put_conn, get_reporting_conn, put_reporting_conn, get_dialect,
+    get_statement_stats, get_connection_stats, reset_connection_stats, run_write, WriteTimeoutError,
+    init_app as init_db_app,
+)
 from classcomp.models import User, Score, UserRealName
 from classcomp.forms import LoginForm, InfoCommitteeRegistrationForm, ScoreForm
-from classcomp.utils.period_utils import get_current_semester_config, calculate_period_info
+from classcomp.utils.period_utils import get_current_semester_config, get_current_period, calculate_period_info, calculate_period_info_v2, calculate_period_info_array, calculate_period_info_calendar_array, invalidate_semester_config, ensure_semester_periods, _to_date
+from classcomp.utils.period_snapshots import discard_period_snapshot, get_period_snapshot, get_snapshot_completion, grade_score_totals
+from classcomp.utils.export_cache import cached_workbook_path, store_cached_workbook, invalidate_cached_workbooks
+from classcomp.utils.submission_journal import submission_journal
 from classcomp.routes.period_api import period_api as period_bp
 
 
@@ -64,8 +72,7 @@ def add_pangu_spacing(text):
 
 def get_db_placeholder():
     """获取数据库兼容的占位符"""
-    db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-    return "?" if db_url.startswith("sqlite") else "%s"
+    return get_dialect().placeholder
 
 # 配置 Flask 应用的模板和静态文件路径
 template_dir = os.path.join(os.path.dirname(__file__), 'src', 'classcomp', 'templates')
@@ -74,6 +81,16 @@ app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 CORS(app)
 
+# 请求级数据库连接：每个请求最多借出一个连接，请求结束时归还
+init_db_app(app)
+
+# 提交日志模式：在处理请求的进程中启动后台写入线程，继续写入上次退出前未写入的提交
+# （preload_app 时 app 在 gunicorn master 中导入，不能在导入时启动线程）
+if submission_journal is not None:
+    @app.before_request
+    def start_submission_journal():
+        submission_journal.start()
+
 # 注册蓝图
 app.register_blueprint(period_bp)
 
@@ -127,9 +144,9 @@ def index():
     # 新媒体委员使用专用界面
     if current_user.is_new_media_officer():
         try:
-            config_data = get_current_semester_config()
-            if config_data:
-                period_info = calculate_period_info(semester_config=config_data['semester'])
+            period_data = get_current_period()
+            if period_data:
+                period_info = period_data['current']
                 current_period = {
                     'number': period_info['period_number'] + 1,
                     'start': period_info['period_start'].strftime('%Y-%m-%d'),
@@ -171,9 +188,9 @@ def index():
     
     # 获取当前周期信息
     try:
-        config_data = get_current_semester_config()
-        if config_data:
-            period_info = calculate_period_info(semester_config=config_data['semester'])
+        period_data = get_current_period()
+        if period_data:
+            period_info = period_data['current']
             current_period = {
                 'number': period_info['period_number'] + 1,
                 'start': period_info['period_start'].strftime('%Y-%m-%d'),
@@ -491,8 +508,7 @@ def admin_users():
                     conn.commit()
                     flash(f'用户 {username} 创建成功', 'success')
         # 检测数据库类型
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
+        is_sqlite = get_dialect().is_sqlite
         
         # 查看所有用户及评分统计 - 教师按用户名智能排序
         if is_sqlite:
@@ -581,8 +597,8 @@ def api_semester_config():
                 classes_by_grade[grade] = []
             classes_by_grade[grade].append(class_info['class_name'])
         
-        # 计算当前周期信息
-        period_info = calculate_period_info(semester_config=semester)
+        # 当前周期信息
+        period_info = get_current_period()['current']
         
         return jsonify(
             success=True,
@@ -632,14 +648,12 @@ def admin_semester():
                             # 确保exports目录存在
                             os.makedirs(EXPORT_FOLDER, exist_ok=True)
                             
-                            # 复制数据库文件（仅限 SQLite）
-                            db_filename = re.search(r'sqlite:///(.+)', db_url).group(1)
-                            if not os.path.isabs(db_filename):
-                                db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), db_filename)
-                            else:
-                                db_path = db_filename
-                            
-                            shutil.copy2(db_path, backup_path)
+                            # 使用 SQLite 在线备份接口（WAL 模式下直接复制文件可能缺少未检查点的数据）
+                            backup_conn = sqlite3.connect(backup_path)
+                            try:
+                                get_reporting_conn().backup(backup_conn)
+                            finally:
+                                backup_conn.close()
                             
                             # 直接返回文件下载
                             return send_file(backup_path, as_attachment=True, download_name=backup_filename)
@@ -654,7 +668,8 @@ def admin_semester():
                             
                             try:
                                 # 生成 SQL 备份
-                                # 使用当前连接，不再获取新连接
+                                # 全表读取走报表连接，不占用写路径的连接
+                                cur = get_reporting_conn().cursor()
                                 with open(backup_path, 'w', encoding='utf-8') as f:
                                     f.write("-- ClassComp Score 数据备份\n")
                                     f.write(f"-- 备份时间: {get_current_time().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
@@ -727,7 +742,11 @@ def admin_semester():
                             SET semester_name = {placeholder}, start_date = {placeholder}, first_period_end_date = {placeholder}, updated_at = CURRENT_TIMESTAMP
                             WHERE id = {placeholder}
                         ''', (semester_name, start_date, first_period_end_date, semester['id']))
+                        invalidate_semester_config(conn)
+                        # 周期边界可能变化，已缓存的月度报表全部失效
+                        invalidate_cached_workbooks(conn)
                         conn.commit()
+                        ensure_semester_periods(conn)
                         return jsonify(success=True, message='学期配置更新成功')
                     else:
                         # 没有活跃学期，创建新的学期配置
@@ -735,14 +754,15 @@ def admin_semester():
                             INSERT INTO semester_config (semester_name, start_date, first_period_end_date, is_active)
                             VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})
                         ''', (semester_name, start_date, first_period_end_date, 1))
+                        invalidate_semester_config(conn)
                         conn.commit()
+                        ensure_semester_periods(conn)
                         return jsonify(success=True, message='新学期配置创建成功')
                
                 elif action == 'update_classes':
                     # 更新班级配置 - 使用原子操作防止重复
                     classes = data.get('classes', [])
-                    db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-                    is_sqlite = db_url.startswith("sqlite")
+                    is_sqlite = get_dialect().is_sqlite
                    
                     # 使用事务确保原子性
                     if is_sqlite:
@@ -816,7 +836,9 @@ def admin_semester():
                                         updated_at = CURRENT_TIMESTAMP
                                 ''', (semester_id, grade_name, class_name, 1))
                        
+                        invalidate_semester_config(conn)
                         conn.commit()
+                        ensure_semester_periods(conn)
                         return jsonify(success=True, message=f'班级配置更新成功，共{len(classes)}个班级')
                        
                     except Exception as e:
@@ -833,9 +855,12 @@ def admin_semester():
                         # 清空评分数据
                         cur.execute('DELETE FROM scores')
                         cur.execute('DELETE FROM scores_history')
+                        cur.execute('DELETE FROM period_snapshots')
                         
                         # 重置学期配置
                         cur.execute('UPDATE semester_config SET is_active = 0')
+                        invalidate_semester_config(conn)
+                        invalidate_cached_workbooks(conn)
                         
                         conn.commit()
                         return jsonify(success=True, message='数据库重置成功，请重新配置学期')
@@ -896,6 +921,7 @@ def admin_semester():
 
 @app.route('/submit_scores', methods=['POST'])
 @login_required
+@idempotency_store.idempotent  # 客户端重试时带相同的 Idempotency-Key，直接返回第一次的结果
 @security_middleware.rate_limit(max_requests=100, window=60)  # 1分钟最多100次提交（开发友好）
 def submit_scores():
     # 教师不能提交评分
@@ -921,82 +947,144 @@ def submit_scores():
             security_middleware.log_security_event("INVALID_GRADE", f"无效年级: {data.get('target_grade')}")
             return jsonify(success=False, message="无效的年级"), 400
         
-        conn = get_conn()
-        
-        try:
-            # 批量插入评分
-            inserted_count = 0
-            total_overwrite_count = 0
-            errors = []
-            for score_data in data["scores"]:
-                try:
-                    # 验证分数
-                    score1 = int(score_data["score1"])
-                    score2 = int(score_data["score2"])
-                    score3 = int(score_data["score3"])
-                    
-                    if not all(InputValidator.validate_score(s) for s in [score1, score2, score3]):
-                        errors.append("分数必须在0-10之间")
-                        continue
-                    
-                    # 验证班级名称
-                    class_name = score_data.get("className", "")
-                    if not InputValidator.validate_class_name(class_name):
-                        errors.append(f"无效的班级名称: {class_name}")
-                        continue
-                    
-                    # 清理备注
-                    note = InputValidator.sanitize_text(score_data.get("note", ""), max_length=50)
-                    
-                    score_id, error, overwrite_count = Score.create_score(
-                        user_id=current_user.id,
-                        evaluator_name=current_user.username,
-                        evaluator_class=current_user.class_name,
-                        target_grade=data["target_grade"],
-                        target_class=class_name,
-                        score1=score1,
-                        score2=score2,
-                        score3=score3,
-                        note=note,
-                        conn=conn,
-                        source_type=source_type
-                    )
-                    
-                    if score_id:
-                        inserted_count += 1
-                        total_overwrite_count += overwrite_count
-                    else:
-                        errors.append(error)
-                        
-                except ValueError as e:
-                    errors.append(f"分数格式错误: {e}")
-                except KeyError as e:
-                    errors.append(f"缺少必要字段: {e}")
-                except Exception as e:
-                    errors.append(f"系统错误: {str(e)}")
-            
-            if inserted_count > 0:
-                # 构建成功消息
-                success_msg = f"成功提交{inserted_count}条评分记录"
-                if total_overwrite_count > 0:
-                    success_msg += f"，覆盖了{total_overwrite_count}条同周期记录"
+        # 批量插入评分：先校验格式，再作为一个写操作在同一事务中写入
+        errors = []
+        rows = []
+        for score_data in data["scores"]:
+            try:
+                # 验证分数
+                score1 = int(score_data["score1"])
+                score2 = int(score_data["score2"])
+                score3 = int(score_data["score3"])
                 
-                if errors:
-                    return jsonify(success=True, message=f"{success_msg}，{len(errors)}条失败", errors=errors)
-                else:
-                    return jsonify(success=True, message=success_msg)
-            else:
-                if errors:
-                    return jsonify(success=False, message="评分提交失败", errors=errors)
-                else:
-                    return jsonify(success=False, message="没有新的评分被提交")
+                if not all(InputValidator.validate_score(s) for s in [score1, score2, score3]):
+                    errors.append("分数必须在0-10之间")
+                    continue
                 
-        finally:
-            put_conn(conn)
+                # 验证班级名称
+                class_name = score_data.get("className", "")
+                if not InputValidator.validate_class_name(class_name):
+                    errors.append(f"无效的班级名称: {class_name}")
+                    continue
+                
+                # 清理备注
+                note = InputValidator.sanitize_text(score_data.get("note", ""), max_length=50)
+                
+                rows.append({
+                    'target_class': class_name,
+                    'score1': score1,
+                    'score2': score2,
+                    'score3': score3,
+                    'note': note
+                })
+                    
+            except ValueError as e:
+                errors.append(f"分数格式错误: {e}")
+            except KeyError as e:
+                errors.append(f"缺少必要字段: {e}")
+            except Exception as e:
+                errors.append(f"系统错误: {str(e)}")
+        
+        if rows and submission_journal is not None:
+            # 提交日志模式：落盘后立即返回，由后台线程写入 scores
+            submission_id = submission_journal.append(
+                user_id=current_user.id,
+                evaluator_name=current_user.username,
+                evaluator_class=current_user.class_name,
+                source_type=source_type,
+                target_grade=data["target_grade"],
+                rows=rows
+            )
+            message = f"已收到{len(rows)}条评分，正在写入"
+            if errors:
+                message += f"，{len(errors)}条失败"
+            return jsonify(success=True, queued=True, message=message, errors=errors,
+                           submission_id=submission_id,
+                           status_url=url_for('submission_status', submission_id=submission_id)), 202
+        
+        inserted_count = 0
+        total_overwrite_count = 0
+        if rows:
+            try:
+                job = functools.partial(
+                    Score.create_scores,
+                    user_id=current_user.id,
+                    evaluator_name=current_user.username,
+                    evaluator_class=current_user.class_name,
+                    target_grade=data["target_grade"],
+                    rows=rows,
+                    source_type=source_type
+                )
+                inserted_count, total_overwrite_count, row_errors = run_write(lambda conn: job(conn=conn))
+                errors.extend(row_errors)
+            except WriteTimeoutError:
+                # 写操作在排队时已撤销，没有任何记录被写入，客户端用同一幂等键重试不会重复写入
+                return jsonify(success=False, message="系统繁忙，评分未保存，请稍后重试", errors=errors), 503
+            except Exception as e:
+                # 数据库暂时不可用等系统错误返回 500，客户端可以重试
+                errors.extend([f"系统错误: {str(e)}"] * len(rows))
+                return jsonify(success=False, message="评分提交失败，请稍后重试", errors=errors), 500
+        
+        success, message = _submission_message(inserted_count, total_overwrite_count, errors)
+        if errors:
+            return jsonify(success=success, message=message, errors=errors)
+        return jsonify(success=success, message=message)
     
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
+def _submission_message(inserted_count, overwrite_count, errors):
+    """评分提交结果的提示信息，返回 (是否成功, 消息)"""
+    if inserted_count > 0:
+        # 构建成功消息
+        success_msg = f"成功提交{inserted_count}条评分记录"
+        if overwrite_count > 0:
+            success_msg += f"，覆盖了{overwrite_count}条同周期记录"
+        
+        if errors:
+            return True, f"{success_msg}，{len(errors)}条失败"
+        return True, success_msg
+    if errors:
+        return False, "评分提交失败"
+    return False, "没有新的评分被提交"
+
+@app.route('/api/submissions/<submission_id>')
+@login_required
+def submission_status(submission_id):
+    """查询提交日志模式下一次提交的写入状态"""
+    if submission_journal is None:
+        return jsonify(success=False, message="未启用提交日志"), 404
+    
+    submission = submission_journal.get(submission_id)
+    if submission is None or (submission['user_id'] != current_user.id and not current_user.is_admin()):
+        return jsonify(success=False, message="提交不存在"), 404
+    
+    result = {
+        'submission_id': submission['submission_id'],
+        'status': submission['status'],
+        'submitted_at': submission['submitted_at'],
+        'applied_at': submission['applied_at'],
+    }
+    if submission['status'] in ('pending', 'applying'):
+        return jsonify(success=True, message="正在写入", **result)
+    
+    success, message = _submission_message(submission['inserted_count'], submission['overwrite_count'],
+                                           submission['errors'])
+    return jsonify(success=success, message=message, errors=submission['errors'],
+                   inserted_count=submission['inserted_count'],
+                   overwrite_count=submission['overwrite_count'], **result)
+
+def _apply_snapshot_completion(item, completion):
+    """用快照中的评分完成情况填充班级行（completion 为 None 时原样返回）"""
+    if completion is None:
+        return item
+    entry = completion.get(item['class_name'])
+    count = entry['count'] if entry else 0
+    item['score_count_this_period'] = count
+    item['has_scored_this_period'] = 1 if count > 0 else 0
+    item['latest_score_time'] = entry['latest_score_time'] if entry else None
+    return item
+
 @app.route('/my_scores')
 @login_required
 def my_scores():
@@ -1004,8 +1092,8 @@ def my_scores():
     conn = get_conn()
     try:
         if current_user.is_admin():
-            # 管理员查看所有评分
-            cursor = conn.cursor()
+            # 管理员查看所有评分（全表查询走报表连接）
+            cursor = get_reporting_conn().cursor()
             cursor.execute('''
                 SELECT s.*, u.username, u.class_name as evaluator_class_name
                 FROM scores s 
@@ -1015,30 +1103,51 @@ def my_scores():
             scores = cursor.fetchall()
             return render_template('admin_scores.html', scores=scores, user=current_user)
         elif current_user.is_teacher():
-            # 教师查看本年级班级本周期评分完成情况
-            # 使用学期配置计算当前周期
-            config_data = get_current_semester_config(conn)
-            if config_data:
-                period_info = calculate_period_info(semester_config=config_data['semester'])
-            else:
-                # 回退到默认逻辑
-                period_info = calculate_period_info()
+            # 教师查看本年级班级本周期评分完成情况（?period_number= 可查看本学期已结束的周期）
+            # 与评分写入时使用同一套周期（period_metadata），评分行上已记录学期ID和周期号
+            period_info = calculate_period_info_v2(conn=conn)
             
             period_start = period_info['period_start']
             period_end = period_info['period_end']
             period_number = period_info['period_number']
+            current_period_number = period_number
+            semester_id = period_info.get('semester_id')
+            
+            requested_period = request.args.get('period_number', type=int)
+            if semester_id is not None and requested_period is not None and 0 <= requested_period < current_period_number:
+                cursor = conn.cursor()
+                get_dialect().execute(cursor, 'period_by_number', (semester_id, requested_period))
+                period = cursor.fetchone()
+                if period:
+                    period_number = requested_period
+                    period_start = _to_date(period['start_date'])
+                    period_end = _to_date(period['end_date'])
+            
+            period_nav = {
+                'is_current': period_number == current_period_number,
+                'previous': period_number - 1 if semester_id is not None and period_number > 0 else None,
+                'next': period_number + 1 if period_number < current_period_number else None
+            }
+            
+            placeholder = get_db_placeholder()
+            if semester_id is not None:
+                period_condition = f"s.semester_id = {placeholder} AND s.period_number = {placeholder}"
+                period_params = [semester_id, period_number]
+            else:
+                # 没有学期配置时回退到按时间区间匹配
+                period_condition = f"s.created_at >= {placeholder} AND s.created_at < {placeholder}"
+                period_params = list(get_dialect().day_range(period_start, period_end))
             
             if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
                 # 全校数据教师看所有年级班级的本周期评分完成情况
                 cursor = conn.cursor()
-                placeholder = get_db_placeholder()
-                db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-                is_sqlite = db_url.startswith("sqlite")
                 
-                if is_sqlite:
-                    date_func = "DATE(s.created_at)"
-                else:
-                    date_func = "DATE(s.created_at AT TIME ZONE 'Asia/Shanghai')"
+                # 已结束的周期读取快照中的完成情况，班级列表照常查询
+                completion = None
+                if not period_nav['is_current']:
+                    completion = get_snapshot_completion(semester_id, period_number, conn)
+                if completion is not None:
+                    period_condition, period_params = "1 = 0", []
 
                 cursor.execute(f'''
                     SELECT
@@ -1050,12 +1159,11 @@ def my_scores():
                     FROM semester_classes sc
                     LEFT JOIN users u ON sc.class_name = u.class_name
                     LEFT JOIN scores s ON u.id = s.user_id
-                        AND {date_func} >= {placeholder}
-                        AND {date_func} <= {placeholder}
+                        AND {period_condition}
                     WHERE sc.is_active = 1 AND sc.semester_id = (SELECT id FROM semester_config WHERE is_active = 1)
                     GROUP BY sc.class_name, sc.grade_name
                     ORDER BY {generate_class_sorting_sql("sc.grade_name", "sc.class_name")}
-                ''', (period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')))
+                ''', period_params)
                 
                 class_status_raw = cursor.fetchall()
                 
@@ -1063,7 +1171,7 @@ def my_scores():
                 class_status = []
                 display_grades = set()
                 for item in class_status_raw:
-                    new_item = dict(item)
+                    new_item = _apply_snapshot_completion(dict(item), completion)
                     new_item['class_name'] = add_pangu_spacing(new_item['class_name'])
                     grade_name = new_item['grade_name']
                     if 'VCE' in grade_name:
@@ -1085,6 +1193,7 @@ def my_scores():
                                      current_period=period_number + 1,
                                      period_start=period_start,
                                      period_end=period_end,
+                                     period_nav=period_nav,
                                      all_grades=sorted_display_grades,
                                      selected_grade='all')
             else:
@@ -1113,16 +1222,15 @@ def my_scores():
                     teacher_grades = [teacher_grade]
                 
                 cursor = conn.cursor()
-                # 构建IN查询条件
-                placeholder = get_db_placeholder()
-                db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-                is_sqlite = db_url.startswith("sqlite")
-
-                if is_sqlite:
-                    date_func = "DATE(s.created_at)"
-                else:
-                    date_func = "DATE(s.created_at AT TIME ZONE 'Asia/Shanghai')"
                 
+                # 已结束的周期读取快照中信息委员的完成情况，班级列表照常查询
+                completion = None
+                if not period_nav['is_current']:
+                    completion = get_snapshot_completion(semester_id, period_number, conn, source_type='info_commissioner')
+                if completion is not None:
+                    period_condition, period_params = "1 = 0", []
+                
+                # 构建IN查询条件
                 grade_placeholders = ','.join([placeholder for _ in teacher_grades])
                 cursor.execute(f'''
                     SELECT
@@ -1134,19 +1242,18 @@ def my_scores():
                     FROM semester_classes sc
                     LEFT JOIN users u ON sc.class_name = u.class_name AND u.role = 'student'
                     LEFT JOIN scores s ON u.id = s.user_id
-                        AND {date_func} >= {placeholder}
-                        AND {date_func} <= {placeholder}
+                        AND {period_condition}
                     WHERE sc.is_active = 1
                         AND sc.semester_id = (SELECT id FROM semester_config WHERE is_active = 1)
                         AND sc.grade_name IN ({grade_placeholders})
                     GROUP BY sc.class_name
                     ORDER BY {generate_class_sorting_sql("MIN(sc.grade_name)", "sc.class_name")}
-                ''', [period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')] + teacher_grades)
+                ''', period_params + teacher_grades)
                 class_status_raw = cursor.fetchall()
                 
                 class_status = []
                 for item in class_status_raw:
-                    new_item = dict(item)
+                    new_item = _apply_snapshot_completion(dict(item), completion)
                     new_item['class_name'] = add_pangu_spacing(new_item['class_name'])
                     class_status.append(new_item)
 
@@ -1157,7 +1264,8 @@ def my_scores():
                                      teacher_grade=teacher_grade,
                                      current_period=period_number + 1,
                                      period_start=period_start,
-                                     period_end=period_end)
+                                     period_end=period_end,
+                                     period_nav=period_nav)
         else:
             # 普通学生只看个人评分
             scores = Score.get_user_scores(current_user.id, conn)
@@ -1209,18 +1317,17 @@ def api_my_scores():
         
         # 获取周期信息用于筛选
         try:
-            config_data = get_current_semester_config(conn)
-            if config_data:
-                current_period_info = calculate_period_info(semester_config=config_data['semester'])
-                previous_period_info = calculate_period_info(target_date=current_period_info['period_start'] - timedelta(days=1), semester_config=config_data['semester'])
+            current_period = get_current_period(conn)
+            if current_period:
+                current_period_info = current_period['current']
+                previous_period_info = current_period['previous']
                 period_data = {
                     'current': {
                         'start': current_period_info['period_start'].strftime('%Y-%m-%d'),
                         'end': current_period_info['period_end'].strftime('%Y-%m-%d')
                     }
                 }
-                # 只有当上一周期的开始时间早于本周期时，才认为它是有效的
-                if previous_period_info['period_start'] < current_period_info['period_start']:
+                if previous_period_info:
                     period_data['previous'] = {
                         'start': previous_period_info['period_start'].strftime('%Y-%m-%d'),
                         'end': previous_period_info['period_end'].strftime('%Y-%m-%d')
@@ -1250,6 +1357,20 @@ def bulk_action_scores():
 
     conn = get_conn()
     try:
+        # 涉及已结束周期的快照需要丢弃，下次读取时按剩余记录重新冻结；
+        # 所在月份的缓存报表同样失效
+        placeholder = get_db_placeholder()
+        placeholders = ','.join([placeholder for _ in score_ids])
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT semester_id, period_number, created_at FROM scores
+            WHERE id IN ({placeholders})
+        """, score_ids)
+        touched_rows = cur.fetchall()
+        touched_periods = {(row['semester_id'], row['period_number']) for row in touched_rows
+                           if row['period_number'] is not None}
+        touched_months = {parse_database_timestamp(row['created_at']).strftime('%Y-%m') for row in touched_rows}
+        
         if action == 'archive':
             # 批量归档逻辑
             archived_count = 0
@@ -1257,16 +1378,19 @@ def bulk_action_scores():
                 success, error = Score.archive_score(score_id, conn)
                 if success:
                     archived_count += 1
+            for semester_id, period_number in touched_periods:
+                discard_period_snapshot(semester_id, period_number, conn)
+            invalidate_cached_workbooks(conn, touched_months)
             conn.commit()
             return jsonify(success=True, message=f"成功归档 {archived_count} 条记录")
         
         elif action == 'delete':
             # 批量删除逻辑
-            placeholder = get_db_placeholder()
-            placeholders = ','.join([placeholder for _ in score_ids])
-            cur = conn.cursor()
             cur.execute(f"DELETE FROM scores WHERE id IN ({placeholders})", score_ids)
             deleted_count = cur.rowcount
+            for semester_id, period_number in touched_periods:
+                discard_period_snapshot(semester_id, period_number, conn)
+            invalidate_cached_workbooks(conn, touched_months)
             conn.commit()
             return jsonify(success=True, message=f"成功删除 {deleted_count} 条记录")
             
@@ -1295,20 +1419,17 @@ def export_excel():
     conn = None  # 初始化conn
     try:
         print("开始导出Excel...")
-        conn = get_conn()
+        conn = get_reporting_conn()
         print("数据库连接成功")
         cur = conn.cursor()
         
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
-        
-        # 教师权限控制 - 普通教师只能导出本年级数据，全校数据教师可以导出所有数据
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
+        dialect = get_dialect()
+        is_sqlite = dialect.is_sqlite
+        placeholder = dialect.placeholder
         
         # 教师权限控制 - 普通教师只能导出本年级数据，全校数据教师可以导出所有数据
         teacher_grade_filter = ""
+        export_scope = 'all'
         if current_user.is_teacher():
             # 检查是否是全校数据教师
             if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
@@ -1332,6 +1453,7 @@ def export_excel():
                 
                 if not teacher_grade:
                     return f"无法确定教师所属年级，当前班级：{current_user.class_name}", 400
+                export_scope = teacher_grade
                 
                 # 高一高二教师需要包含对应的VCE班级数据
                 placeholder = get_db_placeholder()
@@ -1342,18 +1464,26 @@ def export_excel():
                     teacher_grade_filter = f" AND target_grade LIKE {placeholder}"
                     teacher_grade_params = [f'%{teacher_grade}%']
         
+        exclude_test = request.args.get("exclude_test", "true").lower() == "true"
+        
+        # 已结束月份的报表只生成一次，之后直接返回缓存文件
+        cache_path = None
+        if not all_data:
+            cache_path = cached_workbook_path(EXPORT_FOLDER, month, export_scope, exclude_test, conn)
+            if cache_path and os.path.exists(cache_path):
+                put_reporting_conn(conn)
+                print(f"📦 使用缓存的报表: {cache_path}")
+                return send_file(cache_path, as_attachment=True, download_name=f"评分表_{month.replace('-', '')}.xlsx")
+        
         # 构建SQL查询 - 根据是否导出全部数据来决定时间条件
         if all_data:
             # 导出全部数据 - 不添加时间条件
             time_condition = ""
             query_params = []
         else:
-            # 导出特定月份数据
-            if is_sqlite:
-                time_condition = f"WHERE strftime('%Y-%m', created_at) = {placeholder}"
-            else:
-                time_condition = f"WHERE to_char(created_at, 'YYYY-MM') = {placeholder}"
-            query_params = [month]
+            # 导出特定月份数据：本地时区的月初到下月初（半开区间，可使用 created_at 索引）
+            time_condition = f"WHERE created_at >= {placeholder} AND created_at < {placeholder}"
+            query_params = list(dialect.month_range(month))
         
         # 处理教师权限过滤器：确保SQL语法正确
         final_where_condition = time_condition
@@ -1382,7 +1512,8 @@ def export_excel():
                   score3,
                   total,
                   note,
-                  created_at
+                  created_at,
+                  source_type
                 FROM scores
                 {final_where_condition}
                 ORDER BY {class_sorting_sql}, evaluator_class, created_at
@@ -1401,7 +1532,8 @@ def export_excel():
                   score3,
                   total,
                   note,
-                  created_at
+                  created_at,
+                  source_type
                 FROM scores
                 {final_where_condition}
                 ORDER BY {class_sorting_sql}, evaluator_class, created_at
@@ -1419,17 +1551,17 @@ def export_excel():
             cur.execute(sql)
         rows = cur.fetchall()
         # 不要在这里关闭连接，后面还需要查询历史记录
-        # put_conn(conn)
+        # put_reporting_conn(conn)
         
         if not rows:
-            put_conn(conn)  # 提前返回时关闭连接
+            put_reporting_conn(conn)  # 提前返回时关闭连接
             data_type = "全部数据" if all_data else "当月数据"
             return f"无{data_type}", 200
             
         df = pd.DataFrame(rows, columns=[
             'id', 'evaluator_name', 'evaluator_class', 'target_grade', 
             'target_class', 'score1', 'score2', 'score3', 'total', 
-            'note', 'created_at'
+            'note', 'created_at', 'source_type'
         ])
         
         data_type = "全部数据" if all_data else f"{month}月数据"
@@ -1447,7 +1579,6 @@ def export_excel():
         print(f"📊 时间解析后数据: {len(df)}")
         
         # 排除测试数据（可选）
-        exclude_test = request.args.get("exclude_test", "true").lower() == "true"
         if exclude_test:
             test_keywords = ['测试', 'test', 'Test', 'TEST']
             before_filter = len(df)
@@ -1458,7 +1589,7 @@ def export_excel():
         
         if df.empty:
             print("❌ 时间解析后无数据")
-            put_conn(conn)
+            put_reporting_conn(conn)
             return "时间数据解析失败，请检查数据格式", 500
             
         # 时区已在 convert_to_shanghai_time 函数中统一处理，此处无需重复转换
@@ -1476,24 +1607,23 @@ def export_excel():
             with pd.ExcelWriter(filepath, engine="xlsxwriter") as writer:
                 print(f"开始创建Excel报表... 共{len(df)}条记录")
                 
-                # 计算每条记录的评分周期
-                df['date_only'] = df['created_at'].dt.date
+                # 按学期周期日历一次性计算整列记录所属的周期（与评分写入时记录的周期号一致）
+                semester_config = get_current_semester_config(conn)
+                semester = semester_config['semester'] if semester_config else None
                 
-                # 计算每个日期所属的两周周期
-                def get_biweekly_period(date, conn=None):
-                    # 使用学期配置计算周期
-                    config_data = get_current_semester_config(conn)
-                    if config_data:
-                        period_info = calculate_period_info(target_date=date, semester_config=config_data['semester'], conn=conn)
-                        return period_info['period_number'], period_info['period_end']
+                def assign_periods(frame):
+                    frame['date_only'] = frame['created_at'].dt.date
+                    if semester is not None:
+                        numbers, _, ends = calculate_period_info_calendar_array(frame['date_only'], semester, conn)
                     else:
                         # 回退到默认逻辑
-                        period_info = calculate_period_info(target_date=date, conn=conn)
-                        return period_info['period_number'], period_info['period_end']
+                        numbers, _, ends = calculate_period_info_array(frame['date_only'], conn=conn)
+                    period_ends = pd.Series(ends, index=frame.index)
+                    frame['period_number'] = numbers
+                    frame['period_end_date'] = period_ends.dt.date
+                    frame['period_month'] = period_ends.dt.strftime('%Y-%m')
                 
-                df['period_number'] = df['date_only'].apply(lambda x: get_biweekly_period(x, conn=conn)[0])
-                df['period_end_date'] = df['date_only'].apply(lambda x: get_biweekly_period(x, conn=conn)[1])
-                df['period_month'] = df['period_end_date'].apply(lambda x: x.strftime('%Y-%m'))
+                assign_periods(df)
                 
                 if all_data:
                     # 导出全部数据时，不按月份过滤
@@ -1510,13 +1640,40 @@ def export_excel():
                 
                 print(f"📅 找到{len(month_df['period_number'].unique())}个评分周期的数据")
                 
+                # 已结束并冻结的周期直接读取快照中的班级平均分和评分矩阵；
+                # 快照与本次导出的记录对不上（排除了测试数据、周期被月份截断等）时按原始记录汇总
+                export_today = get_current_time().date()
+                
+                def load_frozen_period(period, period_df):
+                    period_end = period_df['period_end_date'].iloc[0]
+                    if semester is None or period_end >= export_today:
+                        return None
+                    snapshot = get_period_snapshot(semester['id'], int(period), conn)
+                    if snapshot is None or snapshot['period_end'] != period_end:
+                        return None
+                    in_scope = lambda item: export_scope == 'all' or export_scope in item['target_grade']
+                    classes = [item for item in snapshot['classes'] if in_scope(item)]
+                    if sum(item['count'] for item in classes) != len(period_df):
+                        return None
+                    return classes, [item for item in snapshot['matrix'] if in_scope(item)]
+                
+                frozen_periods = {}
+                for period in month_df['period_number'].unique():
+                    frozen = load_frozen_period(period, month_df[month_df['period_number'] == period])
+                    if frozen:
+                        frozen_periods[period] = frozen
+                if frozen_periods:
+                    print(f"🧊 {len(frozen_periods)}个已结束周期使用快照汇总")
+                
                 # 1. 创建汇总表 - 每个周期单独一个sheet
                 for period in sorted(month_df['period_number'].unique()):
-                    period_df = month_df[month_df['period_number'] == period].copy()
-                    period_end = period_df['period_end_date'].iloc[0]
-                    
-                    # 计算每个班级在该周期内的平均分
-                    period_avg = period_df.groupby(['target_grade', 'target_class'])['total'].mean().reset_index()
+                    if period in frozen_periods:
+                        period_avg = pd.DataFrame(frozen_periods[period][0])[['target_grade', 'target_class', 'average']]
+                        period_avg = period_avg.rename(columns={'average': 'total'})
+                    else:
+                        # 计算每个班级在该周期内的平均分
+                        period_df = month_df[month_df['period_number'] == period].copy()
+                        period_avg = period_df.groupby(['target_grade', 'target_class'])['total'].mean().reset_index()
                     period_avg = period_avg.round(2)
                     
                     # 创建显示年级：将VCE年级合并
@@ -1571,7 +1728,11 @@ def export_excel():
                 
                 # 2. 为每个周期和年级创建评分矩阵
                 for period in sorted(month_df['period_number'].unique()):
-                    period_df = month_df[month_df['period_number'] == period].copy()
+                    if period in frozen_periods:
+                        # 快照矩阵每个单元格已是周期内平均分
+                        period_df = pd.DataFrame(frozen_periods[period][1]).rename(columns={'average': 'total'})
+                    else:
+                        period_df = month_df[month_df['period_number'] == period].copy()
                     
                     # 创建年级分组：将VCE年级合并
                     def get_matrix_grade(grade):
@@ -1651,17 +1812,14 @@ def export_excel():
                         history_params = []
                 else:
                     # 导出特定月份数据
-                    if is_sqlite:
-                        base_condition = f"WHERE strftime('%Y-%m', h.original_created_at) = {placeholder}"
-                    else:
-                        base_condition = f"WHERE to_char(h.original_created_at, 'YYYY-MM') = {placeholder}"
+                    base_condition = f"WHERE h.original_created_at >= {placeholder} AND h.original_created_at < {placeholder}"
                     
                     if teacher_grade_filter:
                         history_where_condition = base_condition + teacher_grade_filter
-                        history_params = [month] + (teacher_grade_params if 'teacher_grade_params' in locals() else [])
+                        history_params = list(dialect.month_range(month)) + (teacher_grade_params if 'teacher_grade_params' in locals() else [])
                     else:
                         history_where_condition = base_condition
-                        history_params = [month]
+                        history_params = list(dialect.month_range(month))
                 
                 # 构建历史记录SQL
                 if is_sqlite:
@@ -1670,7 +1828,8 @@ def export_excel():
                         SELECT 
                             h.original_score_id, h.user_id, h.evaluator_name, h.evaluator_class,
                             h.target_grade, h.target_class, h.score1, h.score2, h.score3, h.total,
-                            h.note, h.original_created_at as created_at, h.overwritten_at, h.overwritten_by_score_id
+                            h.note, h.original_created_at as created_at, h.overwritten_at, h.overwritten_by_score_id,
+                            h.source_type
                         FROM scores_history h
                         {history_where_condition}
                         ORDER BY {class_sorting_sql}, h.original_created_at, h.overwritten_at
@@ -1681,7 +1840,8 @@ def export_excel():
                         SELECT 
                             h.original_score_id, h.user_id, h.evaluator_name, h.evaluator_class,
                             h.target_grade, h.target_class, h.score1, h.score2, h.score3, h.total,
-                            h.note, h.original_created_at as created_at, h.overwritten_at, h.overwritten_by_score_id
+                            h.note, h.original_created_at as created_at, h.overwritten_at, h.overwritten_by_score_id,
+                            h.source_type
                         FROM scores_history h
                         {history_where_condition}
                         ORDER BY {class_sorting_sql}, h.original_created_at, h.overwritten_at
@@ -1700,7 +1860,7 @@ def export_excel():
                     history_df = pd.DataFrame(history_rows, columns=[
                         'id', 'user_id', 'evaluator_name', 'evaluator_class', 'target_grade', 
                         'target_class', 'score1', 'score2', 'score3', 'total', 
-                        'note', 'created_at', 'overwritten_at', 'overwritten_by_score_id'
+                        'note', 'created_at', 'overwritten_at', 'overwritten_by_score_id', 'source_type'
                     ])
                     
                     # 统一处理时区
@@ -1714,16 +1874,10 @@ def export_excel():
                         history_month_df = history_df.copy()
                         
                         # 计算历史记录的周期（用于显示）
-                        history_month_df['date_only'] = history_month_df['created_at'].dt.date
-                        history_month_df['period_number'] = history_month_df['date_only'].apply(lambda x: get_biweekly_period(x)[0])
-                        history_month_df['period_end_date'] = history_month_df['date_only'].apply(lambda x: get_biweekly_period(x)[1])
+                        assign_periods(history_month_df)
                         
                         history_month_df['记录类型'] = '历史记录(已覆盖)'
                         history_month_df['评分周期'] = history_month_df['period_number'].apply(lambda x: f"第{x + 1}周期")
-                        # 确保 source_type 列存在
-                        if 'source_type' not in history_month_df.columns:
-                            history_month_df['source_type'] = 'info_commissioner'
-                        
                         print(f"✅ 最终历史记录: {len(history_month_df)}条")
                         
                         # 合并当前和历史记录
@@ -1731,10 +1885,7 @@ def export_excel():
                     else:
                         # 按月份导出时，需要按周期过滤历史记录
                         # 计算历史记录的周期（和当前记录使用相同逻辑）
-                        history_df['date_only'] = history_df['created_at'].dt.date
-                        history_df['period_number'] = history_df['date_only'].apply(lambda x: get_biweekly_period(x)[0])
-                        history_df['period_end_date'] = history_df['date_only'].apply(lambda x: get_biweekly_period(x)[1])
-                        history_df['period_month'] = history_df['period_end_date'].apply(lambda x: x.strftime('%Y-%m'))
+                        assign_periods(history_df)
                         
                         # 按周期归属过滤历史记录（和当前记录使用相同逻辑）
                         history_month_df = history_df[history_df['period_month'] == month].copy()
@@ -1745,10 +1896,7 @@ def export_excel():
                             history_month_df = history_df[history_df['created_month'] == month].copy()
                             if not history_month_df.empty:
                                 # 重新计算周期信息
-                                history_month_df['date_only'] = history_month_df['created_at'].dt.date
-                                history_month_df['period_number'] = history_month_df['date_only'].apply(lambda x: get_biweekly_period(x)[0])
-                                history_month_df['period_end_date'] = history_month_df['date_only'].apply(lambda x: get_biweekly_period(x)[1])
-                                history_month_df['period_month'] = history_month_df['period_end_date'].apply(lambda x: x.strftime('%Y-%m'))
+                                assign_periods(history_month_df)
                                 print(f"⚠️ 历史记录按原始月份筛选: {len(history_month_df)}条")
                         
                         if not history_month_df.empty:
@@ -1767,7 +1915,7 @@ def export_excel():
                     all_records = current_detail_df
                 
                 # 添加数据来源标记
-                all_records['数据来源'] = all_records.get('source_type', 'info_commissioner').apply(
+                all_records['数据来源'] = all_records['source_type'].fillna('info_commissioner').apply(
                     lambda x: '新媒体委员' if x == 'new_media_officer' else '信息委员'
                 )
                 
@@ -1803,11 +1951,17 @@ def export_excel():
             # 确保数据库连接被关闭
             if conn:
                 try:
-                    put_conn(conn)
+                    put_reporting_conn(conn)
                 except Exception as e:
                     print(f"Error putting conn back to pool: {e}")
                     pass
         
+        if cache_path:
+            try:
+                store_cached_workbook(filepath, cache_path)
+            except OSError as e:
+                print(f"⚠️ 报表缓存保存失败: {e}")
+        
         return send_file(filepath, as_attachment=True, download_name=filename)
     
     except Exception as e:
@@ -1816,12 +1970,22 @@ def export_excel():
         print(traceback.format_exc())
         if conn:
             try:
-                put_conn(conn)
+                put_reporting_conn(conn)
             except Exception as conn_error:
                 print(f"数据库连接关闭错误: {conn_error}")
                 pass
         return f"导出失败：{str(e)}", 500
 
+def _grade_stats_from_totals(grade_totals):
+    """年级统计（VCE年级合并），按显示年级排序；grade_totals 为 grade_score_totals 的返回值"""
+    merged = {}
+    for grade, entry in grade_totals.items():
+        display_grade = 'VCE' if 'VCE' in grade else grade
+        count, total = merged.get(display_grade, (0, 0.0))
+        merged[display_grade] = (count + entry['count'], total + entry['total'])
+    return [{'display_grade': display_grade, 'count': count, 'avg_score': total / count}
+            for display_grade, (count, total) in sorted(merged.items()) if count]
+
 @app.route('/admin')
 @login_required
 def admin():
@@ -1829,24 +1993,20 @@ def admin():
     if not (current_user.is_admin() or current_user.is_teacher()):
         return "权限不足", 403
     
-    conn = get_conn()
+    conn = get_reporting_conn()
     try:
         cur = conn.cursor()
         
         # 获取统计数据
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
+        dialect = get_dialect()
         
-        # 今日统计 - 使用数据库兼容的时区处理
-        if is_sqlite:
-            today_condition = "DATE(created_at) = DATE('now')"
-            month_condition = "strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')"
-            date_format = "strftime('%Y-%m-%d', created_at)"
-        else:
-            # PostgreSQL - 使用 AT TIME ZONE 确保时区一致
-            today_condition = "DATE(created_at AT TIME ZONE 'Asia/Shanghai') = CURRENT_DATE"
-            month_condition = "DATE_TRUNC('month', created_at AT TIME ZONE 'Asia/Shanghai') = DATE_TRUNC('month', CURRENT_DATE)"
-            date_format = "to_char(created_at AT TIME ZONE 'Asia/Shanghai', 'YYYY-MM-DD')"
+        # 今日统计 - 按本地时区计算时间范围，条件直接比较 created_at 以便使用索引
+        local_today = get_current_time().date()
+        today_condition = f"created_at >= {dialect.p} AND created_at < {dialect.p}"
+        today_params = dialect.day_range(local_today, local_today)
+        date_format = dialect.local_day_text("created_at")
+        # 每日趋势的起点：最近7天（含今天）的本地零点
+        trend_start = dialect.day_range(local_today - timedelta(days=6), local_today)[0]
         
         # 教师只能查看本年级数据，但全校数据教师可以查看所有数据
         if current_user.is_teacher():
@@ -1888,41 +2048,26 @@ def admin():
         cur.execute("SELECT COUNT(*) as total FROM users")
         total_users = cur.fetchone()['total']
         
-        if current_user.is_teacher():
-            # 检查是否是全校数据教师
-            if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
-                # 全校数据教师可以查看所有数据
-                cur.execute("SELECT COUNT(*) as total FROM scores")
-            else:
-                # 普通教师只能查看本年级数据 - 使用数据库兼容的占位符
-                placeholder = get_db_placeholder()
-                cur.execute(f"SELECT COUNT(*) as total FROM scores WHERE target_grade LIKE {placeholder}", (f'%{teacher_grade}%',))
-        else:
-            cur.execute("SELECT COUNT(*) as total FROM scores")
-        total_scores = cur.fetchone()['total']
-        
-        if current_user.is_teacher():
-            if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
-                cur.execute("SELECT AVG(total) as avg FROM scores")
-            else:
-                placeholder = get_db_placeholder()
-                cur.execute(f"SELECT AVG(total) as avg FROM scores WHERE target_grade LIKE {placeholder}", (f'%{teacher_grade}%',))
-        else:
-            cur.execute("SELECT AVG(total) as avg FROM scores")
-        avg_score = cur.fetchone()['avg'] or 0
+        # 评分总数和平均分：已结束并冻结的周期读取快照，其余记录实时汇总
+        # 普通教师只统计本年级（全校数据教师和管理员 teacher_grade 为 None）
+        grade_totals = grade_score_totals(conn)
+        if teacher_grade:
+            grade_totals = {grade: entry for grade, entry in grade_totals.items() if teacher_grade in grade}
+        total_scores = sum(entry['count'] for entry in grade_totals.values())
+        avg_score = sum(entry['total'] for entry in grade_totals.values()) / total_scores if total_scores else 0
         
         # 今日评分
         if current_user.is_teacher():
             if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
-                cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}")
+                cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}", today_params)
             else:
                 if teacher_grade:
                     placeholder = get_db_placeholder()
-                    cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition} AND target_grade LIKE {placeholder}", (f'%{teacher_grade}%',))
+                    cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition} AND target_grade LIKE {placeholder}", today_params + (f'%{teacher_grade}%',))
                 else:
-                    cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}")
+                    cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}", today_params)
         else:
-            cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}")
+            cur.execute(f"SELECT COUNT(*) as today FROM scores WHERE {today_condition}", today_params)
         today_scores = cur.fetchone()['today']
         
         # 最近评分记录（根据教师类型显示不同数据）
@@ -2134,34 +2279,14 @@ def admin():
                 # 检查是否是全校数据教师
                 if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
                     # 全校数据教师看年级分布
-                    cur.execute('''
-                        SELECT 
-                            CASE 
-                                WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                ELSE target_grade 
-                            END as display_grade,
-                            COUNT(*) as count, 
-                            AVG(total) as avg_score
-                        FROM scores 
-                        GROUP BY 
-                            CASE 
-                                WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                ELSE target_grade 
-                            END
-                        ORDER BY 
-                            CASE 
-                                WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                ELSE target_grade 
-                            END
-                    ''')
-                    grade_stats = cur.fetchall()
+                    grade_stats = _grade_stats_from_totals(grade_totals)
                 else:
                     # 普通教师看本年级各班级的本周期完成情况
                     # 使用学期配置计算当前周期
                     try:
-                        config_data = get_current_semester_config(conn)
-                        if config_data:
-                            period_info = calculate_period_info(semester_config=config_data['semester'])
+                        current_period = get_current_period(conn)
+                        if current_period:
+                            period_info = current_period['current']
                         else:
                             # 回退到默认逻辑
                             period_info = calculate_period_info()
@@ -2178,13 +2303,6 @@ def admin():
                         
                         # 尝试基于学期配置中的活跃班级查询
                         placeholder = get_db_placeholder()
-                        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-                        is_sqlite = db_url.startswith("sqlite")
-
-                        if is_sqlite:
-                            date_func = "DATE(s.created_at)"
-                        else:
-                            date_func = "DATE(s.created_at AT TIME ZONE 'Asia/Shanghai')"
                         
                         grade_placeholders = ','.join([placeholder for _ in teacher_grades])
                         cur.execute(f'''
@@ -2195,64 +2313,22 @@ def admin():
                             FROM semester_classes sc
                             LEFT JOIN users u ON sc.class_name = u.class_name AND u.role = 'student'
                             LEFT JOIN scores s ON u.id = s.user_id
-                                AND {date_func} >= {placeholder}
-                                AND {date_func} <= {placeholder}
+                                AND s.created_at >= {placeholder}
+                                AND s.created_at < {placeholder}
                             WHERE sc.is_active = 1
                                 AND sc.semester_id = (SELECT id FROM semester_config WHERE is_active = 1)
                                 AND sc.grade_name IN ({grade_placeholders})
                             GROUP BY sc.class_name, sc.grade_name
                             ORDER BY {generate_class_sorting_sql("sc.grade_name", "sc.class_name")}
-                        ''', [period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')] + teacher_grades)
+                        ''', list(get_dialect().day_range(period_start, period_end)) + teacher_grades)
                         grade_stats = cur.fetchall()
                     except Exception as semester_error:
                         print(f"学期配置查询失败，回退到简单统计: {semester_error}")
                         # 回退到简单的年级统计
-                        placeholder = get_db_placeholder()
-                        cur.execute(f'''
-                            SELECT 
-                                CASE 
-                                    WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                    ELSE target_grade 
-                                END as display_grade,
-                                COUNT(*) as count, 
-                                AVG(total) as avg_score
-                            FROM scores 
-                            WHERE target_grade LIKE {placeholder}
-                            GROUP BY 
-                                CASE 
-                                    WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                    ELSE target_grade 
-                                END
-                            ORDER BY 
-                                CASE 
-                                    WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                                    ELSE target_grade 
-                                END
-                        ''', (f'%{teacher_grade}%',))
-                        grade_stats = cur.fetchall()
+                        grade_stats = _grade_stats_from_totals(grade_totals)
             else:
                 # 管理员看年级分布
-                cur.execute('''
-                    SELECT 
-                        CASE 
-                            WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                            ELSE target_grade 
-                        END as display_grade,
-                        COUNT(*) as count, 
-                        AVG(total) as avg_score
-                    FROM scores 
-                    GROUP BY 
-                        CASE 
-                            WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                            ELSE target_grade 
-                        END
-                    ORDER BY 
-                        CASE 
-                            WHEN target_grade LIKE '%VCE%' THEN 'VCE'
-                            ELSE target_grade 
-                        END
-                ''')
-                grade_stats = cur.fetchall()
+                grade_stats = _grade_stats_from_totals(grade_totals)
         except Exception as grade_error:
             print(f"年级统计查询失败: {grade_error}")
             grade_stats = []  # 设置为空列表，避免页面崩溃
@@ -2260,79 +2336,23 @@ def admin():
         # 每日趋势（最近7天，根据教师类型显示不同数据）
         daily_trend = []
         try:
+            trend_filter = ""
+            trend_params = [trend_start]
             if current_user.is_teacher():
                 if current_user.class_name and ('全校' in current_user.class_name or 'ALL' in current_user.class_name.upper()):
                     # 全校数据教师看所有趋势
-                    if is_sqlite:
-                        cur.execute(f'''
-                            SELECT {date_format} as date, COUNT(*) as count
-                            FROM scores 
-                            WHERE created_at >= datetime('now', '-7 days')
-                            GROUP BY {date_format}
-                            ORDER BY date
-                        ''')
-                    else:
-                        cur.execute(f'''
-                            SELECT {date_format} as date, COUNT(*) as count
-                            FROM scores 
-                            WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'
-                            GROUP BY {date_format}
-                            ORDER BY date
-                        ''')
-                else:
+                    pass
+                elif teacher_grade:
                     # 普通教师只看本年级趋势
-                    if teacher_grade:
-                        placeholder = get_db_placeholder()
-                        if is_sqlite:
-                            cur.execute(f'''
-                                SELECT {date_format} as date, COUNT(*) as count
-                                FROM scores 
-                                WHERE created_at >= datetime('now', '-7 days') AND target_grade LIKE {placeholder}
-                                GROUP BY {date_format}
-                                ORDER BY date
-                            ''', (f'%{teacher_grade}%',))
-                        else:
-                            cur.execute(f'''
-                                SELECT {date_format} as date, COUNT(*) as count
-                                FROM scores 
-                                WHERE created_at >= CURRENT_DATE - INTERVAL '7 days' AND target_grade LIKE {placeholder}
-                                GROUP BY {date_format}
-                                ORDER BY date
-                            ''', (f'%{teacher_grade}%',))
-                    else:
-                        if is_sqlite:
-                            cur.execute(f'''
-                                SELECT {date_format} as date, COUNT(*) as count
-                                FROM scores 
-                                WHERE created_at >= datetime('now', '-7 days')
-                                GROUP BY {date_format}
-                                ORDER BY date
-                            ''')
-                        else:
-                            cur.execute(f'''
-                                SELECT {date_format} as date, COUNT(*) as count
-                                FROM scores 
-                                WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'
-                                GROUP BY {date_format}
-                                ORDER BY date
-                            ''')
-            else:
-                if is_sqlite:
-                    cur.execute(f'''
-                        SELECT {date_format} as date, COUNT(*) as count
-                        FROM scores 
-                        WHERE created_at >= datetime('now', '-7 days')
-                        GROUP BY {date_format}
-                        ORDER BY date
-                    ''')
-                else:
-                    cur.execute(f'''
-                        SELECT {date_format} as date, COUNT(*) as count
-                        FROM scores 
-                        WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'
-                        GROUP BY {date_format}
-                        ORDER BY date
-                    ''')
+                    trend_filter = f" AND target_grade LIKE {dialect.p}"
+                    trend_params.append(f'%{teacher_grade}%')
+            cur.execute(f'''
+                SELECT {date_format} as date, COUNT(*) as count
+                FROM scores 
+                WHERE created_at >= {dialect.p}{trend_filter}
+                GROUP BY {date_format}
+                ORDER BY date
+            ''', trend_params)
             daily_trend_raw = cur.fetchall()
             # 确保日期格式统一为 YYYY-MM-DD 字符串，便于前端处理
             daily_trend = [{'date': row['date'], 'count': row['count']} for row in daily_trend_raw]
@@ -2364,7 +2384,7 @@ def admin():
         # 返回错误信息，帮助调试
         return f"Admin 页面错误: {str(e)}<br><br>详细信息:<br><pre>{traceback.format_exc()}</pre>", 500
     finally:
-        put_conn(conn)
+        put_reporting_conn(conn)
 
 @app.route('/success')
 @login_required
@@ -2378,19 +2398,16 @@ def api_stats():
     """获取统计数据"""
     conn = get_conn()
     try:
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
+        dialect = get_dialect()
+        placeholder = dialect.placeholder
         
         cur = conn.cursor()
         
-        # 今日统计
-        if is_sqlite:
-            today_condition = "DATE(created_at) = DATE('now')"
-            month_condition = "strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')"
-        else:
-            today_condition = "DATE(created_at) = CURRENT_DATE"
-            month_condition = "DATE_TRUNC('month', created_at) = DATE_TRUNC('month', CURRENT_DATE)"
+        # 今日/本月的本地时区时间范围（半开区间，可使用 created_at 索引）
+        now = get_current_time()
+        range_condition = f"created_at >= {placeholder} AND created_at < {placeholder}"
+        today_params = dialect.day_range(now.date(), now.date())
+        month_params = dialect.month_range(now.strftime('%Y-%m'))
         
         # 今日统计
         cur.execute(f"""
@@ -2399,8 +2416,8 @@ def api_stats():
                 AVG(total) as avg_score,
                 COUNT(DISTINCT evaluator_class) as active_classes
             FROM scores 
-            WHERE {today_condition}
-        """)
+            WHERE {range_condition}
+        """, today_params)
         today_stats = cur.fetchone()
         
         # 本月统计
@@ -2410,8 +2427,8 @@ def api_stats():
                 AVG(total) as avg_score,
                 COUNT(DISTINCT evaluator_class) as active_classes
             FROM scores 
-            WHERE {month_condition}
-        """)
+            WHERE {range_condition}
+        """, month_params)
         month_stats = cur.fetchone()
         
         # 各年级平均分（VCE年级合并）
@@ -2424,14 +2441,14 @@ def api_stats():
                 AVG(total) as avg_score,
                 COUNT(*) as count
             FROM scores 
-            WHERE {today_condition}
+            WHERE {range_condition}
             GROUP BY 
                 CASE 
                     WHEN target_grade LIKE '%VCE%' THEN 'VCE'
                     ELSE target_grade 
                 END
             ORDER BY avg_score DESC
-        """)
+        """, today_params)
         grade_stats = cur.fetchall()
         
         return jsonify({
@@ -2442,6 +2459,24 @@ def api_stats():
     finally:
         put_conn(conn)
 
+@app.route('/api/admin/db_stats', methods=['GET', 'DELETE'])
+@login_required
+def api_db_stats():
+    """数据库连接与命名语句的使用统计（管理员）；DELETE 清空汇总"""
+    if not current_user.is_admin():
+        return jsonify(success=False, message="权限不足"), 403
+
+    if request.method == 'DELETE':
+        reset_connection_stats()
+        return jsonify(success=True)
+
+    dialect = get_dialect()
+    return jsonify(success=True,
+                   dialect=dialect.name,
+                   connections=get_connection_stats(),
+                   prepared_statements=sorted(dialect.prepared),
+                   statements=get_statement_stats())
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -2632,8 +2667,7 @@ if __name__ == "__main__":
         cur = conn.cursor()
         
         # 检测数据库类型
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
+        is_sqlite = get_dialect().is_sqlite
         
         # 检查关键表是否存在
         if is_sqlite:
@@ -8,7 +8,7 @@ timeout = 120  # 增加到120秒以支持批量操作
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
+preload_app = True  # 数据库连接池在 worker fork 之后按进程懒加载创建
 
 # 日志配置
 accesslog = "-"
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+评分周期落库迁移脚本
+为 scores / scores_history 添加 semester_id、period_number 字段，
+按 period_metadata 回填已有记录，并创建按周期查询用的索引
+
+可重复执行：已存在的字段和索引会跳过，只回填 period_number 为空的记录
+"""
+
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from classcomp.database import get_conn, put_conn
+from classcomp.database.dialect import get_dialect
+from classcomp.database.indexes import HOT_INDEXES
+from classcomp.utils.period_utils import calculate_period_info_v2, get_current_semester_config
+from classcomp.utils.time_utils import parse_database_timestamp
+
+BATCH_SIZE = 500
+
+# (表, 时间字段)
+TABLES = (
+    ('scores', 'created_at'),
+    ('scores_history', 'original_created_at'),
+)
+
+PERIOD_INDEXES = ('idx_scores_period', 'idx_scores_history_period')
+
+
+def _add_columns(conn, cur, is_sqlite):
+    """添加 semester_id / period_number 字段"""
+    for table, _ in TABLES:
+        for column in ('semester_id', 'period_number'):
+            try:
+                if is_sqlite:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+                else:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} INTEGER")
+                conn.commit()
+                print(f"  ✓ {table}.{column} 字段已添加")
+            except Exception as e:
+                conn.rollback()
+                if "duplicate column" in str(e).lower() or "already exists" in str(e).lower():
+                    print(f"  ℹ {table}.{column} 字段已存在，跳过")
+                else:
+                    raise
+
+
+def _backfill_table(conn, cur, table, time_column, semester, period_cache):
+    """按记录的本地日期计算所属周期并回填，返回 (回填条数, 无法确定周期的条数)"""
+    placeholder = get_dialect().placeholder
+    cur.execute(f"SELECT id, {time_column} AS created_at FROM {table} WHERE period_number IS NULL")
+    rows = cur.fetchall()
+
+    updates = []
+    unresolved = 0
+    for row in rows:
+        try:
+            day = parse_database_timestamp(row['created_at']).date()
+        except Exception as e:
+            print(f"  ⚠ 时间格式解析错误: {row['created_at']}, 错误: {e}")
+            unresolved += 1
+            continue
+
+        if day not in period_cache:
+            period_info = calculate_period_info_v2(target_date=day, semester_config=semester, conn=conn)
+            # 旧版回退计算的周期（早于当前学期等）没有学期ID，保持为空
+            if period_info.get('semester_id') is not None:
+                period_cache[day] = (period_info['semester_id'], period_info['period_number'])
+            else:
+                period_cache[day] = None
+
+        if period_cache[day] is None:
+            unresolved += 1
+            continue
+        semester_id, period_number = period_cache[day]
+        updates.append((semester_id, period_number, row['id']))
+
+    sql = f"UPDATE {table} SET semester_id = {placeholder}, period_number = {placeholder} WHERE id = {placeholder}"
+    for start in range(0, len(updates), BATCH_SIZE):
+        cur.executemany(sql, updates[start:start + BATCH_SIZE])
+        conn.commit()
+
+    return len(updates), unresolved
+
+
+def add_score_period_columns():
+    """添加评分周期字段并回填"""
+    conn = get_conn()
+    cur = conn.cursor()
+
+    try:
+        is_sqlite = get_dialect().is_sqlite
+
+        print("开始评分周期字段迁移...")
+
+        print("步骤1: 添加周期字段...")
+        _add_columns(conn, cur, is_sqlite)
+
+        print("步骤2: 回填已有记录的周期...")
+        config_data = get_current_semester_config(conn)
+        if not config_data:
+            print("  ⚠ 未找到活跃学期配置，跳过回填")
+        else:
+            period_cache = {}
+            for table, time_column in TABLES:
+                filled, unresolved = _backfill_table(conn, cur, table, time_column,
+                                                     config_data['semester'], period_cache)
+                print(f"  ✓ {table}: 回填 {filled} 条，{unresolved} 条不属于当前学期的周期，保持为空")
+
+        print("步骤3: 创建索引...")
+        for index_name, table, columns in HOT_INDEXES:
+            if index_name not in PERIOD_INDEXES:
+                continue
+            try:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"  ⚠ 索引创建警告: {e}")
+        print("  ✓ 索引创建完成")
+
+        print("\n✅ 评分周期字段迁移完成！")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+    finally:
+        put_conn(conn)
+
+
+if __name__ == "__main__":
+    add_score_period_columns()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+评分唯一约束迁移脚本
+为 scores 创建 (评分人, 学期, 周期, 年级, 班级) 唯一索引和覆盖归档触发器，
+之后提交评分使用 INSERT ... ON CONFLICT DO UPDATE
+
+需要先运行 add_score_period_columns.py（依赖 semester_id / period_number 字段）；
+已有的重复记录只保留最新一条，其余归档到 scores_history（会扫描整个 scores 表）。
+升级时运行一次即可，之后启动时 pre_start 只确认索引和触发器存在
+"""
+
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from classcomp.database import get_conn, put_conn
+from classcomp.database.score_constraints import create_score_period_constraint
+
+
+def add_score_period_constraint():
+    """创建评分唯一约束"""
+    conn = get_conn()
+    try:
+        print("🔧 创建评分唯一约束和覆盖归档触发器...")
+        archived = create_score_period_constraint(conn)
+        if archived:
+            print(f"  ✓ 已归档 {archived} 条同周期重复评分")
+        print("✅ 评分唯一约束已就绪")
+    except Exception as e:
+        print(f"❌ 迁移失败: {e}")
+        raise
+    finally:
+        put_conn(conn)
+
+
+if __name__ == "__main__":
+    add_score_period_constraint()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+周期关闭任务
+为当前学期中已经结束、还没有快照的周期冻结汇总数据（各班平均分、加权平均分、
+评分条数、评分矩阵）到 period_snapshots 表
+
+可重复执行，建议每天零点后运行一次（如 cron: 10 0 * * *）；
+首次运行会创建 period_snapshots 表
+"""
+
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from classcomp.database import get_conn, put_conn
+from classcomp.utils.period_snapshots import create_period_snapshots_table, close_ended_periods
+
+
+if __name__ == "__main__":
+    conn = get_conn()
+    try:
+        create_period_snapshots_table(conn)
+        print("📦 冻结已结束周期的汇总数据...")
+        closed = close_ended_periods(conn)
+        print(f"✅ 完成，新冻结 {closed} 个周期")
+    except Exception as e:
+        print(f"❌ 周期关闭失败: {e}")
+        sys.exit(1)
+    finally:
+        put_conn(conn)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+热点查询复合索引迁移 + 执行计划检查
+
+用法：
+    python scripts/create_hot_indexes.py            创建缺失的索引，然后检查执行计划
+    python scripts/create_hot_indexes.py --check    只检查执行计划
+    python scripts/create_hot_indexes.py --verbose  同时打印每条语句的执行计划
+
+存在全表扫描或 EXPLAIN 出错的语句时以退出码 1 结束，可直接用于部署检查
+"""
+
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from classcomp.database import get_conn, put_conn
+from classcomp.database.indexes import create_hot_indexes, check_query_plans
+
+
+def run_migration():
+    """创建热点查询索引"""
+    conn = get_conn()
+    try:
+        print("🔧 创建热点查询索引...")
+        failed = 0
+        for index_name, status, error in create_hot_indexes(conn):
+            if status == 'ok':
+                print(f"  ✅ {index_name}")
+            else:
+                failed += 1
+                print(f"  ❌ {index_name}: {error}")
+        return failed == 0
+    finally:
+        put_conn(conn)
+
+
+def run_plan_check(verbose=False):
+    """检查所有命名语句的执行计划，没有全表扫描时返回 True"""
+    conn = get_conn()
+    try:
+        print("🔍 检查命名语句执行计划...")
+        results = check_query_plans(conn)
+    finally:
+        put_conn(conn)
+
+    problems = 0
+    for item in results:
+        if item['status'] == 'ok':
+            print(f"  ✅ {item['name']}")
+        elif item['status'] == 'skipped':
+            print(f"  ⏭️ {item['name']}（无示例参数，跳过）")
+        elif item['status'] == 'full_scan':
+            problems += 1
+            print(f"  ❌ {item['name']}: 全表扫描 {', '.join(item['full_scans'])}")
+        else:
+            problems += 1
+            print(f"  ❌ {item['name']}: EXPLAIN 失败 {item['error']}")
+        if verbose:
+            for line in item['plan']:
+                print(f"      {line}")
+
+    checked = sum(1 for item in results if item['status'] != 'skipped')
+    if problems:
+        print(f"💥 {checked} 条语句中有 {problems} 条存在问题")
+    else:
+        print(f"🎉 {checked} 条语句均使用索引")
+    return problems == 0
+
+
+if __name__ == "__main__":
+    verbose = '--verbose' in sys.argv
+    ok = True
+    if '--check' not in sys.argv:
+        ok = run_migration()
+    ok = run_plan_check(verbose) and ok
+    sys.exit(0 if ok else 1)
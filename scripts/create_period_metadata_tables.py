@@ -118,6 +118,11 @@ def create_period_metadata_tables():
         conn.commit()
         print("✅ 周期元数据表结构创建完成")
         
+        # 已结束周期的汇总快照表
+        from classcomp.utils.period_snapshots import create_period_snapshots_table
+        create_period_snapshots_table(conn)
+        print("✅ period_snapshots 表创建完成")
+        
         # 验证表是否创建成功
         if is_sqlite:
             cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('period_metadata', 'period_config_history')")
@@ -89,6 +89,10 @@ def create_semester_tables():
         conn.commit()
         print("✅ 学期配置表结构创建完成")
         
+        # 学期配置缓存的版本号表
+        from classcomp.database.cache_versions import create_cache_versions_table
+        create_cache_versions_table(conn)
+        
         # 检查是否需要创建默认数据
         cur.execute('SELECT COUNT(*) as count FROM semester_config WHERE is_active = 1')
         result = cur.fetchone()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+学期周期预生成脚本
+为当前活跃学期一次性生成到学期结束日期为止的全部 period_metadata 记录
+
+可重复执行：只追加最后一个已有周期之后缺失的周期
+"""
+
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from classcomp.utils.period_utils import ensure_semester_periods
+
+
+if __name__ == "__main__":
+    print("📅 预生成当前学期周期...")
+    created = ensure_semester_periods()
+    if created is None:
+        sys.exit(1)
+    print(f"✅ 完成，新生成 {created} 个周期")
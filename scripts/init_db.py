@@ -52,7 +52,10 @@ def init_database():
                     total INTEGER NOT NULL,
                     note TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    semester_id INTEGER,
+                    period_number INTEGER,
+                    source_type VARCHAR(30) DEFAULT 'info_commissioner'
                 )
             """)
             
@@ -73,7 +76,10 @@ def init_database():
                     note TEXT,
                     original_created_at TIMESTAMP NOT NULL,
                     overwritten_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    overwritten_by_score_id INTEGER DEFAULT 0
+                    overwritten_by_score_id INTEGER DEFAULT 0,
+                    semester_id INTEGER,
+                    period_number INTEGER,
+                    source_type VARCHAR(30) DEFAULT 'info_commissioner'
                 )
             """)
             
@@ -116,7 +122,10 @@ def init_database():
                     total INTEGER GENERATED ALWAYS AS (score1 + score2 + score3) STORED,
                     note TEXT,
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    semester_id INTEGER,
+                    period_number INTEGER,
+                    source_type VARCHAR(30) DEFAULT 'info_commissioner'
                 )
             """)
             
@@ -137,7 +146,10 @@ def init_database():
                     note TEXT,
                     original_created_at TIMESTAMP WITH TIME ZONE NOT NULL,
                     overwritten_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    overwritten_by_score_id INTEGER DEFAULT 0
+                    overwritten_by_score_id INTEGER DEFAULT 0,
+                    semester_id INTEGER,
+                    period_number INTEGER,
+                    source_type VARCHAR(30) DEFAULT 'info_commissioner'
                 )
             """)
             
@@ -305,7 +317,56 @@ def init_database():
             import traceback
             traceback.print_exc()
             raise semester_error
-        
+
+        # 热点索引和命名语句依赖的表和字段：学期周期类型字段、周期元数据表、权重配置表
+        # （新媒体委员账号不在这里创建，见 add_new_media_officer_support.py）
+        print("扩展学期配置表...")
+        from scripts.alter_semester_config_tables import alter_semester_config_tables
+        alter_semester_config_tables()
+        print("创建周期元数据表...")
+        from scripts.create_period_metadata_tables import create_period_metadata_tables
+        create_period_metadata_tables()
+        print("创建权重配置表...")
+        if is_sqlite:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS score_weight_config (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    config_name VARCHAR(100) NOT NULL,
+                    new_media_weight REAL DEFAULT 1.5 CHECK (new_media_weight >= 1.0 AND new_media_weight <= 5.0),
+                    info_commissioner_weight REAL DEFAULT 1.0 CHECK (info_commissioner_weight >= 1.0 AND info_commissioner_weight <= 5.0),
+                    description TEXT,
+                    is_active BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        else:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS score_weight_config (
+                    id SERIAL PRIMARY KEY,
+                    config_name VARCHAR(100) NOT NULL,
+                    new_media_weight REAL DEFAULT 1.5 CHECK (new_media_weight >= 1.0 AND new_media_weight <= 5.0),
+                    info_commissioner_weight REAL DEFAULT 1.0 CHECK (info_commissioner_weight >= 1.0 AND info_commissioner_weight <= 5.0),
+                    description TEXT,
+                    is_active BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        conn.commit()
+
+        # 所有表创建完成后再建热点查询复合索引（新库表为空，无需 CONCURRENTLY）
+        print("创建热点查询索引...")
+        from classcomp.database.indexes import create_hot_indexes
+        for index_name, status, error in create_hot_indexes(conn, concurrently=False):
+            if status != 'ok':
+                print(f"⚠️ 索引 {index_name} 创建失败: {error}")
+
+        # 提交评分依赖的唯一约束和覆盖归档触发器（新库没有重复记录，无需迁移）
+        print("创建评分唯一约束...")
+        from classcomp.database.score_constraints import ensure_score_period_constraint
+        ensure_score_period_constraint(conn)
+
     except Exception as e:
         conn.rollback()
         print(f"数据库初始化失败: {e}")
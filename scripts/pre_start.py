@@ -115,6 +115,40 @@ def check_database_connection():
                 missing_semester_tables.append(table_name)
                 print(f"❌ {table_name} 表不存在")
         
+        # 学期配置缓存依赖 cache_versions 表，旧库在这里补建
+        try:
+            from classcomp.database.cache_versions import create_cache_versions_table
+            create_cache_versions_table(conn)
+            print("✅ cache_versions 表已就绪")
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ cache_versions 表创建失败（学期配置将不使用缓存）: {e}")
+        
+        # 提交评分依赖 scores 上的唯一约束（ON CONFLICT DO UPDATE）；缺表时由下面的 init_database 创建
+        if not missing_tables:
+            try:
+                from classcomp.database.score_constraints import ensure_score_period_constraint
+                ensure_score_period_constraint(conn)
+                print("✅ 评分唯一约束已就绪")
+            except Exception as e:
+                conn.rollback()
+                print(f"⚠️ 评分唯一约束创建失败（请先运行 add_score_period_columns.py 和 add_score_period_constraint.py）: {e}")
+        
+        # 补齐当前学期的周期，请求路径上不再写入 period_metadata
+        if not missing_semester_tables:
+            from classcomp.utils.period_utils import ensure_semester_periods
+            ensure_semester_periods(conn)
+            
+            # 为已结束的周期生成汇总快照
+            try:
+                from classcomp.utils.period_snapshots import create_period_snapshots_table, close_ended_periods
+                create_period_snapshots_table(conn)
+                closed = close_ended_periods(conn)
+                print(f"✅ period_snapshots 已就绪（新冻结 {closed} 个周期）")
+            except Exception as e:
+                conn.rollback()
+                print(f"⚠️ 周期快照生成失败: {e}")
+        
         put_conn(conn)
         
         # 如果有缺失的表，尝试初始化数据库
@@ -1,8 +1,17 @@
-"""
-数据库模块包 - 数据库连接和管理
-Database connection management for ClassComp Score system.
-"""
-
-from classcomp.database.connection import get_conn, put_conn
-
-__all__ = ['get_conn', 'put_conn']
\ No newline at end of file
+"""
+数据库模块包 - 数据库连接和管理
+Database connection management for ClassComp Score system.
+"""
+
+from classcomp.database.connection import (
+    get_conn, put_conn, get_reporting_conn, put_reporting_conn, init_app,
+    get_connection_stats, reset_connection_stats,
+    submit_write, run_write, run_writes, WriteTimeoutError,
+)
+from classcomp.database.dialect import get_dialect
+from classcomp.database.prepared import get_statement_stats
+
+__all__ = ['get_conn', 'put_conn', 'get_reporting_conn', 'put_reporting_conn', 'init_app',
+           'get_connection_stats', 'reset_connection_stats',
+           'submit_write', 'run_write', 'run_writes', 'WriteTimeoutError',
+           'get_dialect', 'get_statement_stats']
\ No newline at end of file
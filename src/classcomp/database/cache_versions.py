@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+跨进程缓存版本号
+进程内缓存（学期配置、周期日历等）以 cache_versions 表中的版本号为准：
+写入方在同一事务中递增版本号，各 gunicorn worker 每个请求最多读取一次版本号，
+发现变化就丢弃本进程的缓存，无需重启
+"""
+
+from flask import g, has_request_context
+
+from classcomp.database.dialect import get_dialect
+
+SEMESTER_CONFIG = 'semester_config'
+PERIOD_METADATA = 'period_metadata'
+
+# 表是否存在只需确认一次；旧库未建表时版本号为 None，调用方不使用缓存
+_table_ready = False
+
+
+def create_cache_versions_table(conn):
+    """创建 cache_versions 表（两种数据库语法相同）"""
+    global _table_ready
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    _table_ready = True
+
+
+def _has_table(conn):
+    global _table_ready
+    if not _table_ready:
+        cur = conn.cursor()
+        get_dialect().execute(cur, 'cache_versions_table')
+        row = cur.fetchone()
+        _table_ready = bool(row and row['name'])
+    return _table_ready
+
+
+def get_cache_version(name, conn):
+    """
+    读取缓存版本号；在请求中同一名称只查询一次
+    没有 cache_versions 表时返回 None
+    """
+    versions = g.setdefault('_cache_versions', {}) if has_request_context() else None
+    if versions is not None and name in versions:
+        return versions[name]
+
+    version = None
+    if _has_table(conn):
+        cur = conn.cursor()
+        get_dialect().execute(cur, 'cache_version', (name,))
+        row = cur.fetchone()
+        version = row['version'] if row else 0
+
+    if versions is not None:
+        versions[name] = version
+    return version
+
+
+def bump_cache_version(name, conn):
+    """递增缓存版本号（不提交，随调用方的事务一起提交）"""
+    if has_request_context():
+        g.setdefault('_cache_versions', {}).pop(name, None)
+    if not _has_table(conn):
+        return
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'bump_cache_version', (name,))
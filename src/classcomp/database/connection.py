@@ -1,7 +1,12 @@
 # db.py
 import os
-import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from flask import g, has_request_context
+
+from classcomp.database.stats import ConnectionTracker
 
 load_dotenv()
 
@@ -21,36 +26,340 @@ if DB_URL.startswith('sqlite'):
     else:
         db_path = db_filename
     
-    def get_conn():
-        """获取SQLite连接"""
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row  # 使查询结果支持dict-like访问
-        return conn
+    from classcomp.database.sqlite_manager import SQLiteConnectionManager
+
+    # 每个线程复用一个持久连接；PRAGMA 可通过环境变量调整
+    _sqlite_manager = SQLiteConnectionManager(
+        db_path,
+        journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        cache_size=int(os.getenv("SQLITE_CACHE_SIZE", "-16000")),  # 负数表示 KiB，约 16MB
+        busy_timeout=int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),  # 毫秒
+    )
+
+    def _acquire_conn():
+        """获取当前线程的SQLite持久连接"""
+        return _sqlite_manager.acquire()
     
-    def put_conn(conn):
-        """关闭SQLite连接"""
-        conn.close()
+    def _release_conn(conn):
+        """归还SQLite连接（连接保持打开，未提交的事务会被回滚）"""
+        _sqlite_manager.release(conn)
+
+    # 报表查询使用单独的只读连接，与写路径的连接互不影响
+    _sqlite_reporting_manager = SQLiteConnectionManager(
+        db_path,
+        journal_mode=_sqlite_manager.journal_mode,
+        synchronous=_sqlite_manager.synchronous,
+        mmap_size=_sqlite_manager.mmap_size,
+        cache_size=_sqlite_manager.cache_size,
+        busy_timeout=_sqlite_manager.busy_timeout,
+        query_only=True,
+    )
+
+    def _acquire_reporting_conn():
+        """获取当前线程的SQLite只读报表连接"""
+        return _sqlite_reporting_manager.acquire()
+
+    def _release_reporting_conn(conn):
+        _sqlite_reporting_manager.release(conn)
+
+    def configure_pool(minconn=None, maxconn=None):
+        """SQLite 模式不使用连接池"""
+        pass
+
+    # 可选的单写线程：所有写操作串行执行并合并提交，请求线程不再争抢写锁
+    _writer = None
+    if os.getenv("SQLITE_SINGLE_WRITER", "false").lower() == "true":
+        from classcomp.database.sqlite_writer import SQLiteWriter
+
+        _writer = SQLiteWriter(
+            _sqlite_manager.connect,
+            max_batch=int(os.getenv("SQLITE_WRITER_MAX_BATCH", "64")),
+            max_delay=float(os.getenv("SQLITE_WRITER_MAX_DELAY_MS", "2")) / 1000,
+        )
+
+    def pool_stats():
+        """SQLite 模式没有连接池，连接按线程复用"""
+        if _writer is not None:
+            return {'writer': _writer.stats()}
+        return {}
 
 else:
     # PostgreSQL模式 - 生产环境
     try:
-        from psycopg2 import pool, extras
-        
-        conn_pool = pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=5,
-            dsn=DB_URL,
-            cursor_factory=extras.RealDictCursor,
-        )
-        
-        def get_conn():
-            """从池里取一个连接（记得用完再放回）"""
-            conn = conn_pool.getconn()
-            with conn.cursor() as cur:
-                cur.execute("SET timezone = 'Asia/Shanghai'")
-            return conn
-        
-        def put_conn(conn):
-            conn_pool.putconn(conn)
+        from psycopg2 import extras
     except ImportError:
-        raise ImportError("PostgreSQL模式需要psycopg2-binary包")
\ No newline at end of file
+        raise ImportError("PostgreSQL模式需要psycopg2-binary包")
+
+    from classcomp.database.pool import ConnectionPool
+
+    # 连接池配置（可通过环境变量调整）
+    POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))            # 借出等待秒数
+    POOL_VALIDATE_IDLE = float(os.getenv("DB_POOL_VALIDATE_IDLE", "30"))  # 空闲超过该秒数借出时先 SELECT 1
+    POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))   # 多余空闲连接的回收秒数
+
+    # 报表连接池：导出、管理面板等重查询单独使用，可指向只读副本
+    REPORTING_DB_URL = os.getenv("REPORTING_DATABASE_URL") or DB_URL
+    REPORTING_POOL_MAX = int(os.getenv("DB_REPORTING_POOL_MAX", "2"))
+    REPORTING_POOL_TIMEOUT = float(os.getenv("DB_REPORTING_POOL_TIMEOUT", "30"))
+    REPORTING_STATEMENT_TIMEOUT = int(os.getenv("DB_REPORTING_STATEMENT_TIMEOUT", "60000"))  # 毫秒
+
+    # 连接池在首次使用时按进程创建：gunicorn preload_app 下 master 不持有任何连接，
+    # 每个 worker fork 之后各自建立自己的连接
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    _reporting_pool = None
+    _reporting_pool_pid = None
+
+    def _reset_pool_after_fork():
+        """fork 后丢弃父进程的连接池（父进程的 socket 不能在子进程中关闭）"""
+        global _pool, _pool_pid, _pool_lock, _reporting_pool, _reporting_pool_pid
+        _pool = None
+        _pool_pid = None
+        _reporting_pool = None
+        _reporting_pool_pid = None
+        _pool_lock = threading.Lock()
+
+    if hasattr(os, 'register_at_fork'):  # Windows 没有 fork
+        os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+    def _get_pool():
+        global _pool, _pool_pid
+        pid = os.getpid()
+        if _pool is None or _pool_pid != pid:
+            with _pool_lock:
+                if _pool is None or _pool_pid != pid:
+                    _pool = ConnectionPool(
+                        dsn=DB_URL,
+                        minconn=POOL_MIN,
+                        maxconn=POOL_MAX,
+                        timeout=POOL_TIMEOUT,
+                        validate_idle=POOL_VALIDATE_IDLE,
+                        idle_timeout=POOL_IDLE_TIMEOUT,
+                        # 时区只需在建立连接时设置一次
+                        setup_statements=("SET timezone = 'Asia/Shanghai'",),
+                        connect_kwargs={'cursor_factory': extras.RealDictCursor},
+                    )
+                    _pool_pid = pid
+        return _pool
+
+    def _get_reporting_pool():
+        global _reporting_pool, _reporting_pool_pid
+        pid = os.getpid()
+        if _reporting_pool is None or _reporting_pool_pid != pid:
+            with _pool_lock:
+                if _reporting_pool is None or _reporting_pool_pid != pid:
+                    _reporting_pool = ConnectionPool(
+                        dsn=REPORTING_DB_URL,
+                        minconn=0,
+                        maxconn=REPORTING_POOL_MAX,
+                        timeout=REPORTING_POOL_TIMEOUT,
+                        validate_idle=POOL_VALIDATE_IDLE,
+                        idle_timeout=POOL_IDLE_TIMEOUT,
+                        # 报表连接只读，并限制单条语句的执行时间
+                        setup_statements=(
+                            "SET timezone = 'Asia/Shanghai'",
+                            f"SET statement_timeout = {REPORTING_STATEMENT_TIMEOUT}",
+                            "SET default_transaction_read_only = on",
+                        ),
+                        connect_kwargs={'cursor_factory': extras.RealDictCursor},
+                    )
+                    _reporting_pool_pid = pid
+        return _reporting_pool
+
+    def _acquire_conn():
+        """从池里取一个连接（记得用完再放回）"""
+        return _get_pool().getconn()
+
+    def _release_conn(conn):
+        _get_pool().putconn(conn)
+
+    def _acquire_reporting_conn():
+        """从报表连接池取一个只读连接"""
+        return _get_reporting_pool().getconn()
+
+    def _release_reporting_conn(conn):
+        _get_reporting_pool().putconn(conn)
+
+    def configure_pool(minconn=None, maxconn=None):
+        """运行时调整当前进程的连接池大小"""
+        _get_pool().resize(minconn=minconn, maxconn=maxconn)
+
+    # PostgreSQL 支持行级锁，写操作直接在请求连接上执行
+    _writer = None
+
+    def pool_stats():
+        """当前进程各连接池的状态（尚未创建的池不列出）"""
+        stats = {}
+        if _pool is not None and _pool_pid == os.getpid():
+            stats['main'] = _pool.stats()
+        if _reporting_pool is not None and _reporting_pool_pid == os.getpid():
+            stats['reporting'] = _reporting_pool.stats()
+        return stats
+
+
+# ==================== 借出统计 ====================
+# 所有借出/归还都经过这里记录，超过阈值未归还的连接会打印借出路由；
+# 记录调用栈有额外开销，只在排查泄漏时通过 DB_TRACK_STACKS=true 打开
+
+_tracker = ConnectionTracker(
+    leak_threshold=float(os.getenv("DB_LEAK_THRESHOLD", "30")),  # 秒
+    capture_stack=os.getenv("DB_TRACK_STACKS", "false").lower() == "true",
+)
+
+
+def _reset_tracker_after_fork():
+    """fork 后子进程重新统计"""
+    global _tracker
+    _tracker = ConnectionTracker(leak_threshold=_tracker.leak_threshold,
+                                 capture_stack=_tracker.capture_stack)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_tracker_after_fork)
+
+
+def _checkout(acquire, pool_name):
+    start = time.perf_counter()
+    conn = acquire()
+    _tracker.checkout(conn, pool_name, time.perf_counter() - start)
+    return conn
+
+
+def _checkin(release, conn):
+    _tracker.checkin(conn)
+    release(conn)
+
+
+def get_connection_stats():
+    """连接池状态、借出中的连接、按路由的等待/占用时间和疑似泄漏"""
+    stats = _tracker.snapshot()
+    stats['pools'] = pool_stats()
+    return stats
+
+
+def reset_connection_stats():
+    """清空按路由的汇总和峰值"""
+    _tracker.reset()
+
+
+# ==================== 请求级连接复用 ====================
+# 在 Flask 请求中，第一次 get_conn() 时才真正借出连接并存放在 flask.g 上，
+# 同一请求内的 load_user、路由函数以及传入 conn=None 的工具函数都复用这一个连接，
+# 请求结束（teardown）时统一归还。
+
+def get_conn():
+    """获取数据库连接（在请求中复用请求级连接）"""
+    if has_request_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = _checkout(_acquire_conn, 'main')
+            g._db_conn = conn
+        return conn
+    return _checkout(_acquire_conn, 'main')
+
+
+def put_conn(conn):
+    """归还数据库连接（请求级连接推迟到请求结束时归还）"""
+    if has_request_context() and g.get('_db_conn') is conn:
+        return
+    _checkin(_release_conn, conn)
+
+
+def get_reporting_conn():
+    """获取报表用的只读连接（导出、统计等重查询，不占用写路径的连接）"""
+    if has_request_context():
+        conn = g.get('_db_reporting_conn')
+        if conn is None:
+            conn = _checkout(_acquire_reporting_conn, 'reporting')
+            g._db_reporting_conn = conn
+        return conn
+    return _checkout(_acquire_reporting_conn, 'reporting')
+
+
+def put_reporting_conn(conn):
+    """归还报表连接（请求级连接推迟到请求结束时归还）"""
+    if has_request_context() and g.get('_db_reporting_conn') is conn:
+        return
+    _checkin(_release_reporting_conn, conn)
+
+
+# ==================== 写操作 ====================
+# 写操作以 fn(conn) 的形式提交：启用 SQLite 单写线程时在写线程中执行，
+# 否则直接在当前请求的连接上执行。fn 内部照常调用 conn.commit()/conn.rollback()。
+
+WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "30"))  # 等待写操作完成的秒数
+
+
+class WriteTimeoutError(Exception):
+    """写操作排队超时，已撤销且不会再执行，调用方可以安全重试"""
+    pass
+
+
+def submit_write(fn):
+    """提交一个写操作，返回 Future"""
+    if _writer is not None:
+        return _writer.submit(fn)
+    future = Future()
+    conn = get_conn()
+    try:
+        future.set_result(fn(conn))
+    except Exception as e:
+        future.set_exception(e)
+    finally:
+        # 请求中为请求级连接，推迟到请求结束归还；后台线程中立即归还
+        put_conn(conn)
+    return future
+
+
+def _wait_write(future):
+    """
+    等待写操作完成
+    超时时撤销仍在排队的写操作并抛出 WriteTimeoutError；已经开始执行的写操作
+    无法撤销，继续等待其提交结果，避免调用方把随后会提交的写入当作失败重试
+    """
+    try:
+        return future.result(timeout=WRITE_TIMEOUT)
+    except FutureTimeoutError:
+        if future.cancel():
+            raise WriteTimeoutError(f"写操作排队超过 {WRITE_TIMEOUT} 秒，已撤销")
+        return future.result()
+
+
+def run_write(fn):
+    """执行一个写操作并返回其结果"""
+    return _wait_write(submit_write(fn))
+
+
+def run_writes(fns):
+    """
+    批量执行写操作，返回 [(结果, 异常)]，顺序与 fns 一致
+    启用单写线程时这些操作会尽量合并到同一次提交
+    """
+    futures = [submit_write(fn) for fn in fns]
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append((_wait_write(future), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def release_request_conn(exc=None):
+    """请求结束时归还请求级连接，未提交的事务会被回滚"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        _checkin(_release_conn, conn)
+    reporting_conn = g.pop('_db_reporting_conn', None)
+    if reporting_conn is not None:
+        _checkin(_release_reporting_conn, reporting_conn)
+
+
+def init_app(app):
+    """在 Flask 应用上注册请求级连接的归还钩子"""
+    app.teardown_request(release_request_conn)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQL 方言
+统一管理 SQLite / PostgreSQL 的占位符、日期表达式、排序表达式，
+以及启动时预先渲染好的命名 SQL 语句
+"""
+
+import os
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+LOCAL_TIMEZONE = 'Asia/Shanghai'
+
+# 年级排序顺序（与 class_sorting_utils.sort_classes_python 保持一致）
+GRADE_ORDER = ['中预', '初一', '初二', '初三', '高一', '高二', '高三', '高一VCE', '高二VCE', '高三VCE']
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+
+class SQLDialect:
+    """数据库方言，进程内只解析一次"""
+
+    def __init__(self, name):
+        if name not in ('sqlite', 'postgresql'):
+            raise ValueError(f"不支持的数据库类型: {name}")
+        self.name = name
+        self.is_sqlite = name == 'sqlite'
+        self.is_postgresql = name == 'postgresql'
+        self.placeholder = '?' if self.is_sqlite else '%s'
+        self._statements = {}
+        # 走服务端预编译的命名语句（仅 PostgreSQL）
+        self.prepared = frozenset()
+
+    @property
+    def p(self):
+        """占位符简写，便于在 SQL 模板中使用"""
+        return self.placeholder
+
+    def placeholders(self, count):
+        """生成 count 个以逗号分隔的占位符"""
+        return ','.join([self.placeholder] * count)
+
+    # ---------- 参数转换 ----------
+
+    def date_param(self, value):
+        """日期参数：SQLite 以 'YYYY-MM-DD' 文本存储，PostgreSQL 使用 date"""
+        if isinstance(value, datetime):
+            value = value.date()
+        if self.is_sqlite and isinstance(value, date):
+            return value.strftime('%Y-%m-%d')
+        return value
+
+    def timestamp_param(self, value):
+        """
+        时间戳参数（按本地时区解释无时区的 datetime）
+        SQLite 中 created_at 以本地时间文本存储，按文本比较；PostgreSQL 使用带时区的 datetime
+        """
+        local_tz = pytz.timezone(LOCAL_TIMEZONE)
+        if value.tzinfo is None:
+            value = local_tz.localize(value)
+        else:
+            value = value.astimezone(local_tz)
+        if self.is_sqlite:
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+
+    def day_range(self, start_day, end_day):
+        """
+        本地日期区间 [start_day, end_day]（含两端）对应的半开时间戳区间 (下界, 上界)
+        用于 created_at >= 下界 AND created_at < 上界，可以直接使用 created_at 上的索引
+        """
+        start_day = _as_date(start_day)
+        end_day = _as_date(end_day)
+        lower = datetime.combine(start_day, time.min)
+        upper = datetime.combine(end_day + timedelta(days=1), time.min)
+        return self.timestamp_param(lower), self.timestamp_param(upper)
+
+    def month_range(self, month):
+        """'YYYY-MM' 月份对应的半开时间戳区间 (下界, 上界)"""
+        first_day = datetime.strptime(month, '%Y-%m').date()
+        next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return self.day_range(first_day, next_month - timedelta(days=1))
+
+    # ---------- 表达式 ----------
+
+    def local_day_text(self, column):
+        """时间戳列按本地时区格式化为 'YYYY-MM-DD' 文本"""
+        if self.is_sqlite:
+            # SQLite 中 created_at 为本地时间文本，直接截取日期部分
+            return f"substr({column}, 1, 10)"
+        return f"to_char({column} AT TIME ZONE '{LOCAL_TIMEZONE}', 'YYYY-MM-DD')"
+
+    def grade_order(self, grade_column):
+        """年级排序表达式"""
+        cases = '\n'.join(
+            f"        WHEN '{grade}' THEN {index}" for index, grade in enumerate(GRADE_ORDER, start=1)
+        )
+        return f"""
+    CASE {grade_column}
+{cases}
+        ELSE 99
+    END"""
+
+    def class_number(self, class_column):
+        """从班级名称中提取数字的表达式"""
+        if self.is_sqlite:
+            # SQLite版本：使用字符串替换提取数字
+            return f"""
+        CASE
+            WHEN TRIM(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(
+                {class_column}, '班', ''), '年级', ''), '中预', ''), '初一', ''), '初二', ''),
+                '初三', ''), '高一', ''), '高二', ''), '高三', ''), 'VCE', ''), '') != ''
+            THEN CAST(TRIM(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(
+                {class_column}, '班', ''), '年级', ''), '中预', ''), '初一', ''), '初二', ''),
+                '初三', ''), '高一', ''), '高二', ''), '高三', ''), 'VCE', ''), '') AS INTEGER)
+            ELSE 0
+        END"""
+        # PostgreSQL版本：使用正则表达式
+        return f"""
+        CASE
+            WHEN {class_column} ~ '[0-9]+' THEN
+                CAST(REGEXP_REPLACE({class_column}, '[^0-9]', '', 'g') AS INTEGER)
+            ELSE 0
+        END"""
+
+    def class_order(self, grade_column, class_column):
+        """完整的班级排序子句（不包含 ORDER BY 关键字）"""
+        return f"{self.grade_order(grade_column)}, {self.class_number(class_column)}, {class_column}"
+
+    # ---------- 命名语句 ----------
+
+    def register(self, name, builder):
+        """渲染并登记一条命名语句，builder 接收方言对象返回 SQL 文本"""
+        self._statements[name] = builder(self)
+
+    def sql(self, name):
+        """取出预先渲染好的命名语句"""
+        return self._statements[name]
+
+    def statements(self):
+        """所有命名语句（名称 -> SQL）"""
+        return dict(self._statements)
+
+    def enable_prepared(self, names):
+        """对指定的命名语句启用服务端预编译（SQLite 由驱动自动缓存语句，忽略）"""
+        if self.is_postgresql:
+            self.prepared = frozenset(names)
+
+    def execute(self, cur, name, params=()):
+        """执行命名语句；已启用预编译的语句按名称 EXECUTE"""
+        from classcomp.database.prepared import execute
+        execute(cur, name, self._statements[name], params, prepare=name in self.prepared)
+
+
+_dialect = None
+
+
+def get_dialect():
+    """返回当前数据库的方言对象（根据 DATABASE_URL 解析一次）"""
+    global _dialect
+    if _dialect is None:
+        from classcomp.database.connection import DB_URL
+        from classcomp.database.queries import register_statements
+
+        dialect = SQLDialect('sqlite' if DB_URL.startswith('sqlite') else 'postgresql')
+        register_statements(dialect)
+        # 经过 PgBouncer 等事务级连接池时不能使用会话级预编译语句，默认关闭
+        if os.getenv("DB_PREPARED_STATEMENTS", "false").lower() == "true":
+            from classcomp.database.prepared import HOT_STATEMENTS
+            dialect.enable_prepared(HOT_STATEMENTS)
+        _dialect = dialect
+    return _dialect
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+热点查询索引与执行计划检查
+HOT_INDEXES 覆盖注册表中每条热点查询的过滤和排序列；
+check_query_plans 对每条命名语句执行 EXPLAIN，找出仍然需要全表扫描的语句
+"""
+
+import json
+
+from classcomp.database.dialect import get_dialect
+from classcomp.database.queries import sample_params
+
+# (索引名, 表, 列) —— 列顺序：等值条件在前，范围/排序列在后
+HOT_INDEXES = (
+    # scores_for_evaluator_target_in_period：按评分人+目标班级查找当前周期内的评分
+    ('idx_scores_evaluator_target', 'scores', ('user_id', 'target_grade', 'target_class', 'created_at')),
+    # class_scores_in_period / 老师视图：按班级 + 时间区间
+    ('idx_scores_class_created', 'scores', ('target_grade', 'target_class', 'created_at')),
+    # user_scores：按用户取最近的评分
+    ('idx_scores_user_created', 'scores', ('user_id', 'created_at')),
+    # 老师视图的本周期完成情况：按写入时记录的学期周期匹配
+    ('idx_scores_period', 'scores', ('semester_id', 'period_number', 'target_grade', 'target_class')),
+    ('idx_scores_history_period', 'scores_history', ('semester_id', 'period_number')),
+    # scores_in_period / scores_by_date_range / 导出：按时间区间
+    ('idx_scores_created_at', 'scores', ('created_at',)),
+    # link_overwritten_history：回填覆盖者 ID
+    ('idx_scores_history_pending', 'scores_history', ('overwritten_by_score_id', 'overwritten_at')),
+    # 信息委员注册 / 登记姓名：按班级查找学生账号
+    ('idx_users_class_role', 'users', ('class_name', 'role')),
+    # active_semester / active_weight_config
+    ('idx_semester_config_active', 'semester_config', ('is_active',)),
+    ('idx_score_weight_config_active', 'score_weight_config', ('is_active',)),
+    # active_semester_classes
+    ('idx_semester_classes_semester', 'semester_classes', ('semester_id', 'is_active')),
+    # period_for_date：学期内按日期定位周期
+    ('idx_period_metadata_lookup', 'period_metadata', ('semester_id', 'start_date', 'end_date')),
+    # last_period / max_period_number
+    ('idx_period_metadata_number', 'period_metadata', ('semester_id', 'period_number')),
+)
+
+
+def _invalid_pg_index(cur, index_name):
+    """PostgreSQL 中 CONCURRENTLY 建索引中途失败会留下无效索引，IF NOT EXISTS 会跳过它"""
+    cur.execute("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (index_name,))
+    return cur.fetchone() is not None
+
+
+def create_hot_indexes(conn, concurrently=True):
+    """
+    创建 HOT_INDEXES 中缺失的索引，返回 [(索引名, 状态, 错误信息)]
+
+    PostgreSQL 默认使用 CREATE INDEX CONCURRENTLY，建索引期间不阻塞评分写入；
+    CONCURRENTLY 不能在事务中执行，因此临时切换到 autocommit
+    """
+    dialect = get_dialect()
+    results = []
+
+    if dialect.is_sqlite or not concurrently:
+        cur = conn.cursor()
+        for index_name, table, columns in HOT_INDEXES:
+            try:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+                conn.commit()
+                results.append((index_name, 'ok', None))
+            except Exception as e:
+                conn.rollback()
+                results.append((index_name, 'error', str(e)))
+        return results
+
+    conn.rollback()
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        for index_name, table, columns in HOT_INDEXES:
+            try:
+                if _invalid_pg_index(cur, index_name):
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                            f"ON {table} ({', '.join(columns)})")
+                results.append((index_name, 'ok', None))
+            except Exception as e:
+                results.append((index_name, 'error', str(e)))
+    finally:
+        conn.autocommit = previous_autocommit
+    return results
+
+
+def _sqlite_full_scans(rows):
+    """EXPLAIN QUERY PLAN 中不使用索引的 SCAN 步骤"""
+    scans = []
+    for row in rows:
+        detail = row['detail']
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail:
+            scans.append(detail)
+    return scans
+
+
+def _pg_full_scans(node):
+    """EXPLAIN (FORMAT JSON) 计划树中的 Seq Scan 节点"""
+    scans = []
+    if node.get('Node Type') == 'Seq Scan':
+        scans.append(f"Seq Scan on {node.get('Relation Name')}")
+    for child in node.get('Plans', ()):
+        scans.extend(_pg_full_scans(child))
+    return scans
+
+
+def explain_statement(conn, name, params):
+    """
+    返回命名语句执行计划的 (计划文本行, 全表扫描步骤)
+    PostgreSQL 下关闭 enable_seqscan：表很小时规划器本来就会选 Seq Scan，
+    关闭后仍出现 Seq Scan 说明确实没有可用的索引
+    """
+    dialect = get_dialect()
+    sql = dialect.sql(name)
+    cur = conn.cursor()
+
+    if dialect.is_sqlite:
+        cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        rows = cur.fetchall()
+        return [row['detail'] for row in rows], _sqlite_full_scans(rows)
+
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        row = cur.fetchone()
+        plan = row['QUERY PLAN'] if hasattr(row, 'keys') else row[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        return [json.dumps(root, ensure_ascii=False)], _pg_full_scans(root)
+    finally:
+        conn.rollback()
+
+
+def check_query_plans(conn):
+    """
+    对注册表中的每条命名语句执行 EXPLAIN
+
+    返回列表，每项为 {'name', 'status', 'plan', 'full_scans', 'error'}，
+    status 取值：ok / full_scan / skipped（没有示例参数的语句）/ error
+    """
+    dialect = get_dialect()
+    results = []
+    for name in sorted(dialect.statements()):
+        params = sample_params(name, dialect)
+        item = {'name': name, 'status': 'skipped', 'plan': [], 'full_scans': [], 'error': None}
+        if params is not None:
+            try:
+                item['plan'], item['full_scans'] = explain_statement(conn, name, params)
+                item['status'] = 'full_scan' if item['full_scans'] else 'ok'
+            except Exception as e:
+                conn.rollback()
+                item['status'] = 'error'
+                item['error'] = str(e)
+        results.append(item)
+    return results
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PostgreSQL 连接池
+线程安全，支持借出超时、借出时校验和空闲连接回收
+"""
+
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内没有借到连接"""
+
+
+class ConnectionPool:
+    """
+    线程安全的 PostgreSQL 连接池
+
+    - 按需创建连接，最多 maxconn 个；池满时等待归还，超过 timeout 抛出 PoolTimeoutError
+    - 借出时校验连接：已关闭或状态异常的连接会被丢弃并重建，
+      空闲超过 validate_idle 秒的连接会先执行 SELECT 1
+    - 空闲超过 idle_timeout 秒且多于 minconn 的连接会被关闭
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0,
+                 validate_idle=30.0, idle_timeout=300.0,
+                 setup_statements=(), connect_kwargs=None):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError(f"无效的连接池大小: minconn={minconn}, maxconn={maxconn}")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_idle = validate_idle
+        self.idle_timeout = idle_timeout
+        self.setup_statements = tuple(setup_statements)
+        self.connect_kwargs = dict(connect_kwargs or {})
+
+        self._cond = threading.Condition()
+        self._idle = []      # [(conn, 归还时间)]，末尾为最近归还
+        self._in_use = {}    # id(conn) -> conn
+        self._size = 0       # 已创建（空闲 + 借出 + 创建中）的连接数
+        self._closed = False
+        self._waiting = 0    # 正在等待借出的线程数
+        self._timeouts = 0   # 借出超时次数
+
+        for _ in range(minconn):
+            with self._cond:
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        """创建新连接并执行会话初始化语句"""
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        if self.setup_statements:
+            with conn.cursor() as cur:
+                for statement in self.setup_statements:
+                    cur.execute(statement)
+            conn.commit()
+        return conn
+
+    def _is_usable(self, conn, idle_since):
+        """校验空闲连接是否可用"""
+        from psycopg2 import extensions
+
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if self.validate_idle is not None and time.monotonic() - idle_since >= self.validate_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """借出一个连接，池满时最多等待 timeout 秒"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                conn = None
+                idle_since = None
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("连接池已关闭")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"等待数据库连接超时（{timeout:.1f}秒，连接池上限 {self.maxconn}）"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is not None and not self._is_usable(conn, idle_since):
+                # 坏连接：丢弃后占用它的名额重建
+                self._discard(conn)
+                conn = None
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            with self._cond:
+                self._in_use[id(conn)] = conn
+            return conn
+
+    def putconn(self, conn, close=False):
+        """归还连接；未结束的事务会被回滚"""
+        from psycopg2 import extensions
+
+        with self._cond:
+            if self._in_use.pop(id(conn), None) is None:
+                raise ValueError("归还的连接不属于该连接池")
+
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+
+        with self._cond:
+            if close or conn.closed or self._closed or self._size > self.maxconn:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._prune_idle()
+            self._cond.notify()
+
+    def _prune_idle(self):
+        """关闭空闲过久的多余连接（调用方需持有锁）"""
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        # 最早归还的连接在列表头部
+        while self._idle and self._size > self.minconn and now - self._idle[0][1] >= self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            self._discard(conn)
+
+    def resize(self, minconn=None, maxconn=None):
+        """运行时调整连接池大小，无需重启进程"""
+        with self._cond:
+            new_min = self.minconn if minconn is None else minconn
+            new_max = self.maxconn if maxconn is None else maxconn
+            if new_max < 1 or new_min < 0 or new_min > new_max:
+                raise ValueError(f"无效的连接池大小: minconn={new_min}, maxconn={new_max}")
+            self.minconn, self.maxconn = new_min, new_max
+            # 缩容时先关闭多余的空闲连接，借出中的连接在归还时关闭
+            while self._idle and self._size > self.maxconn:
+                conn, _ = self._idle.pop(0)
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        """连接池当前状态"""
+        with self._cond:
+            return {
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'timeouts': self._timeouts,
+            }
+
+    def closeall(self):
+        """关闭所有空闲连接，之后的借出请求将失败"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
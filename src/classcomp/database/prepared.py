@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PostgreSQL 服务端预编译语句
+热点查询在每个连接上 PREPARE 一次，之后按名称 EXECUTE，省去每次的解析和规划；
+同时统计每条命名语句的执行次数和耗时
+"""
+
+import re
+import threading
+import time
+import weakref
+
+# 预编译语句名前缀，避免与其他会话级对象重名
+NAME_PREFIX = 'cc_'
+
+# 每个请求都会用到、形状固定的查询
+HOT_STATEMENTS = (
+    'user_by_id',
+    'user_by_username',
+    'scores_for_evaluator_target_in_period',
+    'period_for_date',
+    'active_weight_config',
+    'active_semester',
+    'active_semester_classes',
+)
+
+_FORMAT_PARAM = re.compile(r'%s')
+
+# 连接 -> 已在该连接上 PREPARE 过的语句名；连接关闭回收后条目自动消失
+_prepared_by_conn = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def to_positional(sql):
+    """把 psycopg2 的 %s 占位符转换为 PREPARE 使用的 $1, $2 ..."""
+    counter = iter(range(1, 10000))
+    return _FORMAT_PARAM.sub(lambda _: f"${next(counter)}", sql)
+
+
+def _prepared_names(conn):
+    """连接上已预编译的语句名集合；未登记的连接返回 None"""
+    with _prepared_lock:
+        return _prepared_by_conn.get(conn)
+
+
+def _register_connection(conn):
+    with _prepared_lock:
+        _prepared_by_conn[conn] = set()
+
+
+def _mark_prepared(conn, name):
+    with _prepared_lock:
+        _prepared_by_conn.setdefault(conn, set()).add(name)
+
+
+def forget_connection(conn):
+    """丢弃连接的预编译登记，下次使用时重新 PREPARE"""
+    with _prepared_lock:
+        _prepared_by_conn.pop(conn, None)
+
+
+def _record(name, elapsed, prepared):
+    with _stats_lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {'executions': 0, 'prepared_executions': 0,
+                                    'prepares': 0, 'total_ms': 0.0}
+        entry['executions'] += 1
+        entry['total_ms'] += elapsed * 1000
+        if prepared:
+            entry['prepared_executions'] += 1
+
+
+def _record_prepare(name):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'executions': 0, 'prepared_executions': 0,
+                                         'prepares': 0, 'total_ms': 0.0})
+        entry['prepares'] += 1
+
+
+def execute_prepared(cur, name, sql, params):
+    """在游标所属连接上按名称执行预编译语句，首次使用时先 PREPARE"""
+    conn = cur.connection
+    statement_name = NAME_PREFIX + name
+    prepared = _prepared_names(conn)
+    if prepared is None:
+        # 新连接或出错后重新登记：先清掉会话里可能残留的同名语句
+        cur.execute("DEALLOCATE ALL")
+        _register_connection(conn)
+        prepared = ()
+    if name not in prepared:
+        cur.execute(f"PREPARE {statement_name} AS {to_positional(sql)}")
+        _mark_prepared(conn, name)
+        _record_prepare(name)
+
+    param_count = len(params) if params else 0
+    try:
+        if param_count:
+            cur.execute(f"EXECUTE {statement_name} ({', '.join(['%s'] * param_count)})", params)
+        else:
+            cur.execute(f"EXECUTE {statement_name}")
+    except Exception:
+        # 例如表结构变更导致 "cached plan must not change result type"，
+        # 或会话被外部 DISCARD；下次使用时重建
+        forget_connection(conn)
+        raise
+
+
+def execute(cur, name, sql, params, prepare=False):
+    """执行命名语句并计数；prepare=True 时走预编译路径"""
+    start = time.perf_counter()
+    if prepare:
+        execute_prepared(cur, name, sql, params)
+    else:
+        cur.execute(sql, params)
+    _record(name, time.perf_counter() - start, prepare)
+
+
+def get_statement_stats():
+    """各命名语句的使用统计"""
+    with _stats_lock:
+        result = {}
+        for name, entry in _stats.items():
+            stats = dict(entry)
+            stats['total_ms'] = round(stats['total_ms'], 3)
+            stats['avg_ms'] = round(entry['total_ms'] / entry['executions'], 3) if entry['executions'] else 0.0
+            result[name] = stats
+        return result
+
+
+def reset_statement_stats():
+    """清空统计"""
+    with _stats_lock:
+        _stats.clear()
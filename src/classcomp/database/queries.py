@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+命名 SQL 语句注册表
+每条语句由一个接收方言对象的函数生成，在方言初始化时渲染一次，
+热点路径直接执行固定的 SQL 文本，不再每次调用时拼接
+"""
+
+from datetime import date, datetime
+
+_BUILDERS = {}
+_SAMPLES = {}
+
+
+def statement(name, sample=None):
+    """
+    注册命名语句的装饰器
+    sample 接收方言对象返回一组示例参数，用于 EXPLAIN 检查执行计划（写入语句可不提供）
+    """
+    def decorator(builder):
+        _BUILDERS[name] = builder
+        if sample is not None:
+            _SAMPLES[name] = sample
+        return builder
+    return decorator
+
+
+def sample_params(name, dialect):
+    """命名语句的示例参数；未提供时返回 None"""
+    sample = _SAMPLES.get(name)
+    return sample(dialect) if sample is not None else None
+
+
+def _today(d):
+    return d.date_param(date.today())
+
+
+def _now(d):
+    return d.timestamp_param(datetime.now())
+
+
+def _today_range(d):
+    return d.day_range(date.today(), date.today())
+
+
+def register_statements(dialect):
+    """把所有命名语句渲染到方言对象上"""
+    for name, builder in _BUILDERS.items():
+        dialect.register(name, builder)
+
+
+# ==================== 用户 ====================
+
+@statement('user_by_id', sample=lambda d: (1,))
+def _user_by_id(d):
+    return f"""
+        SELECT id, username, role, class_name
+        FROM users WHERE id = {d.p}
+    """
+
+
+@statement('user_by_username', sample=lambda d: ('admin',))
+def _user_by_username(d):
+    return f"""
+        SELECT id, username, password_hash, role, class_name
+        FROM users WHERE username = {d.p}
+    """
+
+
+@statement('real_name_by_username', sample=lambda d: ('admin',))
+def _real_name_by_username(d):
+    return f"SELECT real_name FROM user_real_names WHERE username = {d.p}"
+
+
+@statement('upsert_real_name')
+def _upsert_real_name(d):
+    if d.is_sqlite:
+        return f"""
+            INSERT INTO user_real_names (username, real_name, updated_at)
+            VALUES ({d.p}, {d.p}, CURRENT_TIMESTAMP)
+            ON CONFLICT(username) DO UPDATE SET
+                real_name = excluded.real_name,
+                updated_at = CURRENT_TIMESTAMP
+        """
+    return f"""
+        INSERT INTO user_real_names (username, real_name)
+        VALUES ({d.p}, {d.p})
+        ON CONFLICT (username) DO UPDATE SET
+            real_name = EXCLUDED.real_name,
+            updated_at = CURRENT_TIMESTAMP
+    """
+
+
+# ==================== 学期配置 ====================
+
+@statement('active_semester', sample=lambda d: (1,))
+def _active_semester(d):
+    return f"SELECT * FROM semester_config WHERE is_active = {d.p} LIMIT 1"
+
+
+@statement('active_semester_classes', sample=lambda d: (1,))
+def _active_semester_classes(d):
+    return f"""
+        SELECT grade_name, class_name
+        FROM semester_classes
+        WHERE semester_id = {d.p} AND is_active = 1
+        ORDER BY {d.class_order("grade_name", "class_name")}
+    """
+
+
+@statement('semester_by_id', sample=lambda d: (1,))
+def _semester_by_id(d):
+    return f"""
+        SELECT id, semester_name, start_date, end_date, current_period_type
+        FROM semester_config
+        WHERE id = {d.p}
+    """
+
+
+@statement('update_semester_period_type', sample=lambda d: ('weekly', 1))
+def _update_semester_period_type(d):
+    return f"""
+        UPDATE semester_config
+        SET current_period_type = {d.p}
+        WHERE id = {d.p}
+    """
+
+
+# ==================== 权重配置 ====================
+
+@statement('active_weight_config', sample=lambda d: (True,))
+def _active_weight_config(d):
+    return f"""
+        SELECT new_media_weight, info_commissioner_weight
+        FROM score_weight_config
+        WHERE is_active = {d.p}
+        LIMIT 1
+    """
+
+
+# ==================== 周期元数据 ====================
+
+@statement('period_for_date', sample=lambda d: (1, _today(d)))
+def _period_for_date(d):
+    return f"""
+        SELECT period_number, period_type, start_date, end_date
+        FROM period_metadata
+        WHERE semester_id = {d.p}
+          AND {d.p} BETWEEN start_date AND end_date
+          AND is_active = 1
+        LIMIT 1
+    """
+
+
+@statement('periods_for_semester', sample=lambda d: (1,))
+def _periods_for_semester(d):
+    return f"""
+        SELECT period_number, period_type, start_date, end_date
+        FROM period_metadata
+        WHERE semester_id = {d.p} AND is_active = 1
+        ORDER BY start_date
+    """
+
+
+@statement('last_period', sample=lambda d: (1,))
+def _last_period(d):
+    return f"""
+        SELECT period_number, end_date
+        FROM period_metadata
+        WHERE semester_id = {d.p}
+        ORDER BY period_number DESC
+        LIMIT 1
+    """
+
+
+@statement('max_period_number', sample=lambda d: (1,))
+def _max_period_number(d):
+    return f"""
+        SELECT MAX(period_number) as max_period
+        FROM period_metadata
+        WHERE semester_id = {d.p}
+    """
+
+
+@statement('delete_periods_from', sample=lambda d: (1, 10, _today(d)))
+def _delete_periods_from(d):
+    return f"""
+        DELETE FROM period_metadata
+        WHERE semester_id = {d.p} AND period_number >= {d.p} AND start_date > {d.p}
+    """
+
+
+@statement('insert_period')
+def _insert_period(d):
+    return f"""
+        INSERT INTO period_metadata
+        (semester_id, period_number, period_type, start_date, end_date, created_by)
+        VALUES ({d.p}, {d.p}, {d.p}, {d.p}, {d.p}, 'system')
+    """
+
+
+@statement('insert_period_config_history')
+def _insert_period_config_history(d):
+    return f"""
+        INSERT INTO period_config_history
+        (semester_id, config_type, effective_from_period, effective_from_date, changed_by, reason)
+        VALUES ({d.p}, {d.p}, {d.p}, {d.p}, {d.p}, {d.p})
+    """
+
+
+# ==================== 评分 ====================
+
+@statement('scores_for_evaluator_target_in_period',
+           sample=lambda d: (1, '初一', '初一1班') + _today_range(d))
+def _scores_for_evaluator_target_in_period(d):
+    # 只查当前周期的时间区间，扫描范围与评分人的历史记录数量无关
+    return f"""
+        SELECT id FROM scores
+        WHERE user_id = {d.p} AND target_grade = {d.p} AND target_class = {d.p}
+          AND created_at >= {d.p} AND created_at < {d.p}
+    """
+
+
+# 评分唯一键（score_constraints 中的唯一索引使用相同的列）：
+# 评分人、学期、周期在前，同一评分人本周期的评分可以按前缀查找
+SCORE_PERIOD_KEY = ('user_id', 'semester_id', 'period_number', 'target_grade', 'target_class')
+
+
+def _score_columns(d):
+    # PostgreSQL 的 total 是生成列，不写入
+    total = "total, " if d.is_sqlite else ""
+    return f"""user_id, evaluator_name, evaluator_class,
+                          target_grade, target_class, score1, score2, score3,
+                          {total}note, created_at, source_type,
+                          semester_id, period_number"""
+
+
+def _score_row(d):
+    return f"({d.placeholders(14 if d.is_sqlite else 13)})"
+
+
+def _score_upsert_clause(d):
+    # 同一周期已有评分时原地更新；旧行由触发器归档到 scores_history
+    updated = ['evaluator_name', 'evaluator_class', 'score1', 'score2', 'score3',
+               'note', 'created_at', 'source_type']
+    if d.is_sqlite:
+        updated.insert(5, 'total')
+    assignments = ', '.join(f"{column} = excluded.{column}" for column in updated)
+    return f"ON CONFLICT ({', '.join(SCORE_PERIOD_KEY)}) DO UPDATE SET {assignments}"
+
+
+@statement('upsert_score')
+def _upsert_score(d):
+    return f"""
+        INSERT INTO scores ({_score_columns(d)})
+        VALUES {_score_row(d)}
+        {_score_upsert_clause(d)}
+        RETURNING id
+    """
+
+
+def upsert_scores_sql(d, count):
+    """多行写入评分（批量提交使用）；行数随每次提交变化，因此不注册为命名语句"""
+    return f"""
+        INSERT INTO scores ({_score_columns(d)})
+        VALUES {', '.join([_score_row(d)] * count)}
+        {_score_upsert_clause(d)}
+    """
+
+
+@statement('evaluator_period_classes', sample=lambda d: (1, 1, 0, '初一'))
+def _evaluator_period_classes(d):
+    # 走唯一索引前缀，只涉及本周期该评分人的记录
+    return f"""
+        SELECT target_class FROM scores
+        WHERE user_id = {d.p} AND semester_id = {d.p} AND period_number = {d.p} AND target_grade = {d.p}
+    """
+
+
+@statement('archive_superseded_scores',
+           sample=lambda d: (_now(d), 1, '初一') + _today_range(d) + (_now(d), _now(d)))
+def _archive_superseded_scores(d):
+    # 同一评分人、同一年级、本周期内、且本次提交中有同班级新评分的旧记录
+    return f"""
+        INSERT INTO scores_history
+        (original_score_id, user_id, evaluator_name, evaluator_class,
+         target_grade, target_class, score1, score2, score3, total, note,
+         original_created_at, overwritten_at, overwritten_by_score_id, source_type,
+         semester_id, period_number)
+        SELECT o.id, o.user_id, o.evaluator_name, o.evaluator_class,
+               o.target_grade, o.target_class, o.score1, o.score2, o.score3, o.total, o.note,
+               o.created_at, {d.p}, 0, o.source_type,
+               o.semester_id, o.period_number
+        FROM scores o
+        WHERE o.user_id = {d.p} AND o.target_grade = {d.p}
+          AND o.created_at >= {d.p} AND o.created_at < {d.p}
+          AND o.created_at <> {d.p}
+          AND EXISTS (
+              SELECT 1 FROM scores n
+              WHERE n.user_id = o.user_id AND n.target_grade = o.target_grade
+                AND n.target_class = o.target_class AND n.created_at = {d.p}
+          )
+    """
+
+
+@statement('delete_archived_scores', sample=lambda d: (_now(d), 1))
+def _delete_archived_scores(d):
+    return f"""
+        DELETE FROM scores
+        WHERE id IN (
+            SELECT original_score_id FROM scores_history
+            WHERE overwritten_by_score_id = 0 AND overwritten_at = {d.p} AND user_id = {d.p}
+        )
+    """
+
+
+@statement('link_overwritten_history_batch', sample=lambda d: (_now(d), _now(d), 1))
+def _link_overwritten_history_batch(d):
+    # 每条归档记录指向同一班级的新评分
+    return f"""
+        UPDATE scores_history
+        SET overwritten_by_score_id = (
+            SELECT MAX(s.id) FROM scores s
+            WHERE s.user_id = scores_history.user_id
+              AND s.target_grade = scores_history.target_grade
+              AND s.target_class = scores_history.target_class
+              AND s.created_at = {d.p}
+        )
+        WHERE overwritten_by_score_id = 0 AND overwritten_at = {d.p} AND user_id = {d.p}
+    """
+
+
+@statement('score_by_id', sample=lambda d: (1,))
+def _score_by_id(d):
+    return f"SELECT * FROM scores WHERE id = {d.p}"
+
+
+@statement('insert_score_history')
+def _insert_score_history(d):
+    return f"""
+        INSERT INTO scores_history
+        (original_score_id, user_id, evaluator_name, evaluator_class,
+         target_grade, target_class, score1, score2, score3, total, note,
+         original_created_at, overwritten_at, overwritten_by_score_id, source_type,
+         semester_id, period_number)
+        VALUES ({d.placeholders(17)})
+    """
+
+
+@statement('delete_score', sample=lambda d: (1,))
+def _delete_score(d):
+    return f"DELETE FROM scores WHERE id = {d.p}"
+
+
+@statement('link_overwritten_history', sample=lambda d: (1, _now(d)))
+def _link_overwritten_history(d):
+    return f"""
+        UPDATE scores_history
+        SET overwritten_by_score_id = {d.p}
+        WHERE overwritten_by_score_id = 0 AND overwritten_at = {d.p}
+    """
+
+
+@statement('user_scores', sample=lambda d: (1, 50))
+def _user_scores(d):
+    return f"""
+        SELECT * FROM scores
+        WHERE user_id = {d.p}
+        ORDER BY created_at DESC
+        LIMIT {d.p}
+    """
+
+
+@statement('scores_by_date_range', sample=lambda d: _today_range(d))
+def _scores_by_date_range(d):
+    return f"""
+        SELECT * FROM scores
+        WHERE created_at BETWEEN {d.p} AND {d.p}
+        ORDER BY created_at DESC
+    """
+
+
+# 时间条件均为半开区间 created_at >= 下界 AND created_at < 上界，参数由 dialect.day_range 生成
+
+@statement('class_scores_in_period', sample=lambda d: ('初一', '初一1班') + _today_range(d))
+def _class_scores_in_period(d):
+    return f"""
+        SELECT total, source_type
+        FROM scores
+        WHERE target_grade = {d.p}
+          AND target_class = {d.p}
+          AND created_at >= {d.p}
+          AND created_at < {d.p}
+    """
+
+
+@statement('scores_in_period', sample=lambda d: _today_range(d))
+def _scores_in_period(d):
+    return f"""
+        SELECT target_grade, target_class, total, source_type
+        FROM scores
+        WHERE created_at >= {d.p}
+          AND created_at < {d.p}
+        ORDER BY target_grade, target_class
+    """
+
+
+# ==================== 缓存版本号 ====================
+
+@statement('cache_versions_table')
+def _cache_versions_table(d):
+    if d.is_sqlite:
+        return "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'cache_versions'"
+    return "SELECT to_regclass('cache_versions') AS name"
+
+
+@statement('cache_version', sample=lambda d: ('semester_config',))
+def _cache_version(d):
+    return f"SELECT version FROM cache_versions WHERE name = {d.p}"
+
+
+@statement('bump_cache_version')
+def _bump_cache_version(d):
+    return f"""
+        INSERT INTO cache_versions (name, version, updated_at)
+        VALUES ({d.p}, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE SET
+            version = cache_versions.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """
+
+
+# ==================== 周期快照 ====================
+
+@statement('ended_periods_without_snapshot', sample=lambda d: (1, _today(d)))
+def _ended_periods_without_snapshot(d):
+    return f"""
+        SELECT pm.period_number, pm.start_date, pm.end_date
+        FROM period_metadata pm
+        LEFT JOIN period_snapshots ps
+          ON ps.semester_id = pm.semester_id AND ps.period_number = pm.period_number
+        WHERE pm.semester_id = {d.p} AND pm.end_date < {d.p}
+          AND pm.is_active = 1 AND ps.id IS NULL
+        ORDER BY pm.period_number
+    """
+
+
+@statement('period_by_number', sample=lambda d: (1, 0))
+def _period_by_number(d):
+    return f"""
+        SELECT period_number, period_type, start_date, end_date
+        FROM period_metadata
+        WHERE semester_id = {d.p} AND period_number = {d.p} AND is_active = 1
+    """
+
+
+@statement('period_score_rows', sample=lambda d: (1, 0))
+def _period_score_rows(d):
+    return f"""
+        SELECT target_grade, target_class, evaluator_class, total, source_type, created_at
+        FROM scores
+        WHERE semester_id = {d.p} AND period_number = {d.p}
+    """
+
+
+@statement('period_snapshots_for_semester', sample=lambda d: (1,))
+def _period_snapshots_for_semester(d):
+    return f"""
+        SELECT period_number, payload
+        FROM period_snapshots
+        WHERE semester_id = {d.p}
+    """
+
+
+@statement('started_periods_without_snapshot', sample=lambda d: (1, _today(d)))
+def _started_periods_without_snapshot(d):
+    # 不限 is_active：周期类型变更后停用的周期上仍可能有评分
+    return f"""
+        SELECT pm.period_number
+        FROM period_metadata pm
+        LEFT JOIN period_snapshots ps
+          ON ps.semester_id = pm.semester_id AND ps.period_number = pm.period_number
+        WHERE pm.semester_id = {d.p} AND pm.start_date <= {d.p} AND ps.id IS NULL
+    """
+
+
+@statement('grade_totals_in_period', sample=lambda d: (1, 0))
+def _grade_totals_in_period(d):
+    return f"""
+        SELECT target_grade, COUNT(*) AS count, SUM(total) AS total
+        FROM scores
+        WHERE semester_id = {d.p} AND period_number = {d.p}
+        GROUP BY target_grade
+    """
+
+
+@statement('grade_totals_outside_semester', sample=lambda d: (1, 1))
+def _grade_totals_outside_semester(d):
+    # 三个分支分别走 (semester_id, period_number) 索引，不用 OR 以免退化为全表扫描；
+    # 同一年级可能在多个分支中出现，由调用方累加
+    return f"""
+        SELECT target_grade, COUNT(*) AS count, SUM(total) AS total
+        FROM scores WHERE semester_id IS NULL GROUP BY target_grade
+        UNION ALL
+        SELECT target_grade, COUNT(*) AS count, SUM(total) AS total
+        FROM scores WHERE semester_id < {d.p} GROUP BY target_grade
+        UNION ALL
+        SELECT target_grade, COUNT(*) AS count, SUM(total) AS total
+        FROM scores WHERE semester_id > {d.p} GROUP BY target_grade
+    """
+
+
+@statement('period_snapshot', sample=lambda d: (1, 0))
+def _period_snapshot(d):
+    return f"""
+        SELECT period_start, period_end, score_count, payload, closed_at
+        FROM period_snapshots
+        WHERE semester_id = {d.p} AND period_number = {d.p}
+    """
+
+
+@statement('insert_period_snapshot')
+def _insert_period_snapshot(d):
+    return f"""
+        INSERT INTO period_snapshots
+        (semester_id, period_number, period_start, period_end, score_count, payload)
+        VALUES ({d.p}, {d.p}, {d.p}, {d.p}, {d.p}, {d.p})
+        ON CONFLICT (semester_id, period_number) DO NOTHING
+    """
+
+
+@statement('delete_period_snapshot', sample=lambda d: (1, 0))
+def _delete_period_snapshot(d):
+    return f"DELETE FROM period_snapshots WHERE semester_id = {d.p} AND period_number = {d.p}"
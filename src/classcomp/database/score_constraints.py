@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+“每个评分人对每个班级每个周期只保留一条评分”的数据库约束
+scores 上的唯一索引保证同一 (评分人, 学期, 周期, 年级, 班级) 只有一行，
+写入使用 INSERT ... ON CONFLICT DO UPDATE；覆盖旧评分时由触发器在同一语句内
+把旧行复制到 scores_history，并发的重复提交也不会产生两条记录
+
+semester_id / period_number 为空的记录（没有学期配置时的旧版周期）不受唯一约束限制
+
+覆盖后评分仍是同一行（id 不变），触发器写入的历史记录中
+overwritten_by_score_id 与 original_score_id 相同，都指向当前评分行；
+同一评分的多个旧版本按 overwritten_at 区分
+
+- 新库由 init_db 建表后调用 ensure_score_period_constraint，启动时（pre_start）也会确认一次
+- 已有数据的库先运行一次 scripts/add_score_period_constraint.py 归档重复记录
+"""
+
+from classcomp.database.dialect import get_dialect
+from classcomp.database.queries import SCORE_PERIOD_KEY
+from classcomp.utils.time_utils import get_current_time
+
+UNIQUE_INDEX = 'uq_scores_evaluator_period'
+TRIGGER = 'trg_scores_archive_overwritten'
+
+_HISTORY_COLUMNS = """original_score_id, user_id, evaluator_name, evaluator_class,
+                   target_grade, target_class, score1, score2, score3, total, note,
+                   original_created_at, overwritten_at, overwritten_by_score_id, source_type,
+                   semester_id, period_number"""
+
+# 只有 ON CONFLICT DO UPDATE 会修改 created_at，其他 UPDATE（如回填周期字段）不触发归档
+# 覆盖沿用原行 id，overwritten_by_score_id 即当前评分行（NEW.id = OLD.id）
+_OVERWRITE_VALUES = """OLD.id, OLD.user_id, OLD.evaluator_name, OLD.evaluator_class,
+                   OLD.target_grade, OLD.target_class, OLD.score1, OLD.score2, OLD.score3, OLD.total, OLD.note,
+                   OLD.created_at, NEW.created_at, NEW.id, OLD.source_type,
+                   OLD.semester_id, OLD.period_number"""
+
+
+def _same_key(alias, other):
+    return ' AND '.join(f"{other}.{column} = {alias}.{column}" for column in SCORE_PERIOD_KEY)
+
+
+def archive_duplicate_period_scores(conn):
+    """
+    建唯一索引前清理已有的重复记录：同一唯一键下只保留最新的一条，
+    其余归档到 scores_history（不提交）
+
+    返回:
+        归档的记录数
+    """
+    dialect = get_dialect()
+    cur = conn.cursor()
+    key_not_null = ' AND '.join(f"o.{column} IS NOT NULL" for column in SCORE_PERIOD_KEY)
+    newer_exists = f"""
+        EXISTS (
+            SELECT 1 FROM scores n
+            WHERE {_same_key('o', 'n')}
+              AND (n.created_at > o.created_at OR (n.created_at = o.created_at AND n.id > o.id))
+        )
+    """
+
+    cur.execute(f"""
+        INSERT INTO scores_history ({_HISTORY_COLUMNS})
+        SELECT o.id, o.user_id, o.evaluator_name, o.evaluator_class,
+               o.target_grade, o.target_class, o.score1, o.score2, o.score3, o.total, o.note,
+               o.created_at, {dialect.p},
+               (SELECT n.id FROM scores n WHERE {_same_key('o', 'n')}
+                ORDER BY n.created_at DESC, n.id DESC LIMIT 1),
+               o.source_type, o.semester_id, o.period_number
+        FROM scores o
+        WHERE {key_not_null} AND {newer_exists}
+    """, (get_current_time(),))
+    archived = cur.rowcount
+
+    if archived > 0:
+        cur.execute(f"DELETE FROM scores WHERE id IN (SELECT o.id FROM scores o WHERE {key_not_null} AND {newer_exists})")
+    return archived
+
+
+def _create_trigger(cur, is_sqlite):
+    if is_sqlite:
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {TRIGGER}
+            AFTER UPDATE OF created_at ON scores
+            FOR EACH ROW WHEN OLD.created_at IS NOT NEW.created_at
+            BEGIN
+                INSERT INTO scores_history ({_HISTORY_COLUMNS})
+                VALUES ({_OVERWRITE_VALUES});
+            END
+        """)
+        return
+
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION archive_overwritten_score() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO scores_history ({_HISTORY_COLUMNS})
+            VALUES ({_OVERWRITE_VALUES});
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cur.execute(f"DROP TRIGGER IF EXISTS {TRIGGER} ON scores")
+    cur.execute(f"""
+        CREATE TRIGGER {TRIGGER}
+        AFTER UPDATE OF created_at ON scores
+        FOR EACH ROW WHEN (OLD.created_at IS DISTINCT FROM NEW.created_at)
+        EXECUTE PROCEDURE archive_overwritten_score()
+    """)
+
+
+def _create_constraint(cur):
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX} ON scores ({', '.join(SCORE_PERIOD_KEY)})")
+    _create_trigger(cur, get_dialect().is_sqlite)
+
+
+def ensure_score_period_constraint(conn):
+    """
+    创建唯一索引和覆盖归档触发器（可重复执行）并提交
+    不清理重复记录：已有重复记录时建索引失败，需先运行迁移脚本
+    """
+    cur = conn.cursor()
+    try:
+        _create_constraint(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def create_score_period_constraint(conn):
+    """
+    迁移：归档已有的重复记录后创建唯一索引和覆盖归档触发器，在同一事务中提交
+    会扫描整个 scores 表，只在迁移脚本中运行一次
+
+    返回:
+        建索引前归档的重复记录数
+    """
+    cur = conn.cursor()
+    try:
+        archived = archive_duplicate_period_scores(conn)
+        _create_constraint(cur)
+        conn.commit()
+        return archived
+    except Exception:
+        conn.rollback()
+        raise
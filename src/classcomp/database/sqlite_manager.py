@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite 持久连接管理
+每个线程复用一个长连接，并在建立连接时设置 WAL 等性能相关的 PRAGMA
+"""
+
+import os
+import sqlite3
+import threading
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class Row(sqlite3.Row):
+    """支持 .get() 的行对象，与 PostgreSQL 的 RealDictRow 用法保持一致"""
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (IndexError, KeyError):
+            return default
+
+
+class SQLiteConnectionManager:
+    """
+    按线程管理 SQLite 持久连接
+
+    - 同一线程内嵌套的 acquire/release 共享同一个连接（引用计数）
+    - 最外层 release 时回滚未提交的事务，避免把锁带到下一次使用
+    - fork 之后子进程会重新建立连接
+    """
+
+    def __init__(self, db_path, journal_mode='WAL', synchronous='NORMAL',
+                 mmap_size=268435456, cache_size=-16000, busy_timeout=5000,
+                 query_only=False):
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"无效的 SQLite journal_mode: {journal_mode}")
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"无效的 SQLite synchronous: {synchronous}")
+
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = int(mmap_size)
+        self.cache_size = int(cache_size)
+        self.busy_timeout = int(busy_timeout)
+        self.query_only = query_only
+        self._local = threading.local()
+
+    def connect(self):
+        """新建一个按配置初始化好的连接（不受线程复用管理）"""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout / 1000,
+                               cached_statements=256)
+        conn.row_factory = Row  # 使查询结果支持dict-like访问
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size = {self.cache_size}")
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if self.query_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self):
+        """获取当前线程的连接"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            # fork 继承来的连接不能在子进程中使用
+            local.conn = None
+            local.depth = 0
+            local.pid = os.getpid()
+
+        if local.conn is None:
+            local.conn = self.connect()
+        local.depth += 1
+        return local.conn
+
+    def release(self, conn):
+        """归还连接；最外层归还时回滚未提交的事务"""
+        local = self._local
+        if conn is not getattr(local, 'conn', None):
+            # 不是当前线程管理的连接（例如跨线程传递），直接关闭
+            conn.close()
+            return
+
+        local.depth -= 1
+        if local.depth <= 0:
+            local.depth = 0
+            if conn.in_transaction:
+                conn.rollback()
+
+    def close(self):
+        """关闭当前线程的连接"""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None and getattr(local, 'pid', None) == os.getpid():
+            conn.close()
+        local.conn = None
+        local.depth = 0
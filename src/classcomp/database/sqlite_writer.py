@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite 单写线程
+所有请求线程的写操作交给一个后台线程串行执行，并把同一时间段内到达的多个写操作
+合并到一个事务里提交（group commit），请求线程之间不再争抢 SQLite 的写锁
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+SAVEPOINT = 'writer_job'
+
+
+class _BatchConnection:
+    """
+    交给写操作函数使用的连接代理
+
+    写操作函数沿用原有的 commit/rollback 调用方式：
+    commit 推迟到整个批次结束时由写线程统一执行，rollback 只回滚到本操作的保存点
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._conn.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT}")
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteWriter:
+    """
+    单写线程
+
+    - submit(fn) 返回 Future，fn 在写线程中以 fn(conn) 的形式执行
+    - 每个写操作在独立的保存点中执行，出错只回滚它自己
+    - 批次内全部执行完后提交一次，提交成功后才把结果交还给调用方
+    """
+
+    def __init__(self, connect, max_batch=64, max_delay=0.002):
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._batches = 0
+        self._jobs = 0
+        self._failed_commits = 0
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # fork 继承来的队列和线程在子进程中不可用
+                self._queue = queue.Queue()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, fn):
+        """提交一个写操作，返回 Future"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # 事务由写线程显式管理
+        proxy = _BatchConnection(conn)
+
+        while True:
+            batch = [(fn, future) for fn, future in self._take_batch()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, future in batch:
+                    conn.execute(f"SAVEPOINT {SAVEPOINT}")
+                    try:
+                        results.append((future, fn(proxy), None))
+                    except BaseException as e:
+                        conn.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT}")
+                        results.append((future, None, e))
+                    finally:
+                        conn.execute(f"RELEASE SAVEPOINT {SAVEPOINT}")
+                conn.execute("COMMIT")
+            except Exception as e:
+                # 整个批次提交失败：回滚并把错误交给批次内所有调用方
+                if conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except Exception:
+                        pass
+                self._failed_commits += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self._batches += 1
+            self._jobs += len(batch)
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        """写线程统计"""
+        return {
+            'running': self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            'queued': self._queue.qsize(),
+            'batches': self._batches,
+            'jobs': self._jobs,
+            'avg_batch_size': round(self._jobs / self._batches, 2) if self._batches else 0.0,
+            'failed_commits': self._failed_commits,
+        }
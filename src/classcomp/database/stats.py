@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据库连接借出统计
+记录借出中的连接、等待时间、按路由统计的占用时间和峰值占用，
+并标记占用超过阈值的连接及其借出时的调用栈，便于排查连接泄漏
+"""
+
+import threading
+import time
+import traceback
+
+from flask import has_request_context, request
+
+
+class ConnectionTracker:
+    """
+    线程安全的连接借出记录
+
+    - checkout/checkin 成对调用；同一连接可被嵌套借出（SQLite 同线程复用），按后进先出匹配
+    - 借出时间超过 leak_threshold 秒的连接视为疑似泄漏，首次发现时打印借出路由（capture_stack 时附调用栈）
+    """
+
+    def __init__(self, leak_threshold=30.0, capture_stack=False, stack_limit=16):
+        self.leak_threshold = leak_threshold
+        self.capture_stack = capture_stack
+        self.stack_limit = stack_limit
+
+        self._lock = threading.Lock()
+        self._in_flight = {}   # id(conn) -> [借出记录]
+        self._in_use = {}      # 连接池名 -> 当前借出数
+        self._peak = {}        # 连接池名 -> 峰值借出数
+        self._routes = {}      # (连接池名, 路由) -> 汇总
+        self._checkouts = 0
+        self._leaks_reported = 0
+
+    @staticmethod
+    def _current_route():
+        if has_request_context():
+            return request.endpoint or request.path
+        return f"<{threading.current_thread().name}>"
+
+    def checkout(self, conn, pool_name, wait_seconds):
+        """记录一次借出"""
+        record = {
+            'pool': pool_name,
+            'route': self._current_route(),
+            'thread': threading.current_thread().name,
+            'started': time.monotonic(),
+            'wait': wait_seconds,
+            'stack': traceback.extract_stack(limit=self.stack_limit)[:-2] if self.capture_stack else None,
+            'reported': False,
+        }
+        with self._lock:
+            self._in_flight.setdefault(id(conn), []).append(record)
+            in_use = self._in_use.get(pool_name, 0) + 1
+            self._in_use[pool_name] = in_use
+            if in_use > self._peak.get(pool_name, 0):
+                self._peak[pool_name] = in_use
+            self._checkouts += 1
+            leaks = self._collect_new_leaks()
+
+        for leak in leaks:
+            self._report_leak(leak)
+
+    def checkin(self, conn):
+        """记录一次归还"""
+        now = time.monotonic()
+        with self._lock:
+            records = self._in_flight.get(id(conn))
+            if not records:
+                return
+            record = records.pop()
+            if not records:
+                del self._in_flight[id(conn)]
+            pool_name = record['pool']
+            self._in_use[pool_name] = max(self._in_use.get(pool_name, 0) - 1, 0)
+
+            hold = now - record['started']
+            key = (pool_name, record['route'])
+            summary = self._routes.get(key)
+            if summary is None:
+                summary = self._routes[key] = {
+                    'count': 0, 'total_hold': 0.0, 'max_hold': 0.0,
+                    'total_wait': 0.0, 'max_wait': 0.0,
+                }
+            summary['count'] += 1
+            summary['total_hold'] += hold
+            summary['max_hold'] = max(summary['max_hold'], hold)
+            summary['total_wait'] += record['wait']
+            summary['max_wait'] = max(summary['max_wait'], record['wait'])
+
+    def _collect_new_leaks(self):
+        """找出刚超过阈值、尚未报告过的借出记录（调用方需持有锁）"""
+        if self.leak_threshold is None:
+            return []
+        now = time.monotonic()
+        leaks = []
+        for records in self._in_flight.values():
+            for record in records:
+                if not record['reported'] and now - record['started'] >= self.leak_threshold:
+                    record['reported'] = True
+                    self._leaks_reported += 1
+                    leaks.append(dict(record, age=now - record['started']))
+        return leaks
+
+    @staticmethod
+    def _format_stack(stack):
+        return ''.join(traceback.format_list(stack)) if stack else ''
+
+    def _report_leak(self, leak):
+        if leak['stack'] is None:
+            print(f"⚠️ 数据库连接疑似泄漏：{leak['route']}（{leak['pool']}）已占用 {leak['age']:.1f} 秒"
+                  f"（设置 DB_TRACK_STACKS=true 可打印借出位置）")
+            return
+        print(f"⚠️ 数据库连接疑似泄漏：{leak['route']}（{leak['pool']}）已占用 {leak['age']:.1f} 秒，借出位置：\n"
+              f"{self._format_stack(leak['stack'])}")
+
+    def snapshot(self):
+        """当前统计（时间单位为毫秒）"""
+        now = time.monotonic()
+        with self._lock:
+            leaks = self._collect_new_leaks()
+            in_flight = []
+            for records in self._in_flight.values():
+                for record in records:
+                    age = now - record['started']
+                    item = {
+                        'pool': record['pool'],
+                        'route': record['route'],
+                        'thread': record['thread'],
+                        'held_ms': round(age * 1000, 1),
+                        'wait_ms': round(record['wait'] * 1000, 1),
+                        'suspected_leak': self.leak_threshold is not None and age >= self.leak_threshold,
+                    }
+                    if item['suspected_leak']:
+                        item['stack'] = self._format_stack(record['stack'])
+                    in_flight.append(item)
+
+            routes = []
+            for (pool_name, route), summary in self._routes.items():
+                count = summary['count']
+                routes.append({
+                    'pool': pool_name,
+                    'route': route,
+                    'count': count,
+                    'avg_hold_ms': round(summary['total_hold'] / count * 1000, 2),
+                    'max_hold_ms': round(summary['max_hold'] * 1000, 2),
+                    'avg_wait_ms': round(summary['total_wait'] / count * 1000, 2),
+                    'max_wait_ms': round(summary['max_wait'] * 1000, 2),
+                })
+            routes.sort(key=lambda item: item['avg_hold_ms'] * item['count'], reverse=True)
+
+            result = {
+                'checkouts': self._checkouts,
+                'in_use': dict(self._in_use),
+                'peak_in_use': dict(self._peak),
+                'leaks_reported': self._leaks_reported,
+                'leak_threshold_seconds': self.leak_threshold,
+                'in_flight': sorted(in_flight, key=lambda item: item['held_ms'], reverse=True),
+                'routes': routes,
+            }
+
+        for leak in leaks:
+            self._report_leak(leak)
+        return result
+
+    def reset(self):
+        """清空汇总数据（借出中的记录保留）"""
+        with self._lock:
+            self._routes.clear()
+            self._peak = dict(self._in_use)
+            self._checkouts = 0
+            self._leaks_reported = 0
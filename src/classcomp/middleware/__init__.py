@@ -4,5 +4,6 @@ Middleware components for ClassComp Score system.
 """
 
 from classcomp.middleware.security import security_middleware
+from classcomp.middleware.idempotency import idempotency_store
 
-__all__ = ['security_middleware']
\ No newline at end of file
+__all__ = ['security_middleware', 'idempotency_store']
\ No newline at end of file
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+幂等键中间件
+客户端在重试请求时携带相同的 Idempotency-Key 请求头，服务端直接返回第一次的响应，
+不再重复执行写操作；结果保存在进程内有容量上限、会过期的存储中
+（gunicorn 只有一个 worker，进程内存储即可覆盖全部请求）
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify, make_response
+from flask_login import current_user
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# 每个键保存的时长（秒）和最多保存的键数
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '2000'))
+
+# 请求仍在处理中的占位
+_IN_PROGRESS = object()
+
+
+def _is_success(response):
+    """2xx 且响应体 success 为 true"""
+    if not 200 <= response.status_code < 300:
+        return False
+    body = response.get_json(silent=True)
+    return isinstance(body, dict) and body.get('success') is True
+
+
+class IdempotencyStore:
+    """按 (用户, 幂等键) 保存响应，超过容量时淘汰最早的键"""
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # 键 -> (过期时间, 请求体摘要, 响应或 _IN_PROGRESS)
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            self._entries.pop(key)
+
+    def begin(self, key, fingerprint):
+        """
+        登记一次请求
+
+        返回:
+            ('new', None)：第一次出现，调用方执行请求后调用 finish / abandon
+            ('replay', 响应)：已有结果
+            ('in_progress', None)：同一个键的请求仍在处理
+            ('mismatch', None)：同一个键对应了不同的请求体
+        """
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = (now + self.ttl, fingerprint, _IN_PROGRESS)
+                self._purge(now)
+                return 'new', None
+            _, stored_fingerprint, response = entry
+            if stored_fingerprint != fingerprint:
+                return 'mismatch', None
+            if response is _IN_PROGRESS:
+                return 'in_progress', None
+            return 'replay', response
+
+    def finish(self, key, fingerprint, response):
+        """保存响应（状态码, 响应体, MIME 类型）"""
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, fingerprint, response)
+            self._entries.move_to_end(key)
+            self._purge(time.time())
+
+    def abandon(self, key):
+        """请求失败时删除占位，客户端可以用同一个键重试"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def idempotent(self, func):
+        """
+        幂等装饰器：请求带 Idempotency-Key 时，相同的键和请求体只执行一次
+        只保存成功的响应（2xx 且 success 为 true），限流、数据库暂时不可用等失败
+        不保存，客户端可以用同一个键重试；没有该请求头的请求照常执行
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not idempotency_key:
+                return func(*args, **kwargs)
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify(success=False, message="无效的幂等键"), 400
+
+            user_id = current_user.get_id() if current_user.is_authenticated else None
+            key = (user_id, request.path, idempotency_key)
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            state, stored = self.begin(key, fingerprint)
+            if state == 'replay':
+                status_code, body, mimetype = stored
+                response = make_response(body, status_code)
+                response.mimetype = mimetype
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if state == 'in_progress':
+                return jsonify(success=False, message="相同的请求正在处理中，请稍后重试"), 409
+            if state == 'mismatch':
+                return jsonify(success=False, message="幂等键已用于其他请求内容"), 422
+
+            try:
+                response = make_response(func(*args, **kwargs))
+            except Exception:
+                self.abandon(key)
+                raise
+            if _is_success(response):
+                self.finish(key, fingerprint, (response.status_code, response.get_data(), response.mimetype))
+            else:
+                self.abandon(key)
+            return response
+        return wrapper
+
+
+# 全局幂等键存储
+idempotency_store = IdempotencyStore()
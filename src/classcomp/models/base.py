@@ -2,8 +2,8 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import pytz
-import os
-from classcomp.utils.time_utils import get_local_timezone, get_current_time, parse_database_timestamp
+from classcomp.utils.time_utils import get_local_timezone, get_current_time
+from classcomp.database.dialect import get_dialect
 
 # 时区配置 - 已移至 time_utils.py
 # 保持兼容性
@@ -27,14 +27,7 @@ class User(UserMixin):
     def get_user_by_id(user_id, conn):
         """根据ID获取用户信息"""
         cur = conn.cursor()
-        # 检测数据库类型
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT id, username, role, class_name 
-            FROM users WHERE id = {placeholder}
-        """, (user_id,))
+        get_dialect().execute(cur, 'user_by_id', (user_id,))
         row = cur.fetchone()
         if row:
             return User(row['id'], row['username'], 
@@ -45,13 +38,7 @@ class User(UserMixin):
     def get_user_by_username(username, conn):
         """根据用户名获取用户信息"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT id, username, password_hash, role, class_name 
-            FROM users WHERE username = {placeholder}
-        """, (username,))
+        get_dialect().execute(cur, 'user_by_username', (username,))
         row = cur.fetchone()
         if row:
             user = User(row['id'], row['username'], 
@@ -105,10 +92,7 @@ class Score:
         """创建新的评分记录（支持软删除和覆盖）"""
         cur = conn.cursor()
         
-        from datetime import datetime, timedelta
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
+        dialect = get_dialect()
         
         # 验证分数范围
         if not (0 <= score1 <= 3):
@@ -119,7 +103,7 @@ class Score:
             return None, "使用情况分数必须在0-4之间", 0
         
         # 计算评分周期（使用V2版本支持动态周期）
-        from classcomp.utils.period_utils import calculate_period_info_v2
+        from classcomp.utils.period_utils import calculate_period_info, calculate_period_info_v2
         
         now = get_current_time()  # 使用时区感知的当前时间
         current_date = now.date()
@@ -127,68 +111,27 @@ class Score:
         # 使用V2版本获取周期信息
         try:
             period_info = calculate_period_info_v2(target_date=current_date, conn=conn)
-            current_period_number = period_info['period_number']
+            # 只有来自 period_metadata 的周期才带学期ID，旧版回退计算的周期号不落库
+            current_semester_id = period_info.get('semester_id')
         except Exception as e:
             print(f"V2周期计算失败，回退到旧版: {e}")
             # 回退到旧版逻辑
-            from classcomp.utils.period_utils import get_biweekly_period_end
-            period_end = get_biweekly_period_end(current_date)
-            current_period_number = None
-        
-        # 检查是否已评分（同一评分周期内）
-        if is_sqlite:
-            # 查找同一评分周期内的现有评分
-            cur.execute(f"""
-                SELECT id, created_at FROM scores
-                WHERE user_id = {placeholder} AND target_grade = {placeholder} AND target_class = {placeholder}
-                ORDER BY created_at DESC
-            """, (user_id, target_grade, target_class))
-        else:
-            cur.execute(f"""
-                SELECT id, created_at FROM scores
-                WHERE user_id = {placeholder} AND target_grade = {placeholder} AND target_class = {placeholder}
-                ORDER BY created_at DESC
-            """, (user_id, target_grade, target_class))
+            period_info = calculate_period_info(target_date=current_date, conn=conn)
+            current_semester_id = None
+        stored_period_number = period_info['period_number'] if current_semester_id is not None else None
         
-        existing_scores = cur.fetchall()
         overwrite_count = 0
-        
-        # 检查是否有同一周期的评分需要归档
-        for existing_score in existing_scores:
-            existing_created = existing_score['created_at']
-            
-            # 使用统一的时间解析函数
-            try:
-                parsed_time = parse_database_timestamp(existing_created)
-                existing_date = parsed_time.date()
-            except Exception as e:
-                print(f"时间格式解析错误: {existing_created}, 错误: {e}")
-                # 如果解析失败，跳过这条记录
-                continue
-            
-            # 判断是否在同一周期
-            same_period = False
-            
-            if current_period_number is not None:
-                # 使用V2版本的周期号进行精确匹配
-                try:
-                    existing_period_info = calculate_period_info_v2(target_date=existing_date, conn=conn)
-                    existing_period_number = existing_period_info['period_number']
-                    same_period = (existing_period_number == current_period_number)
-                except Exception as e:
-                    print(f"计算历史记录周期失败: {e}")
-                    # 回退到旧版比较
-                    from classcomp.utils.period_utils import get_biweekly_period_end
-                    existing_period_end = get_biweekly_period_end(existing_date)
-                    same_period = (existing_period_end == period_end)
-            else:
-                # 使用旧版逻辑比较
-                from classcomp.utils.period_utils import get_biweekly_period_end
-                existing_period_end = get_biweekly_period_end(existing_date)
-                same_period = (existing_period_end == period_end)
-            
-            # 如果在同一个评分周期内，需要归档旧记录
-            if same_period:
+        if current_semester_id is not None:
+            # 同一周期的旧评分由唯一约束 + ON CONFLICT DO UPDATE 覆盖，这里只统计覆盖条数
+            dialect.execute(cur, 'evaluator_period_classes',
+                            (user_id, current_semester_id, stored_period_number, target_grade))
+            overwrite_count = sum(1 for row in cur.fetchall() if row['target_class'] == target_class)
+        else:
+            # 旧版周期没有唯一键：按当前周期的起止日期走索引查找并归档
+            period_lower, period_upper = dialect.day_range(period_info['period_start'], period_info['period_end'])
+            dialect.execute(cur, 'scores_for_evaluator_target_in_period',
+                            (user_id, target_grade, target_class, period_lower, period_upper))
+            for existing_score in cur.fetchall():
                 success, error = Score.archive_score(existing_score['id'], conn)
                 if success:
                     overwrite_count += 1
@@ -200,37 +143,21 @@ class Score:
         created_at = now
         
         try:
-            # 插入新记录
-            if is_sqlite:
-                cur.execute(f"""
-                    INSERT INTO scores (user_id, evaluator_name, evaluator_class,
-                                      target_grade, target_class, score1, score2, score3,
-                                      total, note, created_at, source_type)
-                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder},
-                            {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
-                """, (user_id, evaluator_name, evaluator_class, target_grade,
-                      target_class, score1, score2, score3, total, note, created_at, source_type))
-                score_id = cur.lastrowid
+            # 插入新记录（同一周期已有评分时原地更新，旧行由触发器写入历史表）
+            if dialect.is_sqlite:
+                dialect.execute(cur, 'upsert_score', (user_id, evaluator_name, evaluator_class, target_grade,
+                      target_class, score1, score2, score3, total, note, created_at, source_type,
+                      current_semester_id, stored_period_number))
             else:
                 # For PostgreSQL, do not insert 'total' as it's a generated column
-                cur.execute(f"""
-                    INSERT INTO scores (user_id, evaluator_name, evaluator_class,
-                                      target_grade, target_class, score1, score2, score3,
-                                      note, created_at, source_type)
-                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder},
-                            {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
-                    RETURNING id
-                """, (user_id, evaluator_name, evaluator_class, target_grade,
-                      target_class, score1, score2, score3, note, created_at, source_type))
-                score_id = cur.fetchone()['id']
+                dialect.execute(cur, 'upsert_score', (user_id, evaluator_name, evaluator_class, target_grade,
+                      target_class, score1, score2, score3, note, created_at, source_type,
+                      current_semester_id, stored_period_number))
+            score_id = cur.fetchone()['id']
             
             # 更新历史记录中的overwritten_by_score_id
-            if overwrite_count > 0:
-                cur.execute(f"""
-                    UPDATE scores_history 
-                    SET overwritten_by_score_id = {placeholder}
-                    WHERE overwritten_by_score_id = 0 AND overwritten_at = {placeholder}
-                """, (score_id, now))
+            if overwrite_count > 0 and current_semester_id is None:
+                dialect.execute(cur, 'link_overwritten_history', (score_id, now))
             
             conn.commit()
             return score_id, None, overwrite_count
@@ -238,17 +165,113 @@ class Score:
             conn.rollback()
             return None, f"数据库错误: {str(e)}", 0
     
+    @staticmethod
+    def create_scores(user_id, evaluator_name, evaluator_class, target_grade, rows, conn,
+                      source_type='info_commissioner', submitted_at=None):
+        """
+        批量创建同一年级的评分记录（一次事务）
+
+        先逐条校验，再用一条多行 INSERT ... ON CONFLICT DO UPDATE 写入全部评分，
+        本周期内被覆盖的旧评分由触发器归档到历史表，最后只提交一次
+
+        参数:
+            rows: [{'target_class', 'score1', 'score2', 'score3', 'note'}]
+            submitted_at: 提交时间（默认当前时间），决定评分所属的周期和 created_at
+
+        返回:
+            (成功条数, 覆盖条数, 错误信息列表)
+        """
+        from classcomp.database.queries import upsert_scores_sql
+        from classcomp.utils.period_utils import calculate_period_info, calculate_period_info_v2
+
+        cur = conn.cursor()
+        dialect = get_dialect()
+        errors = []
+
+        # 逐条校验；同一班级在一次提交中出现多次时以最后一条为准
+        valid_rows = {}
+        duplicate_count = 0
+        for row in rows:
+            if not (0 <= row['score1'] <= 3):
+                errors.append("电脑整洁分数必须在0-3之间")
+                continue
+            if not (0 <= row['score2'] <= 3):
+                errors.append("物品摆放分数必须在0-3之间")
+                continue
+            if not (0 <= row['score3'] <= 4):
+                errors.append("使用情况分数必须在0-4之间")
+                continue
+            if row['target_class'] in valid_rows:
+                duplicate_count += 1
+            valid_rows[row['target_class']] = row
+
+        if not valid_rows:
+            return 0, 0, errors
+
+        now = submitted_at or get_current_time()
+        current_date = now.date()
+
+        # 整批评分属于同一周期，只计算一次
+        try:
+            period_info = calculate_period_info_v2(target_date=current_date, conn=conn)
+            current_semester_id = period_info.get('semester_id')
+        except Exception as e:
+            print(f"V2周期计算失败，回退到旧版: {e}")
+            period_info = calculate_period_info(target_date=current_date, conn=conn)
+            current_semester_id = None
+        stored_period_number = period_info['period_number'] if current_semester_id is not None else None
+
+        values = []
+        for target_class, row in valid_rows.items():
+            total = row['score1'] + row['score2'] + row['score3']
+            if dialect.is_sqlite:
+                values.extend((user_id, evaluator_name, evaluator_class, target_grade, target_class,
+                               row['score1'], row['score2'], row['score3'], total, row['note'], now,
+                               source_type, current_semester_id, stored_period_number))
+            else:
+                # PostgreSQL 的 total 是生成列
+                values.extend((user_id, evaluator_name, evaluator_class, target_grade, target_class,
+                               row['score1'], row['score2'], row['score3'], row['note'], now,
+                               source_type, current_semester_id, stored_period_number))
+
+        try:
+            overwrite_count = 0
+            if current_semester_id is not None:
+                # 本周期已评过的班级会被 ON CONFLICT DO UPDATE 覆盖
+                dialect.execute(cur, 'evaluator_period_classes',
+                                (user_id, current_semester_id, stored_period_number, target_grade))
+                overwrite_count = sum(1 for row in cur.fetchall() if row['target_class'] in valid_rows)
+
+            # 一次写入全部评分
+            cur.execute(upsert_scores_sql(dialect, len(valid_rows)), values)
+
+            if current_semester_id is None:
+                # 旧版周期没有唯一键：归档本周期内同一班级的旧评分，再从主表删除
+                period_lower, period_upper = dialect.day_range(period_info['period_start'], period_info['period_end'])
+                dialect.execute(cur, 'archive_superseded_scores',
+                                (now, user_id, target_grade, period_lower, period_upper, now, now))
+                overwrite_count = cur.rowcount
+                if overwrite_count > 0:
+                    dialect.execute(cur, 'delete_archived_scores', (now, user_id))
+                    # 历史记录指向覆盖它的新评分
+                    dialect.execute(cur, 'link_overwritten_history_batch', (now, now, user_id))
+
+            conn.commit()
+            return len(valid_rows), overwrite_count + duplicate_count, errors
+        except Exception as e:
+            conn.rollback()
+            return 0, 0, errors + [f"数据库错误: {str(e)}"] * len(valid_rows)
+
     @staticmethod
     def archive_score(score_id, conn, overwritten_by_score_id=None):
         """将单条评分记录归档到历史表，并从主表删除"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
+        dialect = get_dialect()
         now = get_current_time()
 
         try:
             # 1. 查找要归档的记录
-            cur.execute(f"SELECT * FROM scores WHERE id = {placeholder}", (score_id,))
+            dialect.execute(cur, 'score_by_id', (score_id,))
             record_to_archive = cur.fetchone()
 
             if not record_to_archive:
@@ -256,21 +279,14 @@ class Score:
 
             # 2. 插入到历史表
             source_type = record_to_archive.get('source_type', 'info_commissioner')
-            cur.execute(f"""
-                INSERT INTO scores_history
-                (original_score_id, user_id, evaluator_name, evaluator_class,
-                 target_grade, target_class, score1, score2, score3, total, note,
-                 original_created_at, overwritten_at, overwritten_by_score_id, source_type)
-                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder},
-                        {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder},
-                        {placeholder}, {placeholder}, {placeholder}, {placeholder})
-            """, (record_to_archive['id'], record_to_archive['user_id'], record_to_archive['evaluator_name'],
+            dialect.execute(cur, 'insert_score_history', (record_to_archive['id'], record_to_archive['user_id'], record_to_archive['evaluator_name'],
                   record_to_archive['evaluator_class'], record_to_archive['target_grade'], record_to_archive['target_class'],
                   record_to_archive['score1'], record_to_archive['score2'], record_to_archive['score3'], record_to_archive['total'],
-                  record_to_archive['note'], record_to_archive['created_at'], now, overwritten_by_score_id or 0, source_type))
+                  record_to_archive['note'], record_to_archive['created_at'], now, overwritten_by_score_id or 0, source_type,
+                  record_to_archive.get('semester_id'), record_to_archive.get('period_number')))
 
             # 3. 从主表删除
-            cur.execute(f"DELETE FROM scores WHERE id = {placeholder}", (score_id,))
+            dialect.execute(cur, 'delete_score', (score_id,))
             
             # conn.commit() is handled by the calling function
             return True, None
@@ -283,29 +299,14 @@ class Score:
     def get_user_scores(user_id, conn, limit=50):
         """获取用户的评分历史"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT * FROM scores 
-            WHERE user_id = {placeholder} 
-            ORDER BY created_at DESC 
-            LIMIT {placeholder}
-        """, (user_id, limit))
+        get_dialect().execute(cur, 'user_scores', (user_id, limit))
         return cur.fetchall()
     
     @staticmethod
     def get_scores_by_date_range(start_date, end_date, conn):
         """按日期范围获取评分"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT * FROM scores 
-            WHERE created_at BETWEEN {placeholder} AND {placeholder}
-            ORDER BY created_at DESC
-        """, (start_date, end_date))
+        get_dialect().execute(cur, 'scores_by_date_range', (start_date, end_date))
         return cur.fetchall()
 
 class UserRealName:
@@ -313,12 +314,7 @@ class UserRealName:
     def get_real_name_by_username(username, conn):
         """根据用户名获取真实姓名"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT real_name FROM user_real_names WHERE username = {placeholder}
-        """, (username,))
+        get_dialect().execute(cur, 'real_name_by_username', (username,))
         row = cur.fetchone()
         return row['real_name'] if row else None
 
@@ -326,27 +322,10 @@ class UserRealName:
     def set_real_name(username, real_name, conn):
         """设置或更新用户的真实姓名"""
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
         
         try:
             # 使用UPSERT逻辑：如果username已存在则更新，否则插入
-            if db_url.startswith("sqlite"):
-                cur.execute(f"""
-                    INSERT INTO user_real_names (username, real_name, updated_at)
-                    VALUES ({placeholder}, {placeholder}, CURRENT_TIMESTAMP)
-                    ON CONFLICT(username) DO UPDATE SET
-                        real_name = excluded.real_name,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (username, real_name))
-            else: # PostgreSQL
-                cur.execute(f"""
-                    INSERT INTO user_real_names (username, real_name)
-                    VALUES ({placeholder}, {placeholder})
-                    ON CONFLICT (username) DO UPDATE SET
-                        real_name = EXCLUDED.real_name,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (username, real_name))
+            get_dialect().execute(cur, 'upsert_real_name', (username, real_name))
             
             conn.commit()
             return True, None
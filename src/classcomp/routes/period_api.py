@@ -6,18 +6,25 @@
 提供周期配置、查询和变更的API接口
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from flask_login import login_required, current_user
 from classcomp.database import get_conn, put_conn
 from classcomp.utils.period_utils import (
     calculate_period_info_v2,
     change_period_type,
-    get_current_semester_config
+    get_current_semester_config,
+    get_period_calendar
 )
+from classcomp.utils.period_snapshots import get_period_summary
+from datetime import datetime
+import numpy as np
 import os
 
 period_api = Blueprint('period_api', __name__, url_prefix='/api/period')
 
+# 批量查询单次最多解析的日期数（约两年）
+MAX_RESOLVE_DATES = 800
+
 @period_api.route('/info', methods=['GET'])
 @login_required
 def get_period_info():
@@ -70,6 +77,273 @@ def get_period_info():
         }), 500
 
 
+@period_api.route('/calendar', methods=['GET'])
+@login_required
+def get_calendar():
+    """
+    获取当前学期的全部周期（来自进程内周期日历）
+    
+    响应带有 ETag（学期ID + period_metadata 缓存版本号），
+    客户端可用 If-None-Match 重新验证，周期未变化时返回 304
+    
+    返回:
+        {
+            "success": true,
+            "semester_id": int,
+            "periods": [
+                {
+                    "period_number": int,
+                    "period_type": "weekly" | "biweekly",
+                    "period_start": "YYYY-MM-DD",
+                    "period_end": "YYYY-MM-DD"
+                }
+            ]
+        }
+    """
+    try:
+        conn = get_conn()
+        try:
+            # 获取当前学期配置
+            config_data = get_current_semester_config(conn)
+            if not config_data:
+                return jsonify({
+                    'success': False,
+                    'message': '未找到活跃学期配置'
+                }), 404
+            
+            semester_id = config_data['semester']['id']
+            calendar = get_period_calendar(semester_id, conn)
+        finally:
+            put_conn(conn)
+        
+        # 没有 cache_versions 表时版本号为 None，不提供 ETag
+        etag = f"period-{semester_id}-{calendar.version}" if calendar.version is not None else None
+        if etag and request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = jsonify({
+                'success': True,
+                'semester_id': semester_id,
+                'periods': calendar.serialize()
+            })
+        
+        if etag:
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取周期日历失败: {str(e)}'
+        }), 500
+
+
+@period_api.route('/resolve', methods=['POST'])
+@login_required
+def resolve_dates():
+    """
+    批量查询一组日期所属的周期（基于周期日历的向量化查找，一次请求一次解析）
+    与 /calendar、评分写入时记录的周期号以及 Excel 导出使用同一套周期（period_metadata）
+    
+    请求体（二选一）:
+        {"dates": ["YYYY-MM-DD", ...]}
+        {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"}
+    
+    返回:
+        {
+            "success": true,
+            "semester_id": int,
+            "assignments": [
+                {
+                    "date": "YYYY-MM-DD",
+                    "period_number": int | null,
+                    "period_type": "weekly" | "biweekly" | null,
+                    "period_start": "YYYY-MM-DD" | null,
+                    "period_end": "YYYY-MM-DD" | null
+                }
+            ],
+            "unresolved": int  # 不在当前学期任何周期内的日期数
+        }
+    """
+    data = request.get_json(silent=True) or {}
+    
+    def parse_day(value):
+        if not isinstance(value, str):
+            raise ValueError(f'无效的日期: {value}')
+        try:
+            return np.datetime64(datetime.strptime(value, '%Y-%m-%d').date(), 'D')
+        except ValueError:
+            raise ValueError(f'无效的日期: {value}')
+    
+    try:
+        if data.get('dates') is not None:
+            if not isinstance(data['dates'], list):
+                raise ValueError('dates 必须是日期列表')
+            if len(data['dates']) > MAX_RESOLVE_DATES:
+                raise ValueError(f'单次最多查询 {MAX_RESOLVE_DATES} 个日期')
+            days = np.array([parse_day(value) for value in data['dates']], dtype='datetime64[D]')
+        elif data.get('start_date') and data.get('end_date'):
+            start = parse_day(data['start_date'])
+            end = parse_day(data['end_date'])
+            if end < start:
+                raise ValueError('end_date 不能早于 start_date')
+            if (end - start).astype(int) >= MAX_RESOLVE_DATES:
+                raise ValueError(f'单次最多查询 {MAX_RESOLVE_DATES} 个日期')
+            days = np.arange(start, end + 1, dtype='datetime64[D]')
+        else:
+            raise ValueError('缺少必要参数：dates 或 start_date/end_date')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'参数错误: {str(e)}'
+        }), 400
+    
+    try:
+        conn = get_conn()
+        try:
+            # 获取当前学期配置
+            config_data = get_current_semester_config(conn)
+            if not config_data:
+                return jsonify({
+                    'success': False,
+                    'message': '未找到活跃学期配置'
+                }), 404
+            
+            semester_id = config_data['semester']['id']
+            calendar = get_period_calendar(semester_id, conn)
+        finally:
+            put_conn(conn)
+        
+        periods = calendar.serialize()
+        indices, found = calendar.lookup_array(days)
+        
+        empty = {'period_number': None, 'period_type': None, 'period_start': None, 'period_end': None}
+        assignments = []
+        for day, index, hit in zip(days.astype(str), indices.tolist(), found.tolist()):
+            assignment = {'date': day}
+            assignment.update(periods[index] if hit else empty)
+            assignments.append(assignment)
+        
+        return jsonify({
+            'success': True,
+            'semester_id': semester_id,
+            'assignments': assignments,
+            'unresolved': int(days.size - found.sum())
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'批量查询周期失败: {str(e)}'
+        }), 500
+
+
+def _teacher_grade_scope():
+    """
+    普通教师只能查看本年级（高一高二包含对应VCE班级）的数据
+    返回允许的年级前缀；管理员和全校数据教师返回 None（不限制）
+    """
+    if current_user.is_admin():
+        return None
+    class_name = current_user.class_name or ''
+    if '全校' in class_name or 'ALL' in class_name.upper():
+        return None
+    
+    class_name = class_name.lower()
+    for keys, grade in ((('t6', '中预'), '中预'), (('t7', '初一'), '初一'), (('t8', '初二'), '初二'),
+                        (('t10', '高一'), '高一'), (('t11', '高二'), '高二')):
+        if any(key in class_name for key in keys):
+            return grade
+    return ''
+
+
+@period_api.route('/summary', methods=['GET'])
+@login_required
+def get_summary():
+    """
+    获取周期汇总（各班平均分、加权平均分、评分条数、评分矩阵）
+    已结束的周期读取 period_snapshots 中的快照，进行中（或尚未冻结）的周期实时汇总
+    
+    Query参数:
+        period_number: 周期号（从0开始），可选，默认为今天所属的周期
+    
+    返回:
+        {
+            "success": true,
+            "summary": {
+                "period_number": int,
+                "period_start": "YYYY-MM-DD",
+                "period_end": "YYYY-MM-DD",
+                "closed": bool,
+                "score_count": int,
+                "classes": [...],
+                "matrix": [...]
+            }
+        }
+    """
+    if not (current_user.is_admin() or current_user.is_teacher()):
+        return jsonify({
+            'success': False,
+            'message': '权限不足'
+        }), 403
+    
+    grade_scope = _teacher_grade_scope()
+    if grade_scope == '':
+        return jsonify({
+            'success': False,
+            'message': f'无法确定教师所属年级，当前班级：{current_user.class_name}'
+        }), 400
+    
+    try:
+        conn = get_conn()
+        try:
+            # 获取当前学期配置
+            config_data = get_current_semester_config(conn)
+            if not config_data:
+                return jsonify({
+                    'success': False,
+                    'message': '未找到活跃学期配置'
+                }), 404
+            
+            semester_id = config_data['semester']['id']
+            
+            period_number = request.args.get('period_number', type=int)
+            if period_number is None:
+                period_number = calculate_period_info_v2(semester_config=config_data['semester'], conn=conn)['period_number']
+            
+            summary = get_period_summary(semester_id, period_number, conn)
+        finally:
+            put_conn(conn)
+        
+        if summary is None:
+            return jsonify({
+                'success': False,
+                'message': f'第{period_number + 1}周期不存在'
+            }), 404
+        
+        if grade_scope:
+            summary['classes'] = [item for item in summary['classes'] if item['target_grade'].startswith(grade_scope)]
+            summary['matrix'] = [item for item in summary['matrix'] if item['target_grade'].startswith(grade_scope)]
+            summary['score_count'] = sum(item['count'] for item in summary['classes'])
+        
+        # 评分完成情况只供完成情况页面使用，不随汇总返回
+        summary.pop('evaluators', None)
+        
+        summary['period_start'] = summary['period_start'].strftime('%Y-%m-%d')
+        summary['period_end'] = summary['period_end'].strftime('%Y-%m-%d')
+        return jsonify({
+            'success': True,
+            'summary': summary
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取周期汇总失败: {str(e)}'
+        }), 500
+
+
 @period_api.route('/config_history', methods=['GET'])
 @login_required
 def get_config_history():
@@ -6,7 +6,8 @@
 """
 
 import re
-import os
+
+from classcomp.database.dialect import get_dialect
 
 def get_class_number_sql(class_name_column):
     """
@@ -18,30 +19,7 @@ def get_class_number_sql(class_name_column):
     Returns:
         str: 用于提取班级数字的SQL表达式
     """
-    
-    db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-    is_sqlite = db_url.startswith("sqlite")
-    
-    if is_sqlite:
-        # SQLite版本：使用字符串替换提取数字
-        return f"""
-        CASE 
-            WHEN TRIM(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(
-                {class_name_column}, '班', ''), '年级', ''), '中预', ''), '初一', ''), '初二', ''), 
-                '初三', ''), '高一', ''), '高二', ''), '高三', ''), 'VCE', ''), '') != ''
-            THEN CAST(TRIM(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(
-                {class_name_column}, '班', ''), '年级', ''), '中预', ''), '初一', ''), '初二', ''), 
-                '初三', ''), '高一', ''), '高二', ''), '高三', ''), 'VCE', ''), '') AS INTEGER)
-            ELSE 0
-        END"""
-    else:
-        # PostgreSQL版本：使用正则表达式
-        return f"""
-        CASE 
-            WHEN {class_name_column} ~ '[0-9]+' THEN 
-                CAST(REGEXP_REPLACE({class_name_column}, '[^0-9]', '', 'g') AS INTEGER)
-            ELSE 0
-        END"""
+    return get_dialect().class_number(class_name_column)
 
 def get_grade_order_sql(grade_name_column):
     """
@@ -53,20 +31,7 @@ def get_grade_order_sql(grade_name_column):
     Returns:
         str: 年级排序的SQL表达式
     """
-    return f"""
-    CASE {grade_name_column} 
-        WHEN '中预' THEN 1
-        WHEN '初一' THEN 2
-        WHEN '初二' THEN 3
-        WHEN '初三' THEN 4
-        WHEN '高一' THEN 5
-        WHEN '高二' THEN 6
-        WHEN '高三' THEN 7
-        WHEN '高一VCE' THEN 8
-        WHEN '高二VCE' THEN 9
-        WHEN '高三VCE' THEN 10
-        ELSE 99
-    END"""
+    return get_dialect().grade_order(grade_name_column)
 
 def generate_class_sorting_sql(grade_name_column, class_name_column):
     """
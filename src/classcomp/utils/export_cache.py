@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+已结束月份的 Excel 报表缓存
+月份内的周期全部结束后，每个导出范围（全校 / 各教师年级）的工作簿只生成一次，
+保存在 EXPORT_FOLDER/cache 下，之后直接返回文件
+
+失效依靠 cache_versions 中的版本号：归档/删除评分时递增所涉及月份的版本号，
+重置数据库或修改学期配置时递增全局版本号；版本号写在缓存文件名里，旧文件不再命中
+"""
+
+import glob
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from classcomp.database.cache_versions import get_cache_version, bump_cache_version
+from classcomp.utils.period_utils import (
+    calculate_period_info, get_current_semester_config, get_current_time, get_period_calendar
+)
+
+EXPORT_WORKBOOKS = 'export_workbooks'
+
+
+def _month_version_name(month):
+    return f'{EXPORT_WORKBOOKS}:{month}'
+
+
+def is_month_closed(month, conn):
+    """
+    月份是否已经结束：包含该月最后一天的周期（导出使用的周期规则和
+    period_metadata 中的周期）都已结束，该月的评分不会再被新提交覆盖
+    """
+    first_day = datetime.strptime(month, '%Y-%m').date()
+    last_day = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+    config_data = get_current_semester_config(conn=conn)
+    semester = config_data['semester'] if config_data else None
+    period_end = calculate_period_info(target_date=last_day, semester_config=semester, conn=conn)['period_end']
+    if semester is not None:
+        period = get_period_calendar(semester['id'], conn).lookup(last_day)
+        if period:
+            period_end = max(period_end, period['period_end'])
+
+    return period_end < get_current_time().date()
+
+
+def cached_workbook_path(export_folder, month, scope, exclude_test, conn):
+    """
+    月度报表的缓存文件路径；月份未结束或没有 cache_versions 表时返回 None（不缓存）
+
+    参数:
+        scope: 导出范围，'all' 表示全校，否则为教师年级
+        exclude_test: 是否排除测试数据
+    """
+    global_version = get_cache_version(EXPORT_WORKBOOKS, conn)
+    month_version = get_cache_version(_month_version_name(month), conn)
+    if global_version is None or month_version is None:
+        return None
+    if not is_month_closed(month, conn):
+        return None
+
+    filename = f"评分表_{month.replace('-', '')}_{scope}_{'t' if exclude_test else 'a'}_v{global_version}-{month_version}.xlsx"
+    return os.path.join(export_folder, 'cache', filename)
+
+
+def store_cached_workbook(filepath, cache_path):
+    """把刚生成的工作簿保存为缓存（先写临时文件再替换），并删除同一范围的旧版本"""
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    shutil.copyfile(filepath, temp_path)
+    os.replace(temp_path, cache_path)
+
+    prefix = os.path.basename(cache_path).rsplit('_v', 1)[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{glob.escape(prefix)}_v*.xlsx")):
+        if stale != cache_path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def invalidate_cached_workbooks(conn, months=None):
+    """
+    使缓存的月度报表失效（不提交，随调用方的事务一起提交）
+    months 为 'YYYY-MM' 列表；不传时全部失效
+    """
+    if months is None:
+        bump_cache_version(EXPORT_WORKBOOKS, conn)
+        return
+    for month in sorted(set(months)):
+        bump_cache_version(_month_version_name(month), conn)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+已结束周期的汇总快照
+周期结束后，把各班平均分、加权平均分、评分条数和评分班级×被查班级矩阵
+一次性冻结到 period_snapshots 表；报表读取已结束周期时直接使用快照，
+只有进行中的周期才从 scores 原始记录实时汇总
+
+快照只由周期关闭任务（close_ended_periods，见 scripts/close_periods.py）写入，
+读取接口不写数据库；还没有快照的已结束周期读取时按原始记录实时汇总
+"""
+
+import json
+
+from classcomp.database.dialect import get_dialect
+from classcomp.utils.period_utils import _to_date, get_current_time, get_current_semester_config
+from classcomp.utils.time_utils import parse_database_timestamp
+from classcomp.utils.scoring_utils import calculate_weighted_scores, get_active_weight_config
+
+
+def create_period_snapshots_table(conn):
+    """创建 period_snapshots 表（快照写入后不再修改）"""
+    cur = conn.cursor()
+    if get_dialect().is_sqlite:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS period_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                semester_id INTEGER NOT NULL,
+                period_number INTEGER NOT NULL,
+                period_start TEXT NOT NULL,
+                period_end TEXT NOT NULL,
+                score_count INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                closed_at TEXT DEFAULT (datetime('now')),
+                UNIQUE(semester_id, period_number)
+            )
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS period_snapshots (
+                id SERIAL PRIMARY KEY,
+                semester_id INTEGER NOT NULL,
+                period_number INTEGER NOT NULL,
+                period_start DATE NOT NULL,
+                period_end DATE NOT NULL,
+                score_count INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                closed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                UNIQUE(semester_id, period_number)
+            )
+        """)
+    conn.commit()
+
+
+def aggregate_period_scores(rows, weights):
+    """
+    汇总一个周期的评分记录
+
+    参数:
+        rows: 评分记录，每条包含 target_grade, target_class, evaluator_class, total, source_type, created_at
+        weights: 权重配置（get_active_weight_config 的返回值）
+
+    返回:
+        {
+            'score_count': int,
+            'weights': {...},
+            'classes': [{'target_grade', 'target_class', 'count', 'new_media_count',
+                         'total', 'average', 'weighted_average'}],
+            'matrix': [{'target_grade', 'target_class', 'evaluator_class', 'count', 'average'}],
+            'evaluators': [{'evaluator_class', 'source_type', 'count', 'latest_score_time'}]
+        }
+    """
+    classes = {}
+    matrix = {}
+    evaluators = {}
+    for row in rows:
+        class_key = (row['target_grade'], row['target_class'])
+        classes.setdefault(class_key, []).append({
+            'total': row['total'],
+            'source_type': row['source_type'] or 'info_commissioner'
+        })
+        cell = matrix.setdefault(class_key + (row['evaluator_class'],), [0, 0.0])
+        cell[0] += 1
+        cell[1] += float(row['total'])
+        # 评分完成情况：每个评分班级（按来源区分）的评分条数和最近评分时间
+        created_at = parse_database_timestamp(row['created_at'])
+        evaluator = evaluators.setdefault((row['evaluator_class'], row['source_type'] or 'info_commissioner'), [0, None])
+        evaluator[0] += 1
+        if created_at is not None and (evaluator[1] is None or created_at > evaluator[1]):
+            evaluator[1] = created_at
+
+    class_items = []
+    for (target_grade, target_class), scores in sorted(classes.items()):
+        class_items.append({
+            'target_grade': target_grade,
+            'target_class': target_class,
+            'count': len(scores),
+            'new_media_count': sum(1 for score in scores if score['source_type'] == 'new_media_officer'),
+            'total': sum(float(score['total']) for score in scores),
+            'average': round(sum(float(score['total']) for score in scores) / len(scores), 2),
+            'weighted_average': calculate_weighted_scores(scores, weights=weights)
+        })
+
+    matrix_items = []
+    for (target_grade, target_class, evaluator_class), (count, total) in sorted(matrix.items()):
+        matrix_items.append({
+            'target_grade': target_grade,
+            'target_class': target_class,
+            'evaluator_class': evaluator_class,
+            'count': count,
+            'average': round(total / count, 2)
+        })
+
+    evaluator_items = []
+    for (evaluator_class, source_type), (count, latest) in sorted(evaluators.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        evaluator_items.append({
+            'evaluator_class': evaluator_class,
+            'source_type': source_type,
+            'count': count,
+            'latest_score_time': latest.isoformat() if latest else None
+        })
+
+    return {
+        'score_count': sum(item['count'] for item in class_items),
+        'weights': weights,
+        'classes': class_items,
+        'matrix': matrix_items,
+        'evaluators': evaluator_items
+    }
+
+
+def _aggregate_from_scores(semester_id, period_number, conn):
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'period_score_rows', (semester_id, period_number))
+    return aggregate_period_scores(cur.fetchall(), get_active_weight_config(conn))
+
+
+def close_period(semester_id, period_number, period_start, period_end, conn):
+    """
+    为已结束的周期写入快照（不提交，随调用方的事务一起提交）
+    快照已存在时保持不变；返回写入（或已存在）的汇总结果
+    """
+    dialect = get_dialect()
+    summary = _aggregate_from_scores(semester_id, period_number, conn)
+    payload = {key: summary[key] for key in ('weights', 'classes', 'matrix', 'evaluators')}
+    cur = conn.cursor()
+    dialect.execute(cur, 'insert_period_snapshot', (
+        semester_id, period_number,
+        dialect.date_param(_to_date(period_start)), dialect.date_param(_to_date(period_end)),
+        summary['score_count'], json.dumps(payload, ensure_ascii=False)
+    ))
+    return summary
+
+
+def close_ended_periods(conn=None):
+    """
+    周期关闭任务：为当前学期中所有已结束但还没有快照的周期生成快照并提交
+
+    返回:
+        新生成的快照数（没有活跃学期时为 0）
+    """
+    should_close_conn = conn is None
+    if conn is None:
+        from classcomp.database import get_conn, put_conn
+        conn = get_conn()
+
+    try:
+        config_data = get_current_semester_config(conn=conn)
+        if not config_data:
+            return 0
+        semester_id = config_data['semester']['id']
+
+        dialect = get_dialect()
+        cur = conn.cursor()
+        today = get_current_time().date()
+        dialect.execute(cur, 'ended_periods_without_snapshot', (semester_id, dialect.date_param(today)))
+        periods = cur.fetchall()
+
+        for period in periods:
+            close_period(semester_id, period['period_number'], period['start_date'], period['end_date'], conn)
+        conn.commit()
+        return len(periods)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if should_close_conn:
+            from classcomp.database import put_conn
+            put_conn(conn)
+
+
+def discard_period_snapshot(semester_id, period_number, conn):
+    """
+    删除周期快照（不提交）
+    仅在管理员归档/删除已结束周期的评分后调用，下次周期关闭任务按剩余记录重新冻结
+    """
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'delete_period_snapshot', (semester_id, period_number))
+
+
+def get_period_snapshot(semester_id, period_number, conn):
+    """
+    读取周期快照（不实时汇总）
+
+    返回:
+        {'semester_id', 'period_number', 'period_start', 'period_end' (date), 'closed': True,
+         'closed_at', 'score_count', 'weights', 'classes', 'matrix', ...}；没有快照时返回 None
+    """
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'period_snapshot', (semester_id, period_number))
+    snapshot = cur.fetchone()
+    if not snapshot:
+        return None
+    summary = json.loads(snapshot['payload'])
+    summary.update({
+        'semester_id': semester_id,
+        'period_number': period_number,
+        'period_start': _to_date(snapshot['period_start']),
+        'period_end': _to_date(snapshot['period_end']),
+        'closed': True,
+        'closed_at': str(snapshot['closed_at']),
+        'score_count': snapshot['score_count']
+    })
+    return summary
+
+
+def _class_total(item):
+    # 早期快照没有 total 字段，用平均分还原
+    return item['total'] if 'total' in item else item['average'] * item['count']
+
+
+def grade_score_totals(conn):
+    """
+    按年级统计全部评分的条数和总分：当前学期已冻结的周期读取快照，
+    未冻结的周期、其他学期和没有学期信息的记录从 scores 实时汇总
+
+    返回:
+        {target_grade: {'count': int, 'total': float}}
+    """
+    dialect = get_dialect()
+    cur = conn.cursor()
+    totals = {}
+
+    def add(grade, count, total):
+        entry = totals.setdefault(grade, {'count': 0, 'total': 0.0})
+        entry['count'] += count
+        entry['total'] += float(total or 0)
+
+    config_data = get_current_semester_config(conn=conn)
+    if not config_data:
+        cur.execute("SELECT target_grade, COUNT(*) AS count, SUM(total) AS total FROM scores GROUP BY target_grade")
+        for row in cur.fetchall():
+            add(row['target_grade'], row['count'], row['total'])
+        return totals
+    semester_id = config_data['semester']['id']
+
+    dialect.execute(cur, 'period_snapshots_for_semester', (semester_id,))
+    for snapshot in cur.fetchall():
+        for item in json.loads(snapshot['payload'])['classes']:
+            add(item['target_grade'], item['count'], _class_total(item))
+
+    today = get_current_time().date()
+    dialect.execute(cur, 'started_periods_without_snapshot', (semester_id, dialect.date_param(today)))
+    for period in cur.fetchall():
+        dialect.execute(cur, 'grade_totals_in_period', (semester_id, period['period_number']))
+        for row in cur.fetchall():
+            add(row['target_grade'], row['count'], row['total'])
+
+    dialect.execute(cur, 'grade_totals_outside_semester', (semester_id, semester_id))
+    for row in cur.fetchall():
+        add(row['target_grade'], row['count'], row['total'])
+    return totals
+
+
+def get_period_summary(semester_id, period_number, conn):
+    """
+    获取周期汇总：已结束的周期读取快照，没有快照的周期（进行中或尚未冻结）实时汇总
+    只读，不写入快照
+
+    返回:
+        {
+            'semester_id', 'period_number', 'period_start', 'period_end' (date),
+            'closed': bool, 'closed_at', 'score_count', 'weights', 'classes', 'matrix'
+        }
+        周期不存在时返回 None
+    """
+    summary = get_period_snapshot(semester_id, period_number, conn)
+    if summary is not None:
+        return summary
+
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'period_by_number', (semester_id, period_number))
+    period = cur.fetchone()
+    if not period:
+        return None
+    period_start = _to_date(period['start_date'])
+    period_end = _to_date(period['end_date'])
+
+    summary = _aggregate_from_scores(semester_id, period_number, conn)
+
+    summary.update({
+        'semester_id': semester_id,
+        'period_number': period_number,
+        'period_start': period_start,
+        'period_end': period_end,
+        'closed': period_end < get_current_time().date(),
+        'closed_at': None
+    })
+    return summary
+
+
+def get_snapshot_completion(semester_id, period_number, conn, source_type=None):
+    """
+    从快照读取已结束周期各评分班级的评分完成情况
+
+    参数:
+        source_type: 只统计该来源的评分（None 表示全部来源）
+
+    返回:
+        {评分班级: {'count': int, 'latest_score_time': datetime}}；
+        没有快照（或快照早于完成情况字段）时返回 None，调用方按原始记录统计
+    """
+    payload = get_period_snapshot(semester_id, period_number, conn)
+    if payload is None or 'evaluators' not in payload:
+        return None
+
+    completion = {}
+    for item in payload['evaluators']:
+        if source_type is not None and item['source_type'] != source_type:
+            continue
+        latest = parse_database_timestamp(item['latest_score_time'])
+        entry = completion.setdefault(item['evaluator_class'], {'count': 0, 'latest_score_time': None})
+        entry['count'] += item['count']
+        if latest is not None and (entry['latest_score_time'] is None or latest > entry['latest_score_time']):
+            entry['latest_score_time'] = latest
+    return completion
@@ -7,17 +7,21 @@
 """
 
 from datetime import datetime, timedelta
+import bisect
+import threading
+import numpy as np
 import pytz
 import os
 
-# 导入班级排序工具
-from classcomp.utils.class_sorting_utils import generate_class_sorting_sql
+from classcomp.database.dialect import get_dialect
 
 # 周期计算常量
 DAYS_IN_TWO_WEEKS = 14
 PERIOD_BUFFER_DAYS = 13
 SUNDAY_WEEKDAY = 6  # Python中星期日是6
 DEFAULT_TIMEZONE = 'Asia/Shanghai'
+# 学期未设置结束日期时，预生成周期覆盖的默认天数（约26周）
+DEFAULT_SEMESTER_DAYS = int(os.getenv('SEMESTER_DEFAULT_DAYS', '182'))
 
 def get_local_timezone():
     """强制使用上海时区"""
@@ -31,8 +35,21 @@ def get_current_time():
 
 
 
+# 当前学期配置的进程内缓存：(缓存版本号, {'semester': ..., 'classes': [...]})
+# 版本号来自 cache_versions 表，admin_semester 等写入路径递增它，各 worker 据此失效
+_semester_config_cache = (None, None)
+
+
+def _copy_semester_config(config_data):
+    return {
+        'semester': dict(config_data['semester']),
+        'classes': [dict(row) for row in config_data['classes']]
+    }
+
+
 def get_current_semester_config(conn=None):
-    """获取当前活跃的学期配置"""
+    """获取当前活跃的学期配置（按 cache_versions 中的版本号缓存）"""
+    global _semester_config_cache
     should_close_conn = conn is None
     if conn is None:
         from classcomp.database import get_conn, put_conn
@@ -40,42 +57,68 @@ def get_current_semester_config(conn=None):
         should_close_conn = True
     
     try:
+        from classcomp.database.cache_versions import SEMESTER_CONFIG, get_cache_version
+        version = get_cache_version(SEMESTER_CONFIG, conn)
+        cached_version, cached = _semester_config_cache
+        if version is not None and cached_version == version and cached is not None:
+            return _copy_semester_config(cached)
+        
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        cur.execute(f'SELECT * FROM semester_config WHERE is_active = {placeholder} LIMIT 1', (1,))
+        dialect = get_dialect()
+        dialect.execute(cur, 'active_semester', (1,))
         semester_row = cur.fetchone()
         
         if semester_row:
             # 将Row对象转换为字典
             semester = dict(semester_row)
             
-            # 获取班级配置 - 使用数据库兼容的占位符
-            db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-            placeholder = "?" if db_url.startswith("sqlite") else "%s"
-            
-            class_sorting_sql = generate_class_sorting_sql("grade_name", "class_name")
-            cur.execute(f'''
-                SELECT grade_name, class_name
-                FROM semester_classes
-                WHERE semester_id = {placeholder} AND is_active = 1
-                ORDER BY {class_sorting_sql}
-            ''', (semester['id'],))
+            # 获取班级配置
+            dialect.execute(cur, 'active_semester_classes', (semester['id'],))
             classes_rows = cur.fetchall()
             
             # 将班级Row对象也转换为字典列表
             classes = [dict(row) for row in classes_rows]
             
-            return {
+            config_data = {
                 'semester': semester,
                 'classes': classes
             }
+            if version is not None:
+                _semester_config_cache = (version, _copy_semester_config(config_data))
+            return config_data
         return None
     finally:
         if should_close_conn:
             from classcomp.database import put_conn
             put_conn(conn)
 
+
+def invalidate_semester_config(conn):
+    """学期配置或班级列表变更后调用（不提交，随调用方的事务一起提交）"""
+    global _semester_config_cache, _current_period_memo
+    from classcomp.database.cache_versions import SEMESTER_CONFIG, bump_cache_version
+    bump_cache_version(SEMESTER_CONFIG, conn)
+    _semester_config_cache = (None, None)
+    _current_period_memo = (None, None)
+
+def _get_semester_info_from_config(config):
+    """从学期配置获取开始日期和第一周期结束日期"""
+    # 学期开始日期
+    start_date_raw = config['start_date']
+    if isinstance(start_date_raw, str):
+        semester_start = get_local_timezone().localize(datetime.strptime(start_date_raw, '%Y-%m-%d')).date()
+    else:
+        semester_start = start_date_raw
+    
+    # 第一周期结束日期
+    end_date_raw = config['first_period_end_date']
+    if isinstance(end_date_raw, str):
+        first_period_end = get_local_timezone().localize(datetime.strptime(end_date_raw, '%Y-%m-%d')).date()
+    else:
+        first_period_end = end_date_raw
+    
+    return semester_start, first_period_end
+
 def calculate_period_info(target_date=None, semester_config=None, conn=None):
     """
     根据学期配置计算评分周期信息
@@ -89,24 +132,6 @@ def calculate_period_info(target_date=None, semester_config=None, conn=None):
         # 如果传入的是字符串，转换为date对象
         target_date = get_local_timezone().localize(datetime.strptime(target_date, '%Y-%m-%d')).date()
     
-    def _get_semester_info_from_config(config):
-        """从学期配置获取开始日期和第一周期结束日期"""
-        # 学期开始日期
-        start_date_raw = config['start_date']
-        if isinstance(start_date_raw, str):
-            semester_start = get_local_timezone().localize(datetime.strptime(start_date_raw, '%Y-%m-%d')).date()
-        else:
-            semester_start = start_date_raw
-        
-        # 第一周期结束日期
-        end_date_raw = config['first_period_end_date']
-        if isinstance(end_date_raw, str):
-            first_period_end = get_local_timezone().localize(datetime.strptime(end_date_raw, '%Y-%m-%d')).date()
-        else:
-            first_period_end = end_date_raw
-        
-        return semester_start, first_period_end
-
     if semester_config is None:
         config_data = get_current_semester_config(conn=conn)
         if not config_data:
@@ -156,6 +181,144 @@ def calculate_period_info(target_date=None, semester_config=None, conn=None):
         'year_start': year_start
     }
 
+def _period_boundaries(year_start, first_period_end, last_day):
+    """
+    与 calculate_period_info 相同规则的周期边界：周期0为 [year_start, first_period_end]，
+    之后每14天一个周期，一直生成到覆盖 last_day
+    返回 (各周期开始日期, 各周期结束日期)，均为 datetime64[D] 数组，下标即周期号
+    """
+    year_start = np.datetime64(year_start, 'D')
+    first_period_end = np.datetime64(first_period_end, 'D')
+    first_start = first_period_end + 1
+    count = max(int((last_day - first_start).astype(int)) // DAYS_IN_TWO_WEEKS + 1, 0)
+    starts = first_start + np.arange(count) * DAYS_IN_TWO_WEEKS
+    return (np.concatenate(([year_start], starts)),
+            np.concatenate(([first_period_end], starts + PERIOD_BUFFER_DAYS)))
+
+def calculate_period_info_array(dates, semester_config=None, conn=None):
+    """
+    calculate_period_info 的向量化版本：一次性计算一组日期所属的周期
+    
+    参数:
+        dates: 日期序列（date 对象组成的 list / pandas Series，或 datetime64 数组）
+        semester_config: 学期配置字典（可选，默认读取当前学期配置）
+        conn: 数据库连接（可选）
+    
+    返回:
+        (period_numbers, period_starts, period_ends)
+        period_numbers 为 int64 数组，period_starts / period_ends 为 datetime64[D] 数组
+    
+    注意：这里按学期起始日期的固定规则计算，周期类型变更后与 period_metadata 中的周期
+    （评分行上记录的 period_number）可能不同；需要与已存储周期号一致时使用
+    calculate_period_info_calendar_array
+    """
+    days = np.asarray(dates, dtype='datetime64[D]')
+    numbers = np.zeros(days.shape, dtype=np.int64)
+    period_starts = np.empty(days.shape, dtype='datetime64[D]')
+    period_ends = np.empty(days.shape, dtype='datetime64[D]')
+    if days.size == 0:
+        return numbers, period_starts, period_ends
+    
+    if semester_config is None:
+        config_data = get_current_semester_config(conn=conn)
+        semester_config = config_data['semester'] if config_data else None
+    
+    if semester_config is not None:
+        groups = [(np.ones(days.shape, dtype=bool), _get_semester_info_from_config(semester_config))]
+    else:
+        # 没有学期配置时与旧逻辑一致：每个日期以所在年份1月1日为起点，第一周期14天
+        years = days.astype('datetime64[Y]')
+        groups = []
+        for year in np.unique(years):
+            year_start = year.astype('datetime64[D]')
+            groups.append((years == year, (year_start, year_start + PERIOD_BUFFER_DAYS)))
+    
+    for mask, (year_start, first_period_end) in groups:
+        group_days = days[mask]
+        starts, ends = _period_boundaries(year_start, first_period_end, group_days.max())
+        # 早于学期开始的日期与 calculate_period_info 一样归入周期0
+        index = np.maximum(np.searchsorted(starts, group_days, side='right') - 1, 0)
+        numbers[mask] = index
+        period_starts[mask] = starts[index]
+        period_ends[mask] = ends[index]
+    
+    return numbers, period_starts, period_ends
+
+def calculate_period_info_calendar_array(dates, semester_config, conn):
+    """
+    按学期周期日历（period_metadata）批量确定日期所属的周期，与评分写入时记录的
+    period_number 以及周期 API 一致；日历中没有的日期回退到 calculate_period_info_array
+    
+    返回:
+        (period_numbers, period_starts, period_ends)，格式同 calculate_period_info_array
+    """
+    numbers, starts, ends = calculate_period_info_array(dates, semester_config=semester_config, conn=conn)
+    calendar = get_period_calendar(semester_config['id'], conn)
+    calendar_numbers, calendar_starts, calendar_ends, found = calendar.resolve_array(dates)
+    return (np.where(found, calendar_numbers, numbers),
+            np.where(found, calendar_starts, starts),
+            np.where(found, calendar_ends, ends))
+
+# 当前周期的进程内备忘：((上海时区日期, 学期配置版本号), {'current': ..., 'previous': ...})
+# 结果只在本地零点或学期配置变更时变化
+_current_period_memo = (None, None)
+
+
+def get_current_period(conn=None):
+    """
+    获取今天所属的周期和上一周期（calculate_period_info 规则），供各页面共用
+    
+    按上海时区日期和学期配置版本号备忘，同一天内不再重复读取学期配置和计算周期；
+    没有 cache_versions 表时每次重新计算
+    
+    返回:
+        {'current': 周期信息, 'previous': 上一周期信息或 None}，没有学期配置时返回 None
+    """
+    global _current_period_memo
+    should_close_conn = conn is None
+    if conn is None:
+        from classcomp.database import get_conn, put_conn
+        conn = get_conn()
+    
+    try:
+        from classcomp.database.cache_versions import SEMESTER_CONFIG, get_cache_version
+        today = get_current_time().date()
+        key = (today, get_cache_version(SEMESTER_CONFIG, conn))
+        memo_key, memo = _current_period_memo
+        if key[1] is not None and memo_key == key:
+            return _copy_current_period(memo)
+        
+        config_data = get_current_semester_config(conn=conn)
+        if config_data:
+            semester = config_data['semester']
+            current = calculate_period_info(target_date=today, semester_config=semester)
+            previous = calculate_period_info(target_date=current['period_start'] - timedelta(days=1),
+                                             semester_config=semester)
+            # 只有当上一周期的开始时间早于本周期时，才认为它是有效的
+            if previous['period_start'] >= current['period_start']:
+                previous = None
+            memo = {'current': current, 'previous': previous}
+        else:
+            memo = None
+        
+        if key[1] is not None:
+            _current_period_memo = (key, memo)
+        return _copy_current_period(memo)
+    finally:
+        if should_close_conn:
+            from classcomp.database import put_conn
+            put_conn(conn)
+
+
+def _copy_current_period(memo):
+    if memo is None:
+        return None
+    return {
+        'current': dict(memo['current']),
+        'previous': dict(memo['previous']) if memo['previous'] else None
+    }
+
+
 def get_biweekly_period_end(date, conn=None):
     """计算日期所属的两周周期结束日（兼容旧接口）"""
     period_info = calculate_period_info(target_date=date, conn=conn)
@@ -187,53 +350,150 @@ def get_period_from_metadata(target_date, semester_id, conn):
         target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
     
     cur = conn.cursor()
-    db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-    is_sqlite = db_url.startswith("sqlite")
-    placeholder = "?" if is_sqlite else "%s"
+    dialect = get_dialect()
     
     # 查询包含该日期的周期
-    if is_sqlite:
-        cur.execute(f"""
-            SELECT period_number, period_type, start_date, end_date
-            FROM period_metadata
-            WHERE semester_id = {placeholder}
-              AND {placeholder} BETWEEN start_date AND end_date
-              AND is_active = 1
-            LIMIT 1
-        """, (semester_id, target_date.strftime('%Y-%m-%d')))
-    else:
-        cur.execute(f"""
-            SELECT period_number, period_type, start_date, end_date
-            FROM period_metadata
-            WHERE semester_id = {placeholder}
-              AND {placeholder} BETWEEN start_date AND end_date
-              AND is_active = 1
-            LIMIT 1
-        """, (semester_id, target_date))
+    dialect.execute(cur, 'period_for_date', (semester_id, dialect.date_param(target_date)))
     
     row = cur.fetchone()
     
     if row:
-        # 转换日期格式
-        start_date = row['start_date'] if hasattr(row, 'keys') else row[2]
-        end_date = row['end_date'] if hasattr(row, 'keys') else row[3]
-        
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
-        return {
-            'period_number': row['period_number'] if hasattr(row, 'keys') else row[0],
-            'period_type': row['period_type'] if hasattr(row, 'keys') else row[1],
-            'period_start': start_date,
-            'period_end': end_date,
-            'semester_id': semester_id
-        }
+        return _period_row_to_info(row, semester_id)
     
     return None
 
 
+def _period_row_to_info(row, semester_id):
+    """把 period_metadata 查询结果行转换为周期信息字典"""
+    # 转换日期格式
+    start_date = row['start_date'] if hasattr(row, 'keys') else row[2]
+    end_date = row['end_date'] if hasattr(row, 'keys') else row[3]
+    
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    
+    return {
+        'period_number': row['period_number'] if hasattr(row, 'keys') else row[0],
+        'period_type': row['period_type'] if hasattr(row, 'keys') else row[1],
+        'period_start': start_date,
+        'period_end': end_date,
+        'semester_id': semester_id
+    }
+
+
+# ==================== 进程内周期日历 ====================
+
+class PeriodCalendar:
+    """
+    单个学期的周期日历
+    周期按开始日期排序，日期到周期的查找用二分法完成，不访问数据库；
+    version 为加载时 cache_versions 中 period_metadata 的版本号
+    """
+
+    def __init__(self, semester_id, periods, version=None):
+        self.semester_id = semester_id
+        self.version = version
+        self._periods = sorted(periods, key=lambda period: period['period_start'])
+        self._starts = [period['period_start'] for period in self._periods]
+        self._number_array = np.array([period['period_number'] for period in self._periods], dtype=np.int64)
+        self._start_array = np.array(self._starts, dtype='datetime64[D]')
+        self._end_array = np.array([period['period_end'] for period in self._periods], dtype='datetime64[D]')
+        self._serialized = None
+
+    def __len__(self):
+        return len(self._periods)
+
+    def lookup(self, target_date):
+        """返回包含 target_date 的周期信息（副本）；日历中没有时返回 None"""
+        index = bisect.bisect_right(self._starts, target_date) - 1
+        if index < 0:
+            return None
+        period = self._periods[index]
+        if target_date > period['period_end']:
+            return None
+        return dict(period)
+
+    def lookup_array(self, dates):
+        """
+        lookup 的向量化版本
+        返回 (indices, found)：indices 为各日期所属周期在 serialize() 中的下标，
+        found 标记日历中是否有包含该日期的周期（未命中的下标无意义）
+        """
+        days = np.asarray(dates, dtype='datetime64[D]')
+        indices = np.searchsorted(self._start_array, days, side='right') - 1
+        found = indices >= 0
+        if self._end_array.size:
+            found &= days <= self._end_array[np.maximum(indices, 0)]
+        else:
+            found[:] = False
+        return np.maximum(indices, 0), found
+
+    def resolve_array(self, dates):
+        """
+        批量确定日期所属的周期
+        返回 (period_numbers, period_starts, period_ends, found)，格式同 calculate_period_info_array；
+        found 为 False 的位置取值无意义
+        """
+        indices, found = self.lookup_array(dates)
+        if not self._periods:
+            days = np.asarray(dates, dtype='datetime64[D]')
+            return np.zeros(days.shape, dtype=np.int64), days, days, found
+        return self._number_array[indices], self._start_array[indices], self._end_array[indices], found
+
+    def serialize(self):
+        """JSON 可序列化的周期列表，首次调用时生成后复用"""
+        if self._serialized is None:
+            self._serialized = [{
+                'period_number': period['period_number'],
+                'period_type': period['period_type'],
+                'period_start': period['period_start'].strftime('%Y-%m-%d'),
+                'period_end': period['period_end'].strftime('%Y-%m-%d')
+            } for period in self._periods]
+        return self._serialized
+
+
+# 学期ID -> PeriodCalendar
+# 写入周期记录时递增 period_metadata 缓存版本号，其他进程据此重新加载；
+# 本进程内未命中时回到数据库查询
+_period_calendars = {}
+_period_calendar_lock = threading.Lock()
+
+
+def get_period_calendar(semester_id, conn):
+    """获取学期的周期日历，首次使用或版本号变化时从 period_metadata 加载"""
+    from classcomp.database.cache_versions import PERIOD_METADATA, get_cache_version
+    version = get_cache_version(PERIOD_METADATA, conn)
+    calendar = _period_calendars.get(semester_id)
+    if calendar is not None and calendar.version == version:
+        return calendar
+    
+    cur = conn.cursor()
+    get_dialect().execute(cur, 'periods_for_semester', (semester_id,))
+    periods = [_period_row_to_info(row, semester_id) for row in cur.fetchall()]
+    calendar = PeriodCalendar(semester_id, periods, version)
+    
+    with _period_calendar_lock:
+        _period_calendars[semester_id] = calendar
+    return calendar
+
+
+def _bump_period_version(conn):
+    """递增 period_metadata 缓存版本号（不提交）"""
+    from classcomp.database.cache_versions import PERIOD_METADATA, bump_cache_version
+    bump_cache_version(PERIOD_METADATA, conn)
+
+
+def invalidate_period_calendar(semester_id=None):
+    """丢弃学期的周期日历（不传学期ID时全部丢弃），下次使用时重新加载"""
+    with _period_calendar_lock:
+        if semester_id is None:
+            _period_calendars.clear()
+        else:
+            _period_calendars.pop(semester_id, None)
+
+
 def create_next_period(semester_id, semester_config, conn):
     """
     创建下一个周期的元数据记录
@@ -247,9 +507,7 @@ def create_next_period(semester_id, semester_config, conn):
         新创建的周期信息字典
     """
     cur = conn.cursor()
-    db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-    is_sqlite = db_url.startswith("sqlite")
-    placeholder = "?" if is_sqlite else "%s"
+    dialect = get_dialect()
     
     # 获取当前周期类型
     try:
@@ -261,13 +519,7 @@ def create_next_period(semester_id, semester_config, conn):
     period_days = 7 if current_period_type == 'weekly' else 14
     
     # 获取最后一个周期
-    cur.execute(f"""
-        SELECT period_number, end_date
-        FROM period_metadata
-        WHERE semester_id = {placeholder}
-        ORDER BY period_number DESC
-        LIMIT 1
-    """, (semester_id,))
+    dialect.execute(cur, 'last_period', (semester_id,))
     
     last_period = cur.fetchone()
     
@@ -296,22 +548,12 @@ def create_next_period(semester_id, semester_config, conn):
     new_end_date = new_start_date + timedelta(days=period_days - 1)
     
     # 插入新周期
-    if is_sqlite:
-        cur.execute("""
-            INSERT INTO period_metadata
-            (semester_id, period_number, period_type, start_date, end_date, created_by)
-            VALUES (?, ?, ?, ?, ?, 'system')
-        """, (semester_id, new_period_number, current_period_type,
-              new_start_date.strftime('%Y-%m-%d'), new_end_date.strftime('%Y-%m-%d')))
-    else:
-        cur.execute("""
-            INSERT INTO period_metadata
-            (semester_id, period_number, period_type, start_date, end_date, created_by)
-            VALUES (%s, %s, %s, %s, %s, 'system')
-        """, (semester_id, new_period_number, current_period_type,
-              new_start_date, new_end_date))
+    dialect.execute(cur, 'insert_period', (semester_id, new_period_number, current_period_type,
+          dialect.date_param(new_start_date), dialect.date_param(new_end_date)))
+    _bump_period_version(conn)
     
     conn.commit()
+    invalidate_period_calendar(semester_id)
     
     return {
         'period_number': new_period_number,
@@ -322,6 +564,105 @@ def create_next_period(semester_id, semester_config, conn):
     }
 
 
+def _to_date(value):
+    """把数据库返回的日期（字符串 / datetime / date）统一成 date"""
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def generate_semester_periods(semester_id, semester_config, conn, until=None):
+    """
+    批量预生成学期的 period_metadata 记录（不提交，随调用方的事务一起提交）
+    
+    从最后一个已有周期之后开始，按当前周期类型连续生成到 until
+    （默认为学期结束日期；未设置结束日期时覆盖从开始日期或今天起的 DEFAULT_SEMESTER_DAYS 天）。
+    已存在的周期不会改动。
+    
+    返回:
+        新生成的周期数
+    """
+    cur = conn.cursor()
+    dialect = get_dialect()
+    
+    try:
+        current_period_type = semester_config['current_period_type']
+    except (KeyError, TypeError):
+        current_period_type = 'biweekly'
+    period_days = 7 if current_period_type == 'weekly' else 14
+    
+    start_date = _to_date(semester_config['start_date'])
+    if until is None:
+        try:
+            end_date = semester_config['end_date']
+        except (KeyError, TypeError):
+            end_date = None
+        if end_date:
+            until = _to_date(end_date)
+        else:
+            until = max(start_date, get_current_time().date()) + timedelta(days=DEFAULT_SEMESTER_DAYS - 1)
+    else:
+        until = _to_date(until)
+    
+    dialect.execute(cur, 'last_period', (semester_id,))
+    last_period = cur.fetchone()
+    if last_period:
+        next_number = last_period['period_number'] + 1
+        next_start = _to_date(last_period['end_date']) + timedelta(days=1)
+    else:
+        next_number = 0
+        next_start = start_date
+    
+    rows = []
+    while next_start <= until:
+        next_end = next_start + timedelta(days=period_days - 1)
+        rows.append((semester_id, next_number, current_period_type,
+                     dialect.date_param(next_start), dialect.date_param(next_end)))
+        next_number += 1
+        next_start = next_end + timedelta(days=1)
+    
+    if rows:
+        cur.executemany(dialect.sql('insert_period'), rows)
+        _bump_period_version(conn)
+        invalidate_period_calendar(semester_id)
+    return len(rows)
+
+
+def ensure_semester_periods(conn=None):
+    """
+    为当前活跃学期补齐全部周期并提交
+    在学期创建/修改后调用，使请求路径上不再需要写入周期记录；失败时只打印警告
+    
+    返回:
+        新生成的周期数（没有活跃学期时为 0，失败时为 None）
+    """
+    should_close_conn = conn is None
+    if conn is None:
+        from classcomp.database import get_conn, put_conn
+        conn = get_conn()
+    
+    try:
+        config_data = get_current_semester_config(conn=conn)
+        if not config_data:
+            return 0
+        semester = config_data['semester']
+        created = generate_semester_periods(semester['id'], semester, conn)
+        conn.commit()
+        if created:
+            print(f"📅 已为学期 {semester['id']} 预生成 {created} 个周期")
+        return created
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ 预生成周期失败: {e}")
+        return None
+    finally:
+        if should_close_conn:
+            from classcomp.database import put_conn
+            put_conn(conn)
+
+
 def calculate_period_info_v2(target_date=None, semester_config=None, conn=None):
     """
     V2版本：基于 period_metadata 表计算周期信息，支持动态周期类型
@@ -367,27 +708,26 @@ def calculate_period_info_v2(target_date=None, semester_config=None, conn=None):
         
         semester_id = semester_config['id']
         
-        # 1. 尝试从 period_metadata 表查询
+        # 1. 先查进程内的周期日历，再查 period_metadata 表
+        period_info = get_period_calendar(semester_id, conn).lookup(target_date)
+        
+        if period_info:
+            return period_info
+        
+        # 日历未命中：周期可能刚由其他进程创建，回到数据库确认
         period_info = get_period_from_metadata(target_date, semester_id, conn)
         
         if period_info:
+            invalidate_period_calendar(semester_id)
             return period_info
         
-        # 2. 未找到，需要创建新周期
-        # 首先检查是否需要创建多个周期来填补空缺
+        # 2. 未找到：周期应已由 generate_semester_periods 预生成，
+        # 这里只作为兜底（旧库或超出学期结束日期），逐个创建周期填补空缺
+        print(f"⚠️ 日期 {target_date} 没有预生成的周期，按需创建")
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
         
         # 获取最后一个周期
-        cur.execute(f"""
-            SELECT period_number, end_date
-            FROM period_metadata
-            WHERE semester_id = {placeholder}
-            ORDER BY period_number DESC
-            LIMIT 1
-        """, (semester_id,))
+        get_dialect().execute(cur, 'last_period', (semester_id,))
         
         last_period = cur.fetchone()
         
@@ -453,9 +793,7 @@ def change_period_type(semester_id, new_type, effective_from_date, changed_by, r
     
     try:
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
+        dialect = get_dialect()
         
         # 验证周期类型
         if new_type not in ['weekly', 'biweekly']:
@@ -471,17 +809,14 @@ def change_period_type(semester_id, new_type, effective_from_date, changed_by, r
             return False, "生效日期必须是未来日期", None
         
         # 获取学期配置
-        cur.execute(f"""
-            SELECT id, semester_name, current_period_type
-            FROM semester_config
-            WHERE id = {placeholder}
-        """, (semester_id,))
+        dialect.execute(cur, 'semester_by_id', (semester_id,))
         
         semester = cur.fetchone()
         if not semester:
             return False, "学期不存在", None
+        semester = dict(semester)
         
-        current_type = semester['current_period_type'] if hasattr(semester, 'keys') else semester[2]
+        current_type = semester['current_period_type']
         
         # 检查是否真的需要变更
         if current_type == new_type:
@@ -492,42 +827,34 @@ def change_period_type(semester_id, new_type, effective_from_date, changed_by, r
         
         if period_info:
             effective_period_number = period_info['period_number']
+            # 该周期已经开始时保持原类型，从下一个周期开始生效
+            if period_info['period_start'] <= current_date:
+                effective_period_number += 1
         else:
             # 如果生效日期还没有周期，计算它将属于哪个周期号
-            cur.execute(f"""
-                SELECT MAX(period_number) as max_period
-                FROM period_metadata
-                WHERE semester_id = {placeholder}
-            """, (semester_id,))
+            dialect.execute(cur, 'max_period_number', (semester_id,))
             
             result = cur.fetchone()
             max_period = result['max_period'] if hasattr(result, 'keys') else result[0]
             effective_period_number = (max_period + 1) if max_period is not None else 0
         
         # 更新 semester_config 表
-        cur.execute(f"""
-            UPDATE semester_config
-            SET current_period_type = {placeholder}
-            WHERE id = {placeholder}
-        """, (new_type, semester_id))
+        dialect.execute(cur, 'update_semester_period_type', (new_type, semester_id))
+        
+        # 删除尚未开始的预生成周期，按新类型重新生成
+        dialect.execute(cur, 'delete_periods_from', (semester_id, effective_period_number,
+              dialect.date_param(current_date)))
+        _bump_period_version(conn)
+        semester['current_period_type'] = new_type
+        generate_semester_periods(semester_id, semester, conn)
         
         # 记录变更历史
-        if is_sqlite:
-            cur.execute("""
-                INSERT INTO period_config_history
-                (semester_id, config_type, effective_from_period, effective_from_date, changed_by, reason)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (semester_id, new_type, effective_period_number,
-                  effective_from_date.strftime('%Y-%m-%d'), changed_by, reason))
-        else:
-            cur.execute("""
-                INSERT INTO period_config_history
-                (semester_id, config_type, effective_from_period, effective_from_date, changed_by, reason)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (semester_id, new_type, effective_period_number,
-                  effective_from_date, changed_by, reason))
+        dialect.execute(cur, 'insert_period_config_history', (semester_id, new_type, effective_period_number,
+              dialect.date_param(effective_from_date), changed_by, reason))
+        invalidate_semester_config(conn)
         
         conn.commit()
+        invalidate_period_calendar(semester_id)
         
         type_label = '单周 (7天)' if new_type == 'weekly' else '双周 (14天)'
         return True, f"周期类型已变更为 {type_label}，将从第 {effective_period_number + 1} 周期（{effective_from_date}）开始生效", effective_period_number
@@ -5,7 +5,7 @@ import os
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'src'))
 
-from classcomp.database import get_conn, put_conn
+from classcomp.database import get_conn, put_conn, get_dialect
 
 
 def get_active_weight_config(conn=None):
@@ -17,15 +17,7 @@ def get_active_weight_config(conn=None):
     
     try:
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        placeholder = "?" if db_url.startswith("sqlite") else "%s"
-        
-        cur.execute(f"""
-            SELECT new_media_weight, info_commissioner_weight
-            FROM score_weight_config
-            WHERE is_active = {placeholder}
-            LIMIT 1
-        """, (True,))
+        get_dialect().execute(cur, 'active_weight_config', (True,))
         
         config = cur.fetchone()
         if config:
@@ -44,13 +36,14 @@ def get_active_weight_config(conn=None):
             put_conn(conn)
 
 
-def calculate_weighted_scores(scores_data, conn=None):
+def calculate_weighted_scores(scores_data, conn=None, weights=None):
     """
     计算加权后的班级平均分
     
     参数:
         scores_data: 评分数据列表，每条记录包含 total 和 source_type
         conn: 数据库连接（可选）
+        weights: 权重配置（可选，批量计算时传入，避免每个班级都查询一次）
     
     返回:
         加权平均分
@@ -58,7 +51,8 @@ def calculate_weighted_scores(scores_data, conn=None):
     if not scores_data:
         return 0.0
     
-    weights = get_active_weight_config(conn)
+    if weights is None:
+        weights = get_active_weight_config(conn)
     
     total_weighted_score = 0.0
     total_weight = 0.0
@@ -102,23 +96,9 @@ def get_class_weighted_average(target_grade, target_class, period_start, period_
     
     try:
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
-        
-        if is_sqlite:
-            date_func = "DATE(created_at)"
-        else:
-            date_func = "DATE(created_at AT TIME ZONE 'Asia/Shanghai')"
-        
-        cur.execute(f"""
-            SELECT total, source_type
-            FROM scores
-            WHERE target_grade = {placeholder}
-              AND target_class = {placeholder}
-              AND {date_func} >= {placeholder}
-              AND {date_func} <= {placeholder}
-        """, (target_grade, target_class, period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')))
+        dialect = get_dialect()
+        dialect.execute(cur, 'class_scores_in_period',
+                        (target_grade, target_class) + dialect.day_range(period_start, period_end))
         
         scores = cur.fetchall()
         
@@ -153,22 +133,8 @@ def get_all_classes_weighted_average(period_start, period_end, conn=None):
     
     try:
         cur = conn.cursor()
-        db_url = os.getenv("DATABASE_URL", "sqlite:///classcomp.db")
-        is_sqlite = db_url.startswith("sqlite")
-        placeholder = "?" if is_sqlite else "%s"
-        
-        if is_sqlite:
-            date_func = "DATE(created_at)"
-        else:
-            date_func = "DATE(created_at AT TIME ZONE 'Asia/Shanghai')"
-        
-        cur.execute(f"""
-            SELECT target_grade, target_class, total, source_type
-            FROM scores
-            WHERE {date_func} >= {placeholder}
-              AND {date_func} <= {placeholder}
-            ORDER BY target_grade, target_class
-        """, (period_start.strftime('%Y-%m-%d'), period_end.strftime('%Y-%m-%d')))
+        dialect = get_dialect()
+        dialect.execute(cur, 'scores_in_period', dialect.day_range(period_start, period_end))
         
         all_scores = cur.fetchall()
         
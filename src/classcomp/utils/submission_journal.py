@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+评分提交日志（可选）
+周期最后一天的提交高峰时，submit_scores 校验后只把评分追加到本地的 SQLite 日志文件
+并立即返回提交编号；后台线程按提交顺序分批写入 scores，客户端按编号查询写入状态
+
+日志文件与业务数据库分开（生产环境业务库是 PostgreSQL 时也一样），
+写入使用 synchronous=FULL，进程崩溃后未写入的提交在重启后继续写入；
+已写入的评分再次写入时由评分唯一约束覆盖为同一条记录
+
+写入线程在处理请求的进程中按需启动（不在导入时启动），每条提交写入前先原子地
+从 pending 改为 applying 认领，多个进程同时运行写入线程时同一提交也只写入一次；
+认领后长时间没有结果的提交（进程在写入途中退出）重新置为 pending
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from classcomp.utils.time_utils import get_current_time
+
+SUBMISSION_JOURNAL_ENABLED = os.getenv('SUBMISSION_JOURNAL', 'false').lower() == 'true'
+SUBMISSION_JOURNAL_PATH = os.getenv('SUBMISSION_JOURNAL_PATH', 'submission_journal.db')
+SUBMISSION_JOURNAL_BATCH = int(os.getenv('SUBMISSION_JOURNAL_BATCH', '50'))
+SUBMISSION_JOURNAL_INTERVAL = float(os.getenv('SUBMISSION_JOURNAL_INTERVAL', '1'))  # 秒
+SUBMISSION_JOURNAL_RETENTION_DAYS = int(os.getenv('SUBMISSION_JOURNAL_RETENTION_DAYS', '7'))
+SUBMISSION_JOURNAL_CLAIM_TIMEOUT = int(os.getenv('SUBMISSION_JOURNAL_CLAIM_TIMEOUT', '300'))  # 秒
+
+PENDING = 'pending'
+APPLYING = 'applying'
+APPLIED = 'applied'
+FAILED = 'failed'
+
+
+class SubmissionJournal:
+    """
+    提交日志
+
+    - append() 追加一次提交，返回提交编号
+    - 后台线程每次取出最多 batch_size 条待写入的提交，逐条认领后依次写入
+    - get() 查询提交的状态和写入结果
+
+    applied_at 在 applying 状态下记录认领时间
+    """
+
+    def __init__(self, path, batch_size=50, interval=1.0, retention_days=7, claim_timeout=300):
+        self.path = os.path.abspath(path)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention_days = retention_days
+        self.claim_timeout = claim_timeout
+
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._table_ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        if not self._table_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS submission_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    submission_id TEXT UNIQUE NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    evaluator_name TEXT NOT NULL,
+                    evaluator_class TEXT,
+                    source_type TEXT NOT NULL,
+                    target_grade TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    submitted_at TEXT NOT NULL,
+                    applied_at TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_submission_journal_status ON submission_journal (status, id)")
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def append(self, user_id, evaluator_name, evaluator_class, source_type, target_grade, rows):
+        """
+        追加一次提交（提交后即落盘）
+
+        参数:
+            rows: 已校验格式的评分，格式同 Score.create_scores
+
+        返回:
+            提交编号
+        """
+        submission_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("""
+                INSERT INTO submission_journal
+                (submission_id, user_id, evaluator_name, evaluator_class, source_type,
+                 target_grade, payload, submitted_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (submission_id, user_id, evaluator_name, evaluator_class, source_type,
+                  target_grade, json.dumps(rows, ensure_ascii=False), get_current_time().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.start()
+        self._wakeup.set()
+        return submission_id
+
+    def get(self, submission_id):
+        """
+        查询提交
+
+        返回:
+            {'submission_id', 'user_id', 'status', 'submitted_at', 'applied_at',
+             'inserted_count', 'overwrite_count', 'errors'}，编号不存在时返回 None
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("""
+                SELECT submission_id, user_id, status, result, submitted_at, applied_at
+                FROM submission_journal WHERE submission_id = ?
+            """, (submission_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        result = json.loads(row['result']) if row['result'] else {}
+        return {
+            'submission_id': row['submission_id'],
+            'user_id': row['user_id'],
+            'status': row['status'],
+            'submitted_at': row['submitted_at'],
+            'applied_at': row['applied_at'] if row['status'] in (APPLIED, FAILED) else None,
+            'inserted_count': result.get('inserted_count', 0),
+            'overwrite_count': result.get('overwrite_count', 0),
+            'errors': result.get('errors', [])
+        }
+
+    def pending_count(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM submission_journal WHERE status IN (?, ?)",
+                                (PENDING, APPLYING)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def _claim(self, journal_conn, entry_id):
+        """把提交从 pending 改为 applying；已被其他线程认领时返回 False"""
+        cur = journal_conn.execute("""
+            UPDATE submission_journal SET status = ?, applied_at = ?
+            WHERE id = ? AND status = ?
+        """, (APPLYING, get_current_time().isoformat(), entry_id, PENDING))
+        journal_conn.commit()
+        return cur.rowcount == 1
+
+    def requeue_stale(self):
+        """认领超过 claim_timeout 仍没有结果的提交重新置为 pending"""
+        cutoff = (get_current_time() - timedelta(seconds=self.claim_timeout)).isoformat()
+        conn = self._connect()
+        try:
+            cur = conn.execute("""
+                UPDATE submission_journal SET status = ?, applied_at = NULL
+                WHERE status = ? AND applied_at < ?
+            """, (PENDING, APPLYING, cutoff))
+            conn.commit()
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    def _release(self, journal_conn, entry_id):
+        """把已认领但没有写入的提交放回 pending"""
+        journal_conn.execute("""
+            UPDATE submission_journal SET status = ?, applied_at = NULL
+            WHERE id = ? AND status = ?
+        """, (PENDING, entry_id, APPLYING))
+        journal_conn.commit()
+
+    @staticmethod
+    def _apply_entry(entry, conn):
+        """写入一条提交，返回 (状态, 写入结果)"""
+        from classcomp.models import Score
+
+        try:
+            # 按提交时间确定评分周期，周期结束前提交的评分不会落到下一个周期
+            inserted_count, overwrite_count, errors = Score.create_scores(
+                user_id=entry['user_id'],
+                evaluator_name=entry['evaluator_name'],
+                evaluator_class=entry['evaluator_class'],
+                target_grade=entry['target_grade'],
+                rows=json.loads(entry['payload']),
+                conn=conn,
+                source_type=entry['source_type'],
+                submitted_at=datetime.fromisoformat(entry['submitted_at'])
+            )
+            status = APPLIED
+        except Exception as e:
+            conn.rollback()
+            inserted_count, overwrite_count, errors = 0, 0, [f"系统错误: {str(e)}"]
+            status = FAILED
+        return status, {
+            'inserted_count': inserted_count,
+            'overwrite_count': overwrite_count,
+            'errors': errors
+        }
+
+    def apply_pending(self):
+        """
+        按提交顺序写入一批待写入的提交
+        SQLite 上每条提交经 run_write 交给单写线程，与请求线程的写操作串行执行；
+        PostgreSQL 上用一个数据库连接依次写入
+
+        返回:
+            本批处理的提交数
+        """
+        from classcomp.database import get_conn, put_conn, get_dialect, run_write, WriteTimeoutError
+
+        journal_conn = self._connect()
+        try:
+            entries = journal_conn.execute("""
+                SELECT id, user_id, evaluator_name, evaluator_class, source_type,
+                       target_grade, payload, submitted_at
+                FROM submission_journal WHERE status = ? ORDER BY id LIMIT ?
+            """, (PENDING, self.batch_size)).fetchall()
+            if not entries:
+                return 0
+
+            use_writer = get_dialect().is_sqlite
+            conn = None if use_writer else get_conn()
+            processed = 0
+            try:
+                for entry in entries:
+                    if not self._claim(journal_conn, entry['id']):
+                        processed += 1
+                        continue
+                    if use_writer:
+                        try:
+                            status, result = run_write(lambda write_conn: self._apply_entry(entry, write_conn))
+                        except WriteTimeoutError:
+                            # 写线程繁忙，本条没有写入：放回 pending，下一轮重试
+                            self._release(journal_conn, entry['id'])
+                            break
+                        except Exception as e:
+                            status, result = FAILED, {'inserted_count': 0, 'overwrite_count': 0,
+                                                      'errors': [f"系统错误: {str(e)}"]}
+                    else:
+                        status, result = self._apply_entry(entry, conn)
+                    journal_conn.execute("""
+                        UPDATE submission_journal SET status = ?, result = ?, applied_at = ?
+                        WHERE id = ? AND status = ?
+                    """, (status, json.dumps(result, ensure_ascii=False), get_current_time().isoformat(),
+                          entry['id'], APPLYING))
+                    journal_conn.commit()
+                    processed += 1
+            finally:
+                if conn is not None:
+                    put_conn(conn)
+            return processed
+        finally:
+            journal_conn.close()
+
+    def purge_applied(self):
+        """删除超过保留天数的已处理提交"""
+        cutoff = (get_current_time() - timedelta(days=self.retention_days)).isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM submission_journal WHERE status IN (?, ?) AND applied_at < ?",
+                         (APPLIED, FAILED, cutoff))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def start(self):
+        """启动后台写入线程（在处理请求的进程中调用；fork 出的子进程中会重新启动）"""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='submission-journal', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.requeue_stale()
+                while self.apply_pending() == self.batch_size:
+                    pass
+                self.purge_applied()
+            except Exception as e:
+                # 数据库暂时不可用时提交保持待写入，下一轮重试
+                print(f"⚠️ 提交日志写入失败，稍后重试: {e}")
+
+
+# 全局提交日志；未启用时为 None
+submission_journal = SubmissionJournal(
+    SUBMISSION_JOURNAL_PATH,
+    batch_size=SUBMISSION_JOURNAL_BATCH,
+    interval=SUBMISSION_JOURNAL_INTERVAL,
+    retention_days=SUBMISSION_JOURNAL_RETENTION_DAYS,
+    claim_timeout=SUBMISSION_JOURNAL_CLAIM_TIMEOUT,
+) if SUBMISSION_JOURNAL_ENABLED else None
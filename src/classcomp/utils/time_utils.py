@@ -36,6 +36,13 @@ def parse_database_timestamp(timestamp_value):
     
     if isinstance(timestamp_value, str):
         # SQLite 返回的是字符串，手动解析并赋予时区
+        try:
+            # 评分写入的是带时区偏移的格式，如 '2025-01-01 08:00:00.123456+08:00'
+            dt = datetime.fromisoformat(timestamp_value)
+            if dt.tzinfo is not None:
+                return dt.astimezone(local_tz)
+        except ValueError:
+            pass
         try:
             # 尝试解析不带时区信息的格式
             dt = datetime.strptime(timestamp_value, '%Y-%m-%d %H:%M:%S.%f')
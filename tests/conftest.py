@@ -0,0 +1,65 @@
+"""
+测试公共配置
+数据库模块在导入时读取 DATABASE_URL，所以必须在导入 classcomp 之前指向临时 SQLite 数据库
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix='classcomp-tests-')
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ['SQLITE_SINGLE_WRITER'] = 'false'
+os.environ['SUBMISSION_JOURNAL'] = 'false'
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture(scope='session')
+def database():
+    """初始化临时数据库（整个测试会话一次）并生成当前学期的周期"""
+    from scripts.init_db import init_database
+    from classcomp.database import get_conn, put_conn
+    from classcomp.utils.period_utils import ensure_semester_periods
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database()
+        conn = get_conn()
+        try:
+            ensure_semester_periods(conn)
+        finally:
+            put_conn(conn)
+    yield
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def conn(database):
+    """每个测试前清空评分数据，返回数据库连接"""
+    from classcomp.database import get_conn, put_conn
+
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM scores_history")
+    cur.execute("DELETE FROM scores")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        put_conn(conn)
+
+
+@pytest.fixture
+def student(conn):
+    """一个学生用户 (id, 用户名, 班级)"""
+    cur = conn.cursor()
+    cur.execute("SELECT id, username, class_name FROM users WHERE role = 'student' ORDER BY id LIMIT 1")
+    row = cur.fetchone()
+    return row['id'], row['username'], row['class_name']
@@ -0,0 +1,68 @@
+"""
+Score.create_scores 批量写入测试：新评分、同周期覆盖、一次提交内重复班级、出错回滚
+"""
+
+from classcomp.models import Score
+
+
+def _row(target_class, score1=3, score2=3, score3=4, note=''):
+    return {'target_class': target_class, 'score1': score1, 'score2': score2, 'score3': score3, 'note': note}
+
+
+def _submit(conn, student, rows, target_grade='初一'):
+    user_id, username, class_name = student
+    return Score.create_scores(user_id, username, class_name, target_grade, rows, conn)
+
+
+def _scores(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT target_class, total, semester_id, period_number FROM scores ORDER BY target_class")
+    return [dict(row) for row in cur.fetchall()]
+
+
+def test_new_scores_are_inserted_with_period(conn, student):
+    inserted, overwritten, errors = _submit(conn, student, [_row('初一1班'), _row('初一2班', score3=1)])
+
+    assert (inserted, overwritten, errors) == (2, 0, [])
+    scores = _scores(conn)
+    assert [(score['target_class'], score['total']) for score in scores] == [('初一1班', 10), ('初一2班', 7)]
+    assert all(score['semester_id'] is not None and score['period_number'] is not None for score in scores)
+
+
+def test_same_period_resubmission_overwrites(conn, student):
+    _submit(conn, student, [_row('初一1班'), _row('初一2班')])
+
+    inserted, overwritten, errors = _submit(conn, student, [_row('初一1班', score1=0), _row('初一3班')])
+
+    assert (inserted, overwritten, errors) == (2, 1, [])
+    assert [(score['target_class'], score['total']) for score in _scores(conn)] == [
+        ('初一1班', 7), ('初一2班', 10), ('初一3班', 10)]
+
+
+def test_duplicate_class_in_one_batch_keeps_last(conn, student):
+    inserted, overwritten, errors = _submit(conn, student, [_row('初一1班'), _row('初一1班', score2=0)])
+
+    assert (inserted, overwritten, errors) == (1, 1, [])
+    assert [(score['target_class'], score['total']) for score in _scores(conn)] == [('初一1班', 7)]
+
+
+def test_invalid_rows_are_reported_without_blocking_valid_rows(conn, student):
+    inserted, overwritten, errors = _submit(conn, student, [_row('初一1班', score1=5), _row('初一2班')])
+
+    assert (inserted, overwritten) == (1, 0)
+    assert errors == ["电脑整洁分数必须在0-3之间"]
+    assert [score['target_class'] for score in _scores(conn)] == ['初一2班']
+
+
+def test_database_error_rolls_back_whole_batch(conn, student):
+    _submit(conn, student, [_row('初一1班')])
+
+    # 不能绑定的备注值让整条多行 INSERT 失败
+    inserted, overwritten, errors = _submit(conn, student, [_row('初一1班', score1=0), _row('初一2班', note={})])
+
+    assert (inserted, overwritten) == (0, 0)
+    assert len(errors) == 2 and all(error.startswith("数据库错误") for error in errors)
+    assert [(score['target_class'], score['total']) for score in _scores(conn)] == [('初一1班', 10)]
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS count FROM scores_history")
+    assert cur.fetchone()['count'] == 0
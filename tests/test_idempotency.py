@@ -0,0 +1,105 @@
+"""
+幂等键中间件测试：重放第一次的成功响应、处理中的重复请求、同一个键用于不同请求体、失败不保存
+"""
+
+import threading
+
+import pytest
+from flask import Flask, jsonify, request
+from flask_login import LoginManager
+
+from classcomp.middleware.idempotency import IdempotencyStore
+
+
+@pytest.fixture
+def idempotent_app():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    LoginManager(app).user_loader(lambda user_id: None)
+
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    state = {'calls': 0, 'fail': False, 'started': threading.Event(), 'release': threading.Event()}
+
+    @app.route('/submit', methods=['POST'])
+    @store.idempotent
+    def submit():
+        state['calls'] += 1
+        if request.get_json().get('slow'):
+            state['started'].set()
+            state['release'].wait(5)
+        if state['fail']:
+            return jsonify(success=False, message="数据库暂时不可用"), 500
+        return jsonify(success=True, call=state['calls'])
+
+    return app, state
+
+
+def _post(client, body, key='key-1'):
+    return client.post('/submit', json=body, headers={'Idempotency-Key': key})
+
+
+def test_same_key_replays_first_response(idempotent_app):
+    app, state = idempotent_app
+    client = app.test_client()
+
+    first = _post(client, {'score': 1})
+    second = _post(client, {'score': 1})
+
+    assert first.get_json() == second.get_json() == {'success': True, 'call': 1}
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert state['calls'] == 1
+
+
+def test_request_without_key_always_runs(idempotent_app):
+    app, state = idempotent_app
+    client = app.test_client()
+
+    client.post('/submit', json={'score': 1})
+    client.post('/submit', json={'score': 1})
+
+    assert state['calls'] == 2
+
+
+def test_same_key_with_different_body_is_rejected(idempotent_app):
+    app, state = idempotent_app
+    client = app.test_client()
+
+    _post(client, {'score': 1})
+    response = _post(client, {'score': 2})
+
+    assert response.status_code == 422
+    assert state['calls'] == 1
+
+
+def test_duplicate_while_first_request_in_progress(idempotent_app):
+    app, state = idempotent_app
+    responses = {}
+
+    def first_request():
+        responses['first'] = _post(app.test_client(), {'slow': True})
+
+    thread = threading.Thread(target=first_request)
+    thread.start()
+    assert state['started'].wait(5)
+    try:
+        duplicate = _post(app.test_client(), {'slow': True})
+    finally:
+        state['release'].set()
+        thread.join(5)
+
+    assert duplicate.status_code == 409
+    assert responses['first'].get_json()['success'] is True
+    assert state['calls'] == 1
+
+
+def test_failed_response_is_not_remembered(idempotent_app):
+    app, state = idempotent_app
+    client = app.test_client()
+
+    state['fail'] = True
+    assert _post(client, {'score': 1}).status_code == 500
+    state['fail'] = False
+    retry = _post(client, {'score': 1})
+
+    assert retry.get_json() == {'success': True, 'call': 2}
+    assert 'Idempotent-Replayed' not in retry.headers
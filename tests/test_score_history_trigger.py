@@ -0,0 +1,79 @@
+"""
+评分唯一约束和覆盖归档触发器测试：同周期覆盖只保留一条评分，旧评分归档一条历史记录
+"""
+
+import sqlite3
+from datetime import timedelta
+
+import pytest
+
+from classcomp.models import Score
+from classcomp.utils.time_utils import get_current_time
+
+
+def _row(target_class, score1=3, score2=3, score3=4):
+    return {'target_class': target_class, 'score1': score1, 'score2': score2, 'score3': score3, 'note': ''}
+
+
+def _submit(conn, student, rows, submitted_at=None):
+    user_id, username, class_name = student
+    return Score.create_scores(user_id, username, class_name, '初一', rows, conn, submitted_at=submitted_at)
+
+
+def _fetch(conn, sql):
+    cur = conn.cursor()
+    cur.execute(sql)
+    return [dict(row) for row in cur.fetchall()]
+
+
+def test_overwrite_archives_one_history_row(conn, student):
+    submitted_at = get_current_time()
+    _submit(conn, student, [_row('初一1班')], submitted_at=submitted_at - timedelta(minutes=5))
+    _submit(conn, student, [_row('初一1班', score1=1)], submitted_at=submitted_at)
+
+    scores = _fetch(conn, "SELECT id, total FROM scores")
+    history = _fetch(conn, "SELECT original_score_id, overwritten_by_score_id, total, period_number FROM scores_history")
+
+    assert len(scores) == 1 and scores[0]['total'] == 8
+    assert len(history) == 1
+    # 覆盖沿用原行 id，历史记录保存被覆盖前的分数
+    assert history[0]['original_score_id'] == scores[0]['id']
+    assert history[0]['overwritten_by_score_id'] == scores[0]['id']
+    assert history[0]['total'] == 10
+    assert history[0]['period_number'] is not None
+
+
+def test_new_scores_do_not_write_history(conn, student):
+    _submit(conn, student, [_row('初一1班'), _row('初一2班')])
+
+    assert _fetch(conn, "SELECT COUNT(*) AS count FROM scores_history")[0]['count'] == 0
+
+
+def test_other_updates_do_not_archive(conn, student):
+    _submit(conn, student, [_row('初一1班')])
+
+    # 只有修改 created_at 的覆盖才归档，其他 UPDATE 不触发
+    cur = conn.cursor()
+    cur.execute("UPDATE scores SET note = 'checked'")
+    conn.commit()
+
+    assert _fetch(conn, "SELECT COUNT(*) AS count FROM scores_history")[0]['count'] == 0
+
+
+def test_unique_index_rejects_second_row_for_same_period(conn, student):
+    _submit(conn, student, [_row('初一1班')])
+    score = _fetch(conn, "SELECT * FROM scores")[0]
+
+    cur = conn.cursor()
+    with pytest.raises(sqlite3.IntegrityError):
+        cur.execute("""
+            INSERT INTO scores (user_id, evaluator_name, evaluator_class, target_grade, target_class,
+                                score1, score2, score3, total, note, created_at, source_type,
+                                semester_id, period_number)
+            VALUES (?, ?, ?, ?, ?, 1, 1, 1, 3, '', ?, ?, ?, ?)
+        """, (score['user_id'], score['evaluator_name'], score['evaluator_class'], score['target_grade'],
+              score['target_class'], score['created_at'], score['source_type'],
+              score['semester_id'], score['period_number']))
+    conn.rollback()
+
+    assert len(_fetch(conn, "SELECT id FROM scores")) == 1
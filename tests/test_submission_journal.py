@@ -0,0 +1,133 @@
+"""
+提交日志测试：提交写入 scores 后可查询结果、多个写入器同时处理时每条只写入一次、
+中断的认领重新排队、SQLite 上经单写线程写入
+"""
+
+import threading
+from datetime import timedelta
+
+import pytest
+
+from classcomp.models import Score
+from classcomp.utils import submission_journal as journal_module
+from classcomp.utils.submission_journal import SubmissionJournal
+
+
+def _rows(target_class):
+    return [{'target_class': target_class, 'score1': 3, 'score2': 2, 'score3': 4, 'note': ''}]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal.db')
+
+
+def _journal(path, **kwargs):
+    journal = SubmissionJournal(path, **kwargs)
+    journal.start = lambda: None  # 测试中手动调用 apply_pending，不启动后台线程
+    return journal
+
+
+def _append(journal, student, target_class):
+    user_id, username, class_name = student
+    return journal.append(user_id, username, class_name, 'info_commissioner', '初一', _rows(target_class))
+
+
+def test_appended_submission_is_applied(conn, student, journal_path):
+    journal = _journal(journal_path)
+    submission_id = _append(journal, student, '初一1班')
+    assert journal.get(submission_id)['status'] == 'pending'
+
+    assert journal.apply_pending() == 1
+
+    submission = journal.get(submission_id)
+    assert submission['status'] == 'applied'
+    assert (submission['inserted_count'], submission['overwrite_count'], submission['errors']) == (1, 0, [])
+    assert submission['applied_at'] is not None
+    cur = conn.cursor()
+    cur.execute("SELECT target_class, total FROM scores")
+    assert [tuple(row) for row in cur.fetchall()] == [('初一1班', 9)]
+
+
+def test_claimed_entry_is_applied_once(conn, student, journal_path, monkeypatch):
+    first = _journal(journal_path)
+    second = _journal(journal_path)
+    submission_ids = [_append(first, student, f'初一{i}班') for i in range(1, 11)]
+
+    calls = []
+    create_scores = Score.create_scores
+
+    def counting_create_scores(*args, **kwargs):
+        calls.append(kwargs['rows'][0]['target_class'])
+        return create_scores(*args, **kwargs)
+
+    monkeypatch.setattr(Score, 'create_scores', staticmethod(counting_create_scores))
+
+    threads = [threading.Thread(target=journal.apply_pending) for journal in (first, second, first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert sorted(calls) == sorted(f'初一{i}班' for i in range(1, 11))
+    assert all(first.get(submission_id)['status'] == 'applied' for submission_id in submission_ids)
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS count FROM scores_history")
+    assert cur.fetchone()['count'] == 0
+
+
+def test_claim_only_succeeds_once(student, journal_path):
+    journal = _journal(journal_path)
+    _append(journal, student, '初一1班')
+
+    journal_conn = journal._connect()
+    try:
+        entry_id = journal_conn.execute("SELECT id FROM submission_journal").fetchone()['id']
+        assert journal._claim(journal_conn, entry_id) is True
+        assert journal._claim(journal_conn, entry_id) is False
+    finally:
+        journal_conn.close()
+
+
+def test_requeue_stale_returns_abandoned_claims(conn, student, journal_path, monkeypatch):
+    journal = _journal(journal_path, claim_timeout=60)
+    submission_id = _append(journal, student, '初一1班')
+
+    # 认领后进程退出：提交停留在 applying
+    journal_conn = journal._connect()
+    try:
+        entry_id = journal_conn.execute("SELECT id FROM submission_journal").fetchone()['id']
+        journal._claim(journal_conn, entry_id)
+    finally:
+        journal_conn.close()
+
+    assert journal.requeue_stale() == 0
+    assert journal.apply_pending() == 0
+    assert journal.get(submission_id)['status'] == 'applying'
+
+    claimed_at = journal_module.get_current_time()
+    monkeypatch.setattr(journal_module, 'get_current_time',
+                        lambda: claimed_at + timedelta(seconds=120))
+    assert journal.requeue_stale() == 1
+    assert journal.get(submission_id)['status'] == 'pending'
+
+    assert journal.apply_pending() == 1
+    assert journal.get(submission_id)['status'] == 'applied'
+
+
+def test_sqlite_entries_go_through_single_writer(conn, student, journal_path, monkeypatch):
+    from classcomp.database import connection
+    from classcomp.database.sqlite_writer import SQLiteWriter
+
+    writer = SQLiteWriter(connection._sqlite_manager.connect)
+    monkeypatch.setattr(connection, '_writer', writer)
+    journal = _journal(journal_path)
+    submission_id = _append(journal, student, '初一1班')
+
+    assert journal.apply_pending() == 1
+
+    assert writer.stats()['jobs'] == 1
+    assert journal.get(submission_id)['status'] == 'applied'
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS count FROM scores")
+    assert cur.fetchone()['count'] == 1